@@ -3,6 +3,10 @@ ASGI config for Dyslexia project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this module (e.g. ``uvicorn Dyslexia.asgi:application``)
+so the analysis progress event streams run on the event loop; under WSGI each
+open stream would hold a worker thread and is only delivered once the job ends.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -133,6 +133,73 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Optional: path to a pickled ML model used for detection (set your file here)
 MODEL_FILE = BASE_DIR / 'models' / 'detection_model.pkl'
 
+# Seconds before a model that failed to load is tried again (doubling with each consecutive failure, up to 10 minutes)
+ML_MODEL_RETRY_SECONDS = 30
+
+# Memory budget (MB, estimated from weight sizes) of the models each process keeps loaded; the least recently
+# used models are evicted past it, and 0 disables the limit
+ML_MODEL_CACHE_MAX_MB = 1024
+
+# Models to load and warm up with a dummy inference when a server or analysis worker starts
+# (e.g. ['handwriting_cnn']); empty loads every model on first use
+ML_MODEL_PRELOAD = []
+
+# For pre-fork servers that import the app before forking (gunicorn --preload): the master only imports
+# TensorFlow/Keras, shared copy-on-write, and each worker preloads its models right after the fork
+ML_MODEL_PRELOAD_AFTER_FORK = False
+
+# Preload in this process even though it isn't started by manage.py runserver/run_analysis_worker,
+# gunicorn, uvicorn or daphne (e.g. another application server)
+ML_MODEL_PRELOAD_SERVING = False
+
+# Maximum number of analyzer results kept in the content-addressed result cache
+ANALYSIS_CACHE_MAX_ENTRIES = 1000
+
+# Worker processes that run speech analysis alongside handwriting analysis in
+# combined analyses (0 runs it in the calling thread)
+ANALYSIS_SPEECH_PROCESSES = 2
+
+# Uploads queue AnalysisJob rows for `manage.py run_analysis_worker`; set ANALYSIS_JOBS_INLINE
+# to run them inside the request instead (no worker needed, e.g. for development)
+ANALYSIS_JOBS_INLINE = False
+
+# Seconds before a running job whose worker stopped is queued again, and the tries before it is marked failed
+ANALYSIS_JOB_TIMEOUT = 600
+ANALYSIS_JOB_MAX_ATTEMPTS = 3
+
+# Seconds between job reads of each progress event stream, and how long a stream stays open before the client reconnects
+ANALYSIS_EVENTS_POLL_INTERVAL = 0.5
+ANALYSIS_EVENTS_MAX_SECONDS = 600
+
+# Speech analysis sample rate (22050, or 16000 for a cheaper speech-band analysis) and the
+# soxr resampler quality used for files at other rates: soxr_vhq, soxr_hq, soxr_mq, soxr_lq or soxr_qq
+SPEECH_SAMPLE_RATE = 22050
+SPEECH_RESAMPLER = 'soxr_hq'
+
+# Speech pitch tracker: 'piptrack' (full resolution) or 'yin' (downsampled, faster)
+SPEECH_PITCH_METHOD = 'piptrack'
+
+# Trim leading/trailing silence and compute frame features over voiced frames only (pauses still use every frame)
+SPEECH_VAD = True
+
+# Speech rhythm: 'onsets' (spectral onset intervals) or 'syllables' (energy envelope peaks, much cheaper);
+# the tempo estimate is not used in scoring and only runs when SPEECH_RHYTHM_TEMPO is True
+SPEECH_RHYTHM_METHOD = 'onsets'
+SPEECH_RHYTHM_TEMPO = False
+
+# Speech formants: 'recording' (one LPC of the whole recording, which the pronunciation thresholds were tuned on)
+# or 'tracks' (frame-wise F1-F3 over the voiced frames, more accurate and lighter on memory). formant_variance is
+# the spread of F1-F3 with both; 'tracks' also reports formant_track_variance, each formant's variance over time
+SPEECH_FORMANT_METHOD = 'recording'
+
+# Speech recordings at least this long (seconds) are analyzed block by block with bounded memory
+SPEECH_STREAMING_MIN_SECONDS = 300
+SPEECH_STREAM_BLOCK_SECONDS = 30
+
+# Content-addressed cache of decoded speech audio (memory-mapped .npy files); a size of 0 disables it
+SPEECH_PCM_CACHE_DIR = BASE_DIR / 'pcm_cache'
+SPEECH_PCM_CACHE_MAX_BYTES = 1024 ** 3
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,46 @@
+"""
+Django management command to fill the preprocessed .npy files and the PCM cache of stored samples
+Usage: python manage.py preprocess_samples [--type handwriting|speech] [--force]
+"""
+
+from django.core.management.base import BaseCommand
+
+from data_collection.models import HandwritingSample, SpeechSample
+from data_collection.preprocessing import load_or_preprocess_handwriting, load_or_preprocess_speech
+
+
+class Command(BaseCommand):
+    help = 'Preprocess stored samples so later analyses skip decoding and resampling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=['handwriting', 'speech'], help='Only preprocess this sample type')
+        parser.add_argument('--force', action='store_true', help='Recompute existing preprocessed files')
+
+    def handle(self, *args, **options):
+        sample_type = options['type']
+        force = options['force']
+
+        if sample_type in (None, 'handwriting'):
+            from handwriting_analysis.cnn_analyzer import HandwritingCNNAnalyzer
+            samples = HandwritingSample.objects.all()
+            if not force:
+                samples = samples.filter(is_preprocessed=False)
+            self._run('handwriting', samples, HandwritingCNNAnalyzer(), load_or_preprocess_handwriting, force)
+
+        if sample_type in (None, 'speech'):
+            from speech_analysis.audio_analyzer import SpeechAnalyzer
+            # Every sample, since entries recorded in is_preprocessed may have been
+            # evicted from the PCM cache; those still cached are only opened
+            self._run('speech', SpeechSample.objects.all(), SpeechAnalyzer(), load_or_preprocess_speech, force)
+
+    def _run(self, label, samples, analyzer, preprocess, force):
+        done = failed = 0
+        for sample in samples.iterator():
+            try:
+                preprocess(sample, analyzer, force=force)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"  ✗ {label} sample {sample.id}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Preprocessed {done} {label} sample(s), {failed} failed"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0003_alter_userprofile_age_alter_userprofile_grade_level'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='handwritingsample',
+            name='preprocessed_image',
+            field=models.FileField(blank=True, help_text='Normalized 64x64 float32 image (.npy)', null=True, upload_to='preprocessed_handwriting/'),
+        ),
+        migrations.AlterField(
+            model_name='speechsample',
+            name='preprocessed_audio',
+            field=models.FileField(blank=True, help_text='Resampled mono float32 PCM (.npy)', null=True, upload_to='preprocessed_speech/'),
+        ),
+    ]
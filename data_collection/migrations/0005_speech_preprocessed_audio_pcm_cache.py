@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:18
+
+import speech_analysis.pcm_cache
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0004_preprocessed_npy_files'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='speechsample',
+            name='preprocessed_audio',
+            field=models.FileField(blank=True, help_text='Decoded mono float32 PCM (.npy) in the PCM cache', null=True, storage=speech_analysis.pcm_cache.PCMCacheStorage(), upload_to=''),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 import uuid
 
+from speech_analysis.pcm_cache import PCMCacheStorage
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     age = models.IntegerField(null=True, blank=True)
@@ -21,7 +23,8 @@ class HandwritingSample(models.Model):
     
     # Preprocessing flags
     is_preprocessed = models.BooleanField(default=False)
-    preprocessed_image = models.ImageField(upload_to='preprocessed_handwriting/', null=True, blank=True)
+    preprocessed_image = models.FileField(upload_to='preprocessed_handwriting/', null=True, blank=True,
+                                          help_text="Normalized 64x64 float32 image (.npy)")
     
     def __str__(self):
         return f"Handwriting Sample {self.id} - {self.user.username}"
@@ -35,7 +38,8 @@ class SpeechSample(models.Model):
     
     # Preprocessing flags
     is_preprocessed = models.BooleanField(default=False)
-    preprocessed_audio = models.FileField(upload_to='preprocessed_speech/', null=True, blank=True)
+    preprocessed_audio = models.FileField(storage=PCMCacheStorage(), null=True, blank=True,
+                                          help_text="Decoded mono float32 PCM (.npy) in the PCM cache")
     
     def __str__(self):
         return f"Speech Sample {self.id} - {self.user.username}"
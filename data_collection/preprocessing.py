@@ -0,0 +1,118 @@
+"""
+Sample Preprocessing
+Persists the normalized analyzer inputs of each sample so re-analysis and
+bulk re-scoring skip image decoding and audio decoding/resampling
+
+Handwriting samples store the 64x64x1 float32 array returned by
+HandwritingCNNAnalyzer.preprocess_image in `preprocessed_image` as a .npy
+file and are marked `is_preprocessed`. Speech samples are decoded through
+SpeechAnalyzer.load_audio, whose content-addressed PCM cache
+(speech_analysis.pcm_cache) keeps memory-mapped .npy files shared by every
+sample with the same audio; `preprocessed_audio` references the sample's
+cache entry, so loading it again skips hashing the file as well. An entry
+evicted from the cache is decoded again. Long recordings are not
+preprocessed; they are streamed from the original file instead.
+"""
+
+import io
+import logging
+from pathlib import Path
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from speech_analysis.pcm_cache import cache_key, get_max_bytes, key_suffix, load_cached_pcm
+
+logger = logging.getLogger(__name__)
+
+
+def _load_array(field_file):
+    """Read a .npy file from storage, returning None if it is unusable"""
+    try:
+        with field_file.open('rb') as f:
+            return np.load(io.BytesIO(f.read()), allow_pickle=False)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable preprocessed file {field_file.name}: {e}")
+        return None
+
+
+def _save_array(sample, field_name, file_name, array):
+    """Write array as .npy into a sample's file field and mark it preprocessed"""
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    field_file = getattr(sample, field_name)
+    if field_file:
+        # Replace rather than orphan a stale file
+        field_file.delete(save=False)
+    field_file.save(file_name, ContentFile(buffer.getvalue()), save=False)
+    sample.is_preprocessed = True
+    sample.save(update_fields=[field_name, 'is_preprocessed'])
+
+
+def load_or_preprocess_handwriting(sample, analyzer, force=False, image_source=None):
+    """
+    Get the normalized image for a handwriting sample.
+
+    Args:
+        sample (HandwritingSample): Sample to preprocess
+        analyzer (HandwritingCNNAnalyzer): Provides preprocess_image
+        force (bool): Recompute even if a preprocessed file exists
+        image_source: Encoded image of the sample already in memory (e.g. the
+            upload it was created from), decoded instead of the stored file
+
+    Returns:
+        np.ndarray: Image ready for analyze_preprocessed_image
+    """
+    if sample.is_preprocessed and sample.preprocessed_image and not force:
+        processed_image = _load_array(sample.preprocessed_image)
+        if processed_image is not None:
+            return processed_image
+
+    if image_source is not None:
+        processed_image = analyzer.preprocess_image(image_source)
+    else:
+        with sample.image_file.open('rb') as image_file:
+            processed_image = analyzer.preprocess_image(image_file)
+
+    _save_array(sample, 'preprocessed_image', f"{sample.id}.npy", processed_image)
+    return processed_image
+
+
+def load_or_preprocess_speech(sample, analyzer, force=False):
+    """
+    Get the decoded PCM for a speech sample at the analyzer's sample rate.
+
+    Args:
+        sample (SpeechSample): Sample to preprocess
+        analyzer (SpeechAnalyzer): Provides load_audio, sample_rate and resampler
+        force (bool): Decode again even if the PCM cache has the recording
+
+    Returns:
+        np.ndarray: Mono float32 audio ready for analyze_audio, memory-mapped
+        from the PCM cache when it was already decoded, or None for a
+        recording long enough to be streamed instead
+    """
+    audio_path = sample.audio_file.path
+    if analyzer.should_stream(audio_path):
+        return None
+    if get_max_bytes() <= 0:
+        # No cache entry to record
+        audio, _ = analyzer.load_audio(audio_path)
+        return audio
+
+    entry = sample.preprocessed_audio
+    if (sample.is_preprocessed and entry and not force
+            and entry.name.endswith(key_suffix(analyzer.sample_rate, analyzer.resampler) + '.npy')):
+        audio = load_cached_pcm(Path(entry.name).stem)
+        if audio is not None:
+            return audio
+
+    key = cache_key(audio_path, analyzer.sample_rate, analyzer.resampler)
+    audio, _ = analyzer.load_audio(audio_path, refresh=force, cache_key=key)
+
+    # Failed decodes are not cached, so they are retried
+    if len(audio) > 0:
+        sample.preprocessed_audio.name = f"{key}.npy"
+        sample.is_preprocessed = True
+        sample.save(update_fields=['preprocessed_audio', 'is_preprocessed'])
+    return audio
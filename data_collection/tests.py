@@ -1,3 +1,151 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import cv2
+import numpy as np
+import soundfile as sf
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from handwriting_analysis.cnn_analyzer import HandwritingCNNAnalyzer
+from speech_analysis.audio_analyzer import SpeechAnalyzer
+
+from .models import HandwritingSample, SpeechSample
+from .preprocessing import load_or_preprocess_handwriting, load_or_preprocess_speech
+
+
+class TempMediaTestCase(TestCase):
+    """Samples stored in a temporary MEDIA_ROOT and PCM cache"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = os.path.join(tmp.name, 'media')
+        self.cache_dir = os.path.join(tmp.name, 'pcm')
+        settings = self.settings(MEDIA_ROOT=self.media_root, SPEECH_PCM_CACHE_DIR=self.cache_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def handwriting_sample(self):
+        image = np.full((48, 96), 255, dtype=np.uint8)
+        image[10:38, 10:30] = image[10:38, 50:80] = 0
+        upload = SimpleUploadedFile('sample.png', cv2.imencode('.png', image)[1].tobytes(), 'image/png')
+        return HandwritingSample.objects.create(user=self.user, image_file=upload, text_content='')
+
+    def speech_sample(self, sr=16000):
+        os.makedirs(os.path.join(self.media_root, 'speech_samples'), exist_ok=True)
+        t = np.arange(sr) / sr
+        sf.write(os.path.join(self.media_root, 'speech_samples', 'reading.wav'), 0.5 * np.sin(2 * np.pi * 220 * t), sr)
+        return SpeechSample.objects.create(user=self.user, audio_file='speech_samples/reading.wav', text_content='')
+
+
+class HandwritingPreprocessingTests(TempMediaTestCase):
+    """HandwritingSample.preprocessed_image as a persisted .npy"""
+
+    def setUp(self):
+        super().setUp()
+        self.sample = self.handwriting_sample()
+        self.analyzer = HandwritingCNNAnalyzer()
+        self.expected = self.analyzer.preprocess_image(self.sample.image_file.path)
+
+    def preprocess(self, **kwargs):
+        with mock.patch.object(self.analyzer, 'preprocess_image', wraps=self.analyzer.preprocess_image) as preprocess:
+            image = load_or_preprocess_handwriting(self.sample, self.analyzer, **kwargs)
+        np.testing.assert_array_equal(image, self.expected)
+        return preprocess.call_count
+
+    def test_npy_is_written_once_and_reused(self):
+        self.assertEqual(self.preprocess(), 1)
+        self.sample.refresh_from_db()
+        self.assertTrue(self.sample.is_preprocessed)
+        np.testing.assert_array_equal(np.load(self.sample.preprocessed_image.path), self.expected)
+        written = os.path.getmtime(self.sample.preprocessed_image.path)
+
+        self.assertEqual(self.preprocess(), 0)
+        self.assertEqual(os.path.getmtime(self.sample.preprocessed_image.path), written)
+
+    def test_force_recomputes_and_replaces_the_file(self):
+        self.preprocess()
+        old_path = self.sample.preprocessed_image.path
+
+        self.assertEqual(self.preprocess(force=True), 1)
+        self.assertEqual(os.listdir(os.path.dirname(old_path)), [os.path.basename(self.sample.preprocessed_image.name)])
+
+    def test_missing_or_unreadable_files_are_recomputed(self):
+        self.preprocess()
+        os.remove(self.sample.preprocessed_image.path)
+        with self.assertLogs('data_collection.preprocessing', 'WARNING'):
+            self.assertEqual(self.preprocess(), 1)
+
+        with open(self.sample.preprocessed_image.path, 'wb') as f:
+            f.write(b'not a numpy file')
+        with self.assertLogs('data_collection.preprocessing', 'WARNING'):
+            self.assertEqual(self.preprocess(), 1)
+        self.assertEqual(self.preprocess(), 0)
+
+
+class PreprocessSamplesCommandTests(TempMediaTestCase):
+    """manage.py preprocess_samples"""
+
+    def test_preprocesses_stored_samples(self):
+        handwriting = self.handwriting_sample()
+        speech = self.speech_sample()
+        broken = HandwritingSample.objects.create(user=self.user, image_file='handwriting_samples/missing.png')
+
+        out = StringIO()
+        call_command('preprocess_samples', stdout=out)
+
+        self.assertIn('Preprocessed 1 handwriting sample(s), 1 failed', out.getvalue())
+        self.assertIn(f'handwriting sample {broken.id}', out.getvalue())
+        self.assertIn('Preprocessed 1 speech sample(s), 0 failed', out.getvalue())
+        for sample in (handwriting, speech):
+            sample.refresh_from_db()
+            self.assertTrue(sample.is_preprocessed)
+
+        # Preprocessed handwriting is skipped unless forced
+        broken.delete()
+        call_command('preprocess_samples', '--type', 'handwriting', stdout=out)
+        self.assertIn('Preprocessed 0 handwriting sample(s), 0 failed', out.getvalue())
+        call_command('preprocess_samples', '--type', 'handwriting', '--force', stdout=out)
+        self.assertIn('Preprocessed 1 handwriting sample(s), 0 failed', out.getvalue())
+
+
+class SpeechPreprocessingTests(TempMediaTestCase):
+    """SpeechSample.preprocessed_audio referencing the PCM cache entry"""
+
+    def test_cache_entry_is_recorded_and_reused(self):
+        sample = self.speech_sample()
+        analyzer = SpeechAnalyzer()
+
+        audio = load_or_preprocess_speech(sample, analyzer)
+        sample.refresh_from_db()
+        self.assertTrue(sample.is_preprocessed)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(sample.preprocessed_audio.name)])
+        self.assertEqual(sample.preprocessed_audio.path, os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0]))
+
+        # Neither decoded nor hashed again
+        with mock.patch.object(analyzer, '_decode_audio') as decode, \
+                mock.patch('data_collection.preprocessing.cache_key') as key:
+            np.testing.assert_array_equal(load_or_preprocess_speech(sample, analyzer), audio)
+        decode.assert_not_called()
+        key.assert_not_called()
+
+    def test_evicted_or_mismatched_entries_are_decoded_again(self):
+        sample = self.speech_sample()
+        load_or_preprocess_speech(sample, SpeechAnalyzer())
+        sample.refresh_from_db()
+        first_entry = sample.preprocessed_audio.name
+
+        # Another sample rate is another entry
+        audio = load_or_preprocess_speech(sample, SpeechAnalyzer(sample_rate=8000))
+        self.assertEqual(len(audio), 8000)
+        self.assertNotEqual(sample.preprocessed_audio.name, first_entry)
+
+        os.remove(sample.preprocessed_audio.path)
+        self.assertEqual(len(load_or_preprocess_speech(sample, SpeechAnalyzer(sample_rate=8000))), 8000)
+        self.assertTrue(os.path.exists(sample.preprocessed_audio.path))
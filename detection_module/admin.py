@@ -1,3 +1,12 @@
 from django.contrib import admin
+from .models import AnalysisCacheEntry, AnalysisJob
 
-# Register your models here.
+@admin.register(AnalysisCacheEntry)
+class AnalysisCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('analysis_type', 'content_hash', 'analyzer_version', 'hit_count', 'last_accessed')
+    list_filter = ('analysis_type',)
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'job_type', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'job_type')
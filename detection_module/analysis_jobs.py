@@ -0,0 +1,542 @@
+"""
+Analysis Job Queue
+Database-backed queue of sample analyses, drained by manage.py run_analysis_worker
+
+Upload views call enqueue_analysis() and return straight away; worker
+processes claim queued jobs with claim_next_job() and run the analyzers
+and the detection engine with run_job(). A claim is a conditional UPDATE
+from 'queued' to 'running', so any number of workers can share the queue
+on any database backend, SQLite included, without Redis or Celery.
+
+A running job's worker renews its heartbeat at every stage change and
+while it waits for the speech analysis. Jobs without a heartbeat for
+ANALYSIS_JOB_TIMEOUT seconds are assumed abandoned and queued again, up to
+ANALYSIS_JOB_MAX_ATTEMPTS tries. Each claim counts an attempt, and a
+worker only records progress and results while the job is still running
+under the attempt it claimed, so a slow job that was requeued and picked
+up by another worker never saves its results twice.
+
+While a job runs, the worker records the state of each progress stage on
+the job row (JOB_STAGES). get_job_status() and job_status_events() report
+it from that single row, so polling never touches the analyzers.
+"""
+
+import asyncio
+import json
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from data_collection.preprocessing import load_or_preprocess_handwriting
+from handwriting_analysis.models import HandwritingAnalysis
+from speech_analysis.models import SpeechAnalysis
+
+from .analysis_pool import run_in_process
+from .detection_engine import DyslexiaDetectionEngine
+from .models import AnalysisJob, DetectionResult
+from .result_cache import cached_analysis, start_cached_analysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Heartbeats sent per job timeout while waiting on a long analysis
+HEARTBEATS_PER_TIMEOUT = 4
+
+DEFAULT_EVENTS_POLL_INTERVAL = 0.5
+DEFAULT_EVENTS_MAX_SECONDS = 600
+
+# Progress stages of each job type. decode reads and normalizes the samples,
+# features is the speech feature extraction (which also decodes the audio, in
+# the analysis pool), model is the handwriting CNN and shape analysis and
+# detection the detection engine; features and model overlap in combined jobs.
+JOB_STAGES = {
+    'handwriting': ('decode', 'model'),
+    'speech': ('decode', 'features'),
+    'combined': ('decode', 'features', 'model', 'detection'),
+}
+
+# Fields read by get_job_status
+STATUS_FIELDS = (
+    'id', 'job_type', 'status', 'stages', 'attempts', 'error', 'created_at', 'finished_at',
+    'handwriting_analysis_id', 'speech_analysis_id', 'detection_result_id'
+)
+
+# Queued jobs looked at per claim; more than one so workers racing for the
+# oldest job fall through to the next one
+CLAIM_BATCH = 5
+
+# Results saved when an analyzer fails, as the upload views always did
+HANDWRITING_FALLBACKS = {
+    'combined': {
+        'irregular_shapes_score': 0.1, 'spacing_issues_score': 0.1,
+        'stroke_pattern_score': 0.1, 'overall_handwriting_score': 0.1,
+        'letter_formation_issues': ['Processing Error'],
+        'spacing_analysis': {}, 'stroke_analysis': {}, 'model_confidence': 0.5
+    },
+    'handwriting': {
+        'irregular_shapes_score': 0.3, 'spacing_issues_score': 0.4,
+        'stroke_pattern_score': 0.2, 'overall_handwriting_score': 0.3,
+        'letter_formation_issues': ['Error in processing'],
+        'spacing_analysis': {}, 'stroke_analysis': {}, 'model_confidence': 0.5
+    },
+}
+SPEECH_FALLBACKS = {
+    'combined': {
+        'pronunciation_score': 0.9, 'fluency_score': 0.9,
+        'reading_speed': 120.0, 'pause_frequency': 1.0,
+        'mispronunciations': [], 'fluency_issues': [],
+        'phoneme_analysis': {}, 'pitch_variation': 0.3,
+        'volume_consistency': 0.9, 'rhythm_score': 0.9,
+        'model_confidence': 0.5
+    },
+    'speech': {
+        'pronunciation_score': 0.7, 'fluency_score': 0.6,
+        'reading_speed': 120.0, 'pause_frequency': 1.5,
+        'mispronunciations': [], 'fluency_issues': [],
+        'phoneme_analysis': {}, 'pitch_variation': 0.3,
+        'volume_consistency': 0.8, 'rhythm_score': 0.7,
+        'model_confidence': 0.5
+    },
+}
+
+
+class JobLost(Exception):
+    """The job was requeued and claimed again while this worker ran it"""
+
+
+def get_job_timeout():
+    """Seconds a running job may go without a heartbeat before it is assumed abandoned"""
+    return getattr(settings, 'ANALYSIS_JOB_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_max_attempts():
+    """Tries before a job is marked failed"""
+    return getattr(settings, 'ANALYSIS_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def enqueue_analysis(job_type, user, handwriting_sample=None, speech_sample=None, handwriting_upload=None):
+    """
+    Queue an analysis of uploaded samples.
+
+    With ANALYSIS_JOBS_INLINE the job is run before returning, for setups
+    without a worker (e.g. development).
+
+    Args:
+        job_type (str): 'handwriting', 'speech' or 'combined'
+        user (User): Owner of the samples and results
+        handwriting_sample (HandwritingSample): Sample to analyze, if any
+        speech_sample (SpeechSample): Sample to analyze, if any
+        handwriting_upload (UploadedFile): File handwriting_sample was just created
+            from; a job run inline decodes it from memory instead of reading the
+            image back from storage
+
+    Returns:
+        AnalysisJob: The queued (or, inline, finished) job
+    """
+    job = AnalysisJob.objects.create(
+        job_type=job_type,
+        user=user,
+        handwriting_sample=handwriting_sample,
+        speech_sample=speech_sample
+    )
+    logger.info(f"Queued {job_type} analysis job {job.id}")
+
+    if getattr(settings, 'ANALYSIS_JOBS_INLINE', False) and claim_job(job.id, 'inline'):
+        job.refresh_from_db()
+        run_job(job, handwriting_upload)
+    return job
+
+
+def claim_job(job_id, worker):
+    """
+    Claim a queued job for a worker.
+
+    Returns:
+        bool: True if this worker got the job, False if another one did first
+    """
+    return AnalysisJob.objects.filter(id=job_id, status='queued').update(
+        status='running',
+        worker=worker,
+        attempts=F('attempts') + 1,
+        started_at=timezone.now(),
+        heartbeat_at=timezone.now(),
+        finished_at=None,
+        stages={}
+    ) == 1
+
+
+def claim_next_job(worker):
+    """
+    Claim the oldest queued job.
+
+    Args:
+        worker (str): Name of the claiming worker, stored on the job
+
+    Returns:
+        AnalysisJob: The claimed job, or None if the queue is empty
+    """
+    while True:
+        job_ids = list(
+            AnalysisJob.objects.filter(status='queued').order_by('created_at')
+            .values_list('id', flat=True)[:CLAIM_BATCH]
+        )
+        if not job_ids:
+            return None
+        for job_id in job_ids:
+            if claim_job(job_id, worker):
+                return AnalysisJob.objects.get(id=job_id)
+        # Other workers took every job we saw; look again
+
+
+def requeue_stale_jobs(timeout=None):
+    """
+    Put back jobs whose worker stopped while running them.
+
+    A job is abandoned once its heartbeat is older than the timeout. Jobs
+    that already used every attempt are marked failed instead.
+
+    Returns:
+        int: Number of jobs requeued or failed
+    """
+    if timeout is None:
+        timeout = get_job_timeout()
+
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = AnalysisJob.objects.filter(status='running').filter(
+        # Jobs claimed before heartbeats were recorded go by their start time
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=get_max_attempts()).update(
+        status='failed', error='Worker stopped before the job finished', finished_at=timezone.now()
+    )
+    requeued = stale.update(status='queued')
+    if failed or requeued:
+        logger.warning(f"Requeued {requeued} and failed {failed} abandoned analysis jobs")
+    return failed + requeued
+
+
+def _owned(job):
+    """The job's row, if it is still running under the attempt this worker claimed"""
+    return AnalysisJob.objects.filter(id=job.id, status='running', attempts=job.attempts)
+
+
+def _heartbeat(job, **fields):
+    """Renew a job's heartbeat, saving any other fields with it; raises JobLost if it was requeued"""
+    if not _owned(job).update(heartbeat_at=timezone.now(), **fields):
+        raise JobLost(f"Analysis job {job.id} was requeued while attempt {job.attempts} ran")
+
+
+def _save_stages(job):
+    """Publish a job's stage states without touching its other fields"""
+    _heartbeat(job, stages=job.stages)
+
+
+def _start_stage(job, stage):
+    """Mark a stage running, unless it already started"""
+    if stage not in job.stages:
+        job.stages[stage] = {'state': 'running', 'started_at': timezone.now().isoformat()}
+        _save_stages(job)
+
+
+def _finish_stage(job, stage):
+    """Mark a running stage done and record how long it took"""
+    entry = job.stages.get(stage)
+    if entry and entry['state'] == 'running':
+        started_at = datetime.fromisoformat(entry['started_at'])
+        entry.update(state='done', seconds=round((timezone.now() - started_at).total_seconds(), 3))
+        _save_stages(job)
+
+
+def _start_speech(sample):
+    """Start analyzing a speech sample in a worker process; returns a callable that waits for it"""
+    # Import librosa/SciPy on first analysis rather than at startup
+    from speech_analysis.audio_analyzer import SpeechAnalyzer
+    analyzer = SpeechAnalyzer()
+    with sample.audio_file.open('rb') as audio_file:
+        return start_cached_analysis(
+            'speech', audio_file, sample.text_content, analyzer.version,
+            lambda: run_in_process(analyzer.analyze_speech, sample.audio_file.path, sample.text_content)
+        )
+
+
+def _read_upload(upload):
+    """Encoded bytes of an upload still held by the request, or None if it was closed"""
+    try:
+        upload.seek(0)
+        return upload.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _analyze_handwriting(job, handwriting_upload=None):
+    """Analyze the handwriting sample of a job through the result cache"""
+    # Import TensorFlow/OpenCV on first analysis rather than at startup
+    from handwriting_analysis.cnn_analyzer import HandwritingCNNAnalyzer
+    sample = job.handwriting_sample
+    analyzer = HandwritingCNNAnalyzer()
+    image_data = _read_upload(handwriting_upload) if handwriting_upload is not None else None
+
+    def analyze():
+        processed_image = load_or_preprocess_handwriting(sample, analyzer, image_source=image_data)
+        _finish_stage(job, 'decode')
+        _start_stage(job, 'model')
+        return analyzer.analyze_preprocessed_image(processed_image)
+
+    if image_data is not None:
+        return cached_analysis('handwriting', image_data, '', analyzer.version, analyze)
+    with sample.image_file.open('rb') as image_file:
+        return cached_analysis('handwriting', image_file, '', analyzer.version, analyze)
+
+
+def _wait_for_pooled(job, wait):
+    """Wait for an analysis running in the pool, renewing the job's heartbeat meanwhile"""
+    interval = get_job_timeout() / HEARTBEATS_PER_TIMEOUT
+    while True:
+        try:
+            return wait(timeout=interval)
+        except FutureTimeoutError:
+            _heartbeat(job)
+
+
+def _analyze_samples(job, handwriting_upload=None):
+    """
+    Run the analyzers of a job, substituting fallback results for failures.
+
+    Speech runs in the analysis pool while handwriting runs here.
+
+    Returns:
+        tuple: (handwriting result or None, speech result or None, list of failure messages)
+    """
+    errors = []
+    _start_stage(job, 'decode')
+
+    if job.speech_sample:
+        try:
+            wait_for_speech = _start_speech(job.speech_sample)
+        except Exception as e:
+            wait_for_speech = None
+            speech_error = e
+        _start_stage(job, 'features')
+
+    hw_result = None
+    if job.handwriting_sample:
+        try:
+            hw_result = _analyze_handwriting(job, handwriting_upload)
+        except JobLost:
+            raise
+        except Exception as e:
+            logger.exception(f"Handwriting analysis failed for job {job.id}")
+            errors.append(f"Handwriting analysis failed: {str(e)}")
+            hw_result = HANDWRITING_FALLBACKS[job.job_type]
+        # Cache hits and failures skip straight past the model
+        _finish_stage(job, 'decode')
+        _start_stage(job, 'model')
+        _finish_stage(job, 'model')
+    _finish_stage(job, 'decode')
+
+    sp_result = None
+    if job.speech_sample:
+        try:
+            if wait_for_speech is None:
+                raise speech_error
+            sp_result = _wait_for_pooled(job, wait_for_speech)
+        except JobLost:
+            raise
+        except Exception as e:
+            logger.exception(f"Speech analysis failed for job {job.id}")
+            errors.append(f"Speech analysis failed: {str(e)}")
+            sp_result = SPEECH_FALLBACKS[job.job_type]
+        _finish_stage(job, 'features')
+
+    return hw_result, sp_result, errors
+
+
+def _save_results(job, hw_result, sp_result):
+    """Create the analysis rows of a job and, for combined jobs, its detection result"""
+    hw_analysis = sp_analysis = detection_result = None
+    if hw_result is not None:
+        hw_analysis = HandwritingAnalysis(sample=job.handwriting_sample, user=job.user, **hw_result)
+    if sp_result is not None:
+        sp_analysis = SpeechAnalysis(sample=job.speech_sample, user=job.user, **sp_result)
+
+    if job.job_type == 'combined':
+        _start_stage(job, 'detection')
+        engine = DyslexiaDetectionEngine()
+        result = engine.detect_dyslexia(
+            hw_analysis.__dict__ if hw_analysis else None,
+            sp_analysis.__dict__ if sp_analysis else None
+        )
+
+    # Write everything together, so a retried job never leaves duplicates
+    with transaction.atomic():
+        if hw_analysis:
+            hw_analysis.save()
+        if sp_analysis:
+            sp_analysis.save()
+        if job.job_type == 'combined':
+            detection_result = DetectionResult.objects.create(
+                user=job.user,
+                handwriting_sample=job.handwriting_sample,
+                speech_sample=job.speech_sample,
+                handwriting_analysis=hw_analysis,
+                speech_analysis=sp_analysis,
+                dyslexia_probability=result['dyslexia_probability'],
+                dysgraphia_probability=result['dysgraphia_probability'],
+                overall_risk_score=result['overall_risk_score'],
+                risk_level=result['risk_level'],
+                detection_confidence=result['detection_confidence'],
+                recommended_actions=result['recommended_actions'],
+                strengths_identified=result['strengths_identified'],
+                areas_of_concern=result['areas_of_concern']
+            )
+        _finish_stage(job, 'detection')
+        job.handwriting_analysis = hw_analysis
+        job.speech_analysis = sp_analysis
+        job.detection_result = detection_result
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        # Rolls everything back if another worker has taken the job over
+        _heartbeat(
+            job, status=job.status, finished_at=job.finished_at, error=job.error,
+            handwriting_analysis=hw_analysis, speech_analysis=sp_analysis, detection_result=detection_result
+        )
+
+
+def run_job(job, handwriting_upload=None):
+    """
+    Run a claimed job and record its outcome.
+
+    Analyzer failures are saved as fallback results with the job still
+    done, like the synchronous views did; any other error queues the job
+    again until it runs out of attempts. A run whose job was requeued and
+    claimed by another worker stops without saving anything.
+
+    Args:
+        job (AnalysisJob): Job in the 'running' state
+        handwriting_upload (UploadedFile): Upload of the handwriting sample, when
+            run in the request that received it
+
+    Returns:
+        AnalysisJob: The job with its final or requeued state
+    """
+    try:
+        hw_result, sp_result, errors = _analyze_samples(job, handwriting_upload)
+        job.error = '\n'.join(errors)
+        _save_results(job, hw_result, sp_result)
+        logger.info(f"Finished analysis job {job.id}")
+    except JobLost as e:
+        logger.warning(f"{e}; dropping the results of that attempt")
+        job.refresh_from_db()
+    except Exception as e:
+        logger.exception(f"Analysis job {job.id} failed")
+        job.status = 'failed' if job.attempts >= get_max_attempts() else 'queued'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        _owned(job).update(status=job.status, error=job.error, finished_at=job.finished_at)
+    return job
+
+
+def get_job_status(job):
+    """
+    Progress of a job for the status endpoint and event stream.
+
+    Args:
+        job (AnalysisJob): Job loaded with at least STATUS_FIELDS
+
+    Returns:
+        dict: JSON-serializable status, stage states and result ids
+    """
+    stages = []
+    for name in JOB_STAGES[job.job_type]:
+        entry = job.stages.get(name, {})
+        stages.append({'name': name, 'state': entry.get('state', 'pending'), 'seconds': entry.get('seconds')})
+
+    if job.status == 'done':
+        progress = 1.0
+    else:
+        progress = round(sum(stage['state'] == 'done' for stage in stages) / len(stages), 2)
+
+    return {
+        'job_id': str(job.id),
+        'job_type': job.job_type,
+        'status': job.status,
+        'progress': progress,
+        'stages': stages,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'handwriting_analysis_id': _id_or_none(job.handwriting_analysis_id),
+        'speech_analysis_id': _id_or_none(job.speech_analysis_id),
+        'detection_result_id': _id_or_none(job.detection_result_id),
+    }
+
+
+def _id_or_none(value):
+    return str(value) if value else None
+
+
+def get_latest_sample_job(user, sample_id):
+    """
+    Most recent job of a user's handwriting or speech sample.
+
+    Returns:
+        AnalysisJob: Job loaded with STATUS_FIELDS, or None if the sample was never queued
+    """
+    return (
+        AnalysisJob.objects.filter(user=user)
+        .filter(Q(handwriting_sample_id=sample_id) | Q(speech_sample_id=sample_id))
+        .only(*STATUS_FIELDS).order_by('-created_at').first()
+    )
+
+
+async def job_status_events(job_id, poll_interval=None, max_seconds=None):
+    """
+    Server-sent events reporting a job's progress until it finishes.
+
+    The job row is read every ANALYSIS_EVENTS_POLL_INTERVAL seconds and a
+    'progress' event is sent whenever its status changes (with a comment
+    line in between to keep the connection open). A final 'done' event
+    tells the client to close instead of reconnecting.
+
+    Args:
+        job_id: Id of the job to follow
+        poll_interval (float): Seconds between reads of the job row
+        max_seconds (float): Give up after this long; clients reconnect
+
+    Yields:
+        str: Event stream chunks
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'ANALYSIS_EVENTS_POLL_INTERVAL', DEFAULT_EVENTS_POLL_INTERVAL)
+    if max_seconds is None:
+        max_seconds = getattr(settings, 'ANALYSIS_EVENTS_MAX_SECONDS', DEFAULT_EVENTS_MAX_SECONDS)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    last_status = None
+    while True:
+        job = await AnalysisJob.objects.only(*STATUS_FIELDS).filter(id=job_id).afirst()
+        if job is None:
+            return
+
+        status = get_job_status(job)
+        if status != last_status:
+            yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+            last_status = status
+        else:
+            yield ": waiting\n\n"
+
+        if job.status in ('done', 'failed'):
+            yield f"event: done\ndata: {json.dumps({'status': job.status})}\n\n"
+            return
+        if loop.time() >= deadline:
+            return
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,133 @@
+"""
+Analysis Worker Pool
+Runs speech analysis in worker processes so it can overlap other work
+
+Speech feature extraction is CPU-bound Python (librosa/NumPy holding the
+GIL for much of the work), so a thread would not run it alongside the
+handwriting analysis; a separate process does. The pool is created on
+first use and shared by every request handled by this process. Workers
+are started with 'spawn' rather than forked, since the parent may already
+be running TensorFlow threads. A spawned worker is a fresh interpreter,
+so each one sets Django up before its first job, with the SPEECH_*
+settings of the process that started the pool (the PCM cache directory
+and budget among them).
+
+Jobs must be picklable and must not use the database: the request thread
+keeps all database access.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROCESSES = 2
+
+# Settings passed on to the workers as they are in this process
+WORKER_SETTINGS_PREFIX = 'SPEECH_'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_count():
+    """Number of speech worker processes; 0 runs jobs in the calling thread"""
+    return getattr(settings, 'ANALYSIS_SPEECH_PROCESSES', DEFAULT_PROCESSES)
+
+
+def _init_worker(worker_settings):
+    """
+    Set Django up in a new worker process.
+
+    Without this the worker's settings stay unconfigured and the speech
+    analyzer decodes every recording instead of using the PCM cache.
+
+    Args:
+        worker_settings (dict): Setting values of the parent process
+    """
+    import django
+    django.setup()
+    for name, value in worker_settings.items():
+        setattr(settings, name, value)
+
+
+def get_process_pool():
+    """
+    Return the process-wide worker pool, creating it on first use.
+
+    Returns:
+        ProcessPoolExecutor: Shared pool, or None if worker processes are disabled
+    """
+    global _pool
+    processes = get_process_count()
+    if processes <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            worker_settings = {name: getattr(settings, name) for name in dir(settings)
+                               if name.startswith(WORKER_SETTINGS_PREFIX)}
+            _pool = ProcessPoolExecutor(max_workers=processes,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(worker_settings,))
+            logger.info(f"Started analysis pool with {processes} worker processes")
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a broken pool so the next job starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def run_in_process(fn, *args, **kwargs):
+    """
+    Start fn(*args, **kwargs) in a worker process.
+
+    If worker processes are disabled the job runs here and the returned
+    future is already done. A pool whose worker died (e.g. killed for
+    memory) is replaced, so one failed job does not break later ones.
+
+    Returns:
+        concurrent.futures.Future: Result of the job
+    """
+    pool = get_process_pool()
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    try:
+        future = pool.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        logger.warning("Analysis pool was broken, starting a new one")
+        _discard_pool(pool)
+        pool = get_process_pool()
+        future = pool.submit(fn, *args, **kwargs)
+
+    def discard_if_broken(done):
+        if isinstance(done.exception(), BrokenProcessPool):
+            logger.warning("Analysis worker process died, the pool will be restarted")
+            _discard_pool(pool)
+
+    future.add_done_callback(discard_if_broken)
+    return future
+
+
+def shutdown_pool(wait=True):
+    """Stop the worker processes, e.g. before forking or at shutdown"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
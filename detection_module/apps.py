@@ -1,6 +1,62 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+# manage.py commands that serve requests or run analyses; others (migrate,
+# shell, test, ...) never preload models
+PRELOAD_COMMANDS = ('runserver', 'run_analysis_worker')
+
+# Servers that import the WSGI/ASGI application and then handle requests
+SERVER_EXECUTABLES = ('gunicorn', 'uvicorn', 'daphne')
+
+
+def is_serving_process():
+    """
+    Whether this process will serve requests or run analysis jobs.
+
+    Only manage.py's serving commands and the known WSGI/ASGI servers count;
+    django-admin, pytest, celery and other scripts that set up Django don't.
+    Servers started some other way set ML_MODEL_PRELOAD_SERVING = True.
+    """
+    if getattr(settings, 'ML_MODEL_PRELOAD_SERVING', False):
+        return True
+    if not sys.argv:
+        return False
+    program = os.path.basename(sys.argv[0])
+    if program == '__main__.py':
+        # python -m gunicorn
+        program = os.path.basename(os.path.dirname(sys.argv[0]))
+    if program in SERVER_EXECUTABLES:
+        return True
+    if program != 'manage.py':
+        return False
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'runserver':
+        # The autoreloader's parent process only watches files
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return command in PRELOAD_COMMANDS
 
 
 class DetectionModuleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'detection_module'
+
+    def ready(self):
+        model_names = getattr(settings, 'ML_MODEL_PRELOAD', [])
+        if not model_names or not is_serving_process():
+            return
+
+        # Import TensorFlow/Keras only when preloading is enabled
+        from ml_models.model_loader import import_model_modules, preload_models
+
+        if getattr(settings, 'ML_MODEL_PRELOAD_AFTER_FORK', False):
+            # TensorFlow hangs in a child forked after the parent ran any op, so
+            # a pre-fork master only imports the libraries, which its workers
+            # then share copy-on-write, and each worker loads and warms up its
+            # models as soon as it is forked
+            import_model_modules(model_names)
+            os.register_at_fork(after_in_child=lambda: preload_models(model_names))
+        else:
+            preload_models(model_names)
@@ -0,0 +1,61 @@
+"""
+Django management command to run queued sample analyses
+Usage: python manage.py run_analysis_worker [--once] [--poll-interval SECONDS] [--max-jobs N]
+"""
+
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from detection_module.analysis_jobs import claim_next_job, requeue_stale_jobs, run_job
+from detection_module.analysis_pool import shutdown_pool
+
+
+class Command(BaseCommand):
+    help = 'Run queued analysis jobs; start several workers to drain the queue in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument('--max-jobs', type=int, help='Exit after running this many jobs')
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            # Finish the current job, then exit
+            stopping.set()
+
+        previous_handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+        self.stdout.write(self.style.SUCCESS(f"Analysis worker {worker} started"))
+        done = 0
+        try:
+            while not stopping.is_set():
+                close_old_connections()
+                requeue_stale_jobs()
+                job = claim_next_job(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    stopping.wait(options['poll_interval'])
+                    continue
+
+                job = run_job(job)
+                done += 1
+                style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+                self.stdout.write(style(f"  {job.get_job_type_display()} job {job.id}: {job.status}"))
+                if options['max_jobs'] and done >= options['max_jobs']:
+                    break
+        finally:
+            shutdown_pool()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(f"Analysis worker {worker} stopped after {done} job(s)"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_module', '0002_alter_detectionresult_risk_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analysis_type', models.CharField(choices=[('handwriting', 'Handwriting'), ('speech', 'Speech')], max_length=20)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the sample bytes and text', max_length=64)),
+                ('analyzer_version', models.CharField(max_length=100)),
+                ('result', models.JSONField(help_text='Analyzer result dict')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'unique_together': {('analysis_type', 'content_hash', 'analyzer_version')},
+            },
+        ),
+    ]
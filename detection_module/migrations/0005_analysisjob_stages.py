@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_module', '0004_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='stages',
+            field=models.JSONField(default=dict, help_text='State and duration of each progress stage'),
+        ),
+    ]
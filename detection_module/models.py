@@ -59,4 +59,69 @@ class DetectionModel(models.Model):
     accuracy_score = models.FloatField(null=True, blank=True)
     
     def __str__(self):
-        return f"{self.name} v{self.version}"
\ No newline at end of file
+        return f"{self.name} v{self.version}"
+
+class AnalysisCacheEntry(models.Model):
+    """Stored analyzer output keyed by sample content hash and analyzer version"""
+    ANALYSIS_TYPES = [
+        ('handwriting', 'Handwriting'),
+        ('speech', 'Speech'),
+    ]
+    analysis_type = models.CharField(max_length=20, choices=ANALYSIS_TYPES)
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the sample bytes and text")
+    analyzer_version = models.CharField(max_length=100)
+    result = models.JSONField(help_text="Analyzer result dict")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        unique_together = ('analysis_type', 'content_hash', 'analyzer_version')
+    
+    def __str__(self):
+        return f"{self.analysis_type} cache {self.content_hash[:12]} ({self.analyzer_version})"
+
+class AnalysisJob(models.Model):
+    """Queued sample analysis, run by manage.py run_analysis_worker"""
+    JOB_TYPES = [
+        ('handwriting', 'Handwriting Analysis'),
+        ('speech', 'Speech Analysis'),
+        ('combined', 'Combined Detection'),
+    ]
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    job_type = models.CharField(max_length=20, choices=JOB_TYPES)
+    
+    # Input samples
+    handwriting_sample = models.ForeignKey('data_collection.HandwritingSample', on_delete=models.CASCADE, null=True, blank=True)
+    speech_sample = models.ForeignKey('data_collection.SpeechSample', on_delete=models.CASCADE, null=True, blank=True)
+    
+    # Queue state
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker that last claimed the job")
+    error = models.TextField(blank=True, help_text="Analyzer failures or the error that stopped the job")
+    stages = models.JSONField(default=dict, help_text="State and duration of each progress stage")
+    
+    # Results
+    handwriting_analysis = models.ForeignKey('handwriting_analysis.HandwritingAnalysis', on_delete=models.SET_NULL, null=True, blank=True)
+    speech_analysis = models.ForeignKey('speech_analysis.SpeechAnalysis', on_delete=models.SET_NULL, null=True, blank=True)
+    detection_result = models.ForeignKey(DetectionResult, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the running worker")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"{self.get_job_type_display()} job {self.id} ({self.status})"
@@ -0,0 +1,219 @@
+"""
+Analysis Result Cache
+Content-addressed cache of analyzer results, stored in the project database
+
+Results are keyed by a SHA-256 of the sample bytes (plus its text, which
+affects scores such as reading speed) and the analyzer/model version, so
+re-analyzing an identical upload costs a database lookup instead of a full
+CV/ML run. The least recently used entries are evicted once the table grows
+past ANALYSIS_CACHE_MAX_ENTRIES.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+
+# Process-local counters
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def hash_sample(sample_file, text_content=''):
+    """
+    Hash a sample's bytes together with its text content.
+
+    Args:
+        sample_file: Path, bytes or readable binary file object
+        text_content (str): Text that was written or read aloud
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    if isinstance(sample_file, (bytes, bytearray, memoryview)):
+        digest.update(sample_file)
+    elif hasattr(sample_file, 'read'):
+        if hasattr(sample_file, 'seek'):
+            sample_file.seek(0)
+        for chunk in iter(lambda: sample_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    else:
+        with open(sample_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    digest.update(b'\0')
+    digest.update((text_content or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    """Convert NumPy scalars/arrays returned by the analyzers"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def get_cached_result(analysis_type, content_hash, analyzer_version):
+    """
+    Look up a stored result.
+
+    Returns:
+        dict: Cached analyzer result or None on a miss
+    """
+    entry = AnalysisCacheEntry.objects.filter(
+        analysis_type=analysis_type,
+        content_hash=content_hash,
+        analyzer_version=analyzer_version
+    ).only('id', 'result').first()
+
+    if entry is None:
+        _count('misses')
+        return None
+
+    AnalysisCacheEntry.objects.filter(id=entry.id).update(
+        hit_count=F('hit_count') + 1,
+        last_accessed=timezone.now()
+    )
+    _count('hits')
+    return entry.result
+
+
+def store_result(analysis_type, content_hash, analyzer_version, result):
+    """Store an analyzer result and evict old entries if over budget"""
+    try:
+        with transaction.atomic():
+            AnalysisCacheEntry.objects.create(
+                analysis_type=analysis_type,
+                content_hash=content_hash,
+                analyzer_version=analyzer_version,
+                result=json.loads(json.dumps(result, default=_json_default))
+            )
+    except IntegrityError:
+        # Another request stored the same sample first
+        return
+    evict_entries()
+
+
+def evict_entries(max_entries=None):
+    """
+    Delete least recently used entries beyond the configured maximum.
+
+    Returns:
+        int: Number of entries evicted
+    """
+    if max_entries is None:
+        max_entries = getattr(settings, 'ANALYSIS_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    stale_ids = list(
+        AnalysisCacheEntry.objects.order_by('-last_accessed', '-id')
+        .values_list('id', flat=True)[max_entries:]
+    )
+    if not stale_ids:
+        return 0
+
+    AnalysisCacheEntry.objects.filter(id__in=stale_ids).delete()
+    _count('evictions', len(stale_ids))
+    logger.info(f"Evicted {len(stale_ids)} analysis cache entries")
+    return len(stale_ids)
+
+
+def cached_analysis(analysis_type, sample_file, text_content, analyzer_version, analyze):
+    """
+    Return the cached result for a sample, running analyze() on a miss.
+
+    Args:
+        analysis_type (str): 'handwriting' or 'speech'
+        sample_file: Path, bytes or readable binary file object of the sample
+        text_content (str): Sample text, part of the cache key
+        analyzer_version (str): Analyzer and model version, part of the cache key
+        analyze (callable): Computes the result when it is not cached
+
+    Returns:
+        dict: Analyzer result
+    """
+    content_hash = hash_sample(sample_file, text_content)
+    result = get_cached_result(analysis_type, content_hash, analyzer_version)
+    if result is not None:
+        logger.info(f"Analysis cache hit: {analysis_type} {content_hash[:12]}")
+        return result
+
+    result = analyze()
+    store_result(analysis_type, content_hash, analyzer_version, result)
+    return result
+
+
+def start_cached_analysis(analysis_type, sample_file, text_content, analyzer_version, submit):
+    """
+    Like cached_analysis, but start the analysis without waiting for it.
+
+    The lookup and the store both run in the calling thread, so the
+    analysis itself can run in a worker that has no database access.
+
+    Args:
+        analysis_type (str): 'handwriting' or 'speech'
+        sample_file: Path, bytes or readable binary file object of the sample
+        text_content (str): Sample text, part of the cache key
+        analyzer_version (str): Analyzer and model version, part of the cache key
+        submit (callable): Starts the analysis and returns a concurrent.futures.Future
+
+    Returns:
+        callable: Waits for the result, storing it on a cache miss, and returns it;
+        given a timeout in seconds it raises concurrent.futures.TimeoutError if the
+        analysis is still running by then
+    """
+    content_hash = hash_sample(sample_file, text_content)
+    result = get_cached_result(analysis_type, content_hash, analyzer_version)
+    if result is not None:
+        logger.info(f"Analysis cache hit: {analysis_type} {content_hash[:12]}")
+        return lambda timeout=None: result
+
+    future = submit()
+
+    def wait(timeout=None):
+        analyzed = future.result(timeout)
+        store_result(analysis_type, content_hash, analyzer_version, analyzed)
+        return analyzed
+    return wait
+
+
+def get_cache_stats():
+    """
+    Get cache counters for this process and the size of the shared table.
+
+    Returns:
+        dict: hits, misses, evictions, hit_rate and entries
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+    stats['entries'] = AnalysisCacheEntry.objects.count()
+    return stats
+
+
+def clear_result_cache():
+    """Delete all cached results and reset the counters."""
+    AnalysisCacheEntry.objects.all().delete()
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import soundfile as sf
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models.fields.files import FieldFile
+from django.apps import apps
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from data_collection.models import HandwritingSample
+
+from .analysis_jobs import (
+    claim_job, claim_next_job, enqueue_analysis, get_job_status, requeue_stale_jobs, run_job
+)
+from .analysis_pool import run_in_process, shutdown_pool
+from .apps import is_serving_process
+from .models import AnalysisCacheEntry, AnalysisJob, DetectionResult
+from .result_cache import cached_analysis, clear_result_cache, get_cache_stats, hash_sample, store_result
+
+
+class AnalysisJobQueueTests(TestCase):
+    """Claiming and recovering queued analyses"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+
+    def test_jobs_are_claimed_oldest_first_and_only_once(self):
+        first = enqueue_analysis('combined', self.user)
+        second = enqueue_analysis('combined', self.user)
+
+        self.assertEqual(claim_next_job('worker-a').id, first.id)
+        self.assertEqual(claim_next_job('worker-b').id, second.id)
+        self.assertIsNone(claim_next_job('worker-a'))
+        self.assertFalse(claim_job(first.id, 'worker-b'))
+
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker, first.attempts), ('running', 'worker-a', 1))
+
+    @override_settings(ANALYSIS_JOB_MAX_ATTEMPTS=2)
+    def test_abandoned_jobs_are_requeued_until_out_of_attempts(self):
+        retry = enqueue_analysis('combined', self.user)
+        exhausted = enqueue_analysis('combined', self.user)
+        slow = enqueue_analysis('combined', self.user)
+        AnalysisJob.objects.filter(id=retry.id).update(status='running', attempts=1)
+        AnalysisJob.objects.filter(id=exhausted.id).update(status='running', attempts=2)
+        AnalysisJob.objects.filter(id=slow.id).update(status='running', attempts=1, heartbeat_at=timezone.now())
+        AnalysisJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale_jobs(timeout=60), 2)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        slow.refresh_from_db()
+        self.assertEqual(retry.status, 'queued')
+        self.assertEqual(exhausted.status, 'failed')
+        # Started long ago but still sending heartbeats
+        self.assertEqual(slow.status, 'running')
+
+    def test_requeued_job_saves_results_once(self):
+        enqueue_analysis('combined', self.user)
+        first_attempt = claim_next_job('worker-a')
+        # worker-a looked dead, so the job went back to the queue and worker-b took it
+        AnalysisJob.objects.filter(id=first_attempt.id).update(status='queued')
+        second_attempt = claim_next_job('worker-b')
+
+        first_attempt = run_job(first_attempt)
+        self.assertEqual((first_attempt.status, first_attempt.worker), ('running', 'worker-b'))
+        self.assertFalse(DetectionResult.objects.exists())
+
+        self.assertEqual(run_job(second_attempt).status, 'done')
+        self.assertEqual(DetectionResult.objects.count(), 1)
+
+    def test_running_a_combined_job_saves_a_detection_result(self):
+        enqueue_analysis('combined', self.user)
+        job = run_job(claim_next_job('worker-a'))
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.detection_result, DetectionResult.objects.get(user=self.user))
+
+    def test_status_reports_each_stage(self):
+        job = enqueue_analysis('combined', self.user)
+        status = get_job_status(job)
+        self.assertEqual((status['status'], status['progress']), ('queued', 0.0))
+        self.assertEqual([stage['name'] for stage in status['stages']], ['decode', 'features', 'model', 'detection'])
+
+        status = get_job_status(run_job(claim_next_job('worker-a')))
+        states = {stage['name']: stage['state'] for stage in status['stages']}
+        self.assertEqual((status['status'], status['progress']), ('done', 1.0))
+        # A job without samples decodes nothing and skips the analyzers
+        self.assertEqual(states, {'decode': 'done', 'features': 'pending', 'model': 'pending', 'detection': 'done'})
+        self.assertEqual(status['detection_result_id'], str(DetectionResult.objects.get().id))
+
+    @override_settings(ANALYSIS_JOBS_INLINE=True)
+    def test_inline_jobs_run_before_enqueue_returns(self):
+        job = enqueue_analysis('combined', self.user)
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.worker, 'inline')
+
+    @override_settings(ANALYSIS_JOBS_INLINE=True)
+    def test_inline_jobs_decode_the_upload_in_memory(self):
+        import cv2
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        image = np.full((48, 96), 255, dtype=np.uint8)
+        image[10:38, 10:30] = image[10:38, 50:80] = 0
+        upload = SimpleUploadedFile('sample.png', cv2.imencode('.png', image)[1].tobytes(), 'image/png')
+
+        with self.settings(MEDIA_ROOT=tmp.name):
+            sample = HandwritingSample.objects.create(user=self.user, image_file=upload, text_content='')
+            # The stored image is never read back
+            with mock.patch.object(FieldFile, 'open', side_effect=AssertionError('read from storage')):
+                job = enqueue_analysis('handwriting', self.user, handwriting_sample=sample, handwriting_upload=upload)
+
+        self.assertEqual((job.status, job.error), ('done', ''))
+        self.assertTrue(HandwritingSample.objects.get(id=sample.id).is_preprocessed)
+
+    def test_worker_command_drains_the_queue(self):
+        jobs = [enqueue_analysis('combined', self.user) for _ in range(3)]
+
+        call_command('run_analysis_worker', '--once', stdout=StringIO())
+
+        self.assertEqual(
+            set(AnalysisJob.objects.filter(id__in=[job.id for job in jobs]).values_list('status', flat=True)),
+            {'done'}
+        )
+
+
+class ResultCacheTests(TestCase):
+    """Analyzer results cached by sample content and analyzer version"""
+
+    def setUp(self):
+        clear_result_cache()
+        self.addCleanup(clear_result_cache)
+        self.runs = 0
+
+    def analyze(self, sample=b'sample bytes', text='the cat sat', version='1.0'):
+        def run():
+            self.runs += 1
+            return {'score': np.float32(0.5), 'run': self.runs}
+        return cached_analysis('handwriting', sample, text, version, run)
+
+    def test_hits_and_misses_are_counted(self):
+        self.assertEqual(self.analyze(), {'score': 0.5, 'run': 1})
+        self.assertEqual(self.analyze(), {'score': 0.5, 'run': 1})
+        self.assertEqual(self.analyze(), {'score': 0.5, 'run': 1})
+
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.667)
+        self.assertEqual(AnalysisCacheEntry.objects.get().hit_count, 2)
+
+    def test_key_covers_text_and_analyzer_version(self):
+        self.analyze()
+        self.analyze(text='the dog sat')
+        self.analyze(version='1.1')
+        self.analyze(sample=b'other bytes')
+        self.assertEqual(self.runs, 4)
+        self.assertNotEqual(hash_sample(b'ab', 'c'), hash_sample(b'a', 'bc'))
+
+    @override_settings(ANALYSIS_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        self.analyze(sample=b'first')
+        self.analyze(sample=b'second')
+        AnalysisCacheEntry.objects.update(last_accessed=timezone.now() - timedelta(minutes=5))
+        # A hit makes the first entry the most recently used
+        self.analyze(sample=b'first')
+        self.analyze(sample=b'third')
+
+        self.assertEqual(self.runs, 3)
+        self.assertEqual(get_cache_stats()['evictions'], 1)
+        self.assertEqual(AnalysisCacheEntry.objects.filter(content_hash=hash_sample(b'second', 'the cat sat')).count(), 0)
+        self.analyze(sample=b'first')
+        self.assertEqual(self.runs, 3)
+
+    def test_concurrent_writers_keep_the_first_result(self):
+        content_hash = hash_sample(b'sample bytes', 'the cat sat')
+        store_result('handwriting', content_hash, '1.0', {'run': 'a'})
+        # A second writer that missed before the first one stored its result
+        store_result('handwriting', content_hash, '1.0', {'run': 'b'})
+
+        self.assertEqual(AnalysisCacheEntry.objects.get().result, {'run': 'a'})
+        # The connection is still usable after the IntegrityError
+        self.assertEqual(self.analyze(), {'run': 'a'})
+
+
+class AnalysisPoolTests(SimpleTestCase):
+    """Speech analyses in worker processes"""
+
+    def setUp(self):
+        # Each test starts a pool with its own settings
+        shutdown_pool()
+        self.addCleanup(shutdown_pool)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_workers_decode_through_the_pcm_cache(self):
+        from speech_analysis.audio_analyzer import SpeechAnalyzer
+        audio_path = os.path.join(self.tmp.name, 'reading.wav')
+        t = np.arange(22050) / 22050
+        sf.write(audio_path, 0.5 * np.sin(2 * np.pi * 220 * t), 22050)
+        cache_dir = os.path.join(self.tmp.name, 'pcm')
+
+        with self.settings(ANALYSIS_SPEECH_PROCESSES=1, SPEECH_PCM_CACHE_DIR=cache_dir):
+            result = run_in_process(SpeechAnalyzer().analyze_speech, audio_path).result(timeout=120)
+
+        self.assertIn('fluency_score', result)
+        self.assertEqual([name.endswith('.npy') for name in os.listdir(cache_dir)], [True])
+
+
+class ModelPreloadTests(SimpleTestCase):
+    """Preloading models from DetectionModuleConfig.ready()"""
+
+    def ready(self, argv, environ=None):
+        config = apps.get_app_config('detection_module')
+        with mock.patch('sys.argv', argv), mock.patch.dict('os.environ', environ or {}), \
+                mock.patch('ml_models.model_loader.preload_models') as preload, \
+                mock.patch('ml_models.model_loader.import_model_modules') as import_modules, \
+                mock.patch('os.register_at_fork') as register_at_fork:
+            config.ready()
+        return preload, import_modules, register_at_fork
+
+    def test_serving_processes(self):
+        with mock.patch('sys.argv', ['/venv/bin/gunicorn', 'Dyslexia.wsgi']):
+            self.assertTrue(is_serving_process())
+        with mock.patch('sys.argv', ['manage.py', 'run_analysis_worker']):
+            self.assertTrue(is_serving_process())
+        with mock.patch('sys.argv', ['manage.py', 'migrate']):
+            self.assertFalse(is_serving_process())
+        with mock.patch('sys.argv', ['manage.py', 'runserver']), mock.patch.dict('os.environ', {'RUN_MAIN': ''}):
+            self.assertFalse(is_serving_process())
+        with mock.patch('sys.argv', ['manage.py', 'runserver']), mock.patch.dict('os.environ', {'RUN_MAIN': 'true'}):
+            self.assertTrue(is_serving_process())
+        with mock.patch('sys.argv', ['/venv/lib/python3.11/site-packages/uvicorn/__main__.py', 'Dyslexia.asgi:application']):
+            self.assertTrue(is_serving_process())
+        # Other programs that set up Django
+        for argv in (['/venv/bin/django-admin', 'migrate'], ['/venv/bin/pytest'], ['/venv/bin/celery', 'worker'], []):
+            with self.subTest(argv=argv), mock.patch('sys.argv', argv):
+                self.assertFalse(is_serving_process())
+                with self.settings(ML_MODEL_PRELOAD_SERVING=True):
+                    self.assertTrue(is_serving_process())
+
+    def test_preloading_is_opt_in(self):
+        preload, _, _ = self.ready(['/venv/bin/gunicorn', 'Dyslexia.wsgi'])
+        preload.assert_not_called()
+
+    @override_settings(ML_MODEL_PRELOAD=['handwriting_cnn'])
+    def test_preloads_in_serving_processes_only(self):
+        preload, _, _ = self.ready(['/venv/bin/gunicorn', 'Dyslexia.wsgi'])
+        preload.assert_called_once_with(['handwriting_cnn'])
+
+        preload, _, _ = self.ready(['manage.py', 'migrate'])
+        preload.assert_not_called()
+
+    @override_settings(ML_MODEL_PRELOAD=['handwriting_cnn'], ML_MODEL_PRELOAD_AFTER_FORK=True)
+    def test_pre_fork_master_only_imports(self):
+        preload, import_modules, register_at_fork = self.ready(['/venv/bin/gunicorn', 'Dyslexia.wsgi'])
+        import_modules.assert_called_once_with(['handwriting_cnn'])
+        preload.assert_not_called()
+
+        register_at_fork.call_args.kwargs['after_in_child']()
+        preload.assert_called_once_with(['handwriting_cnn'])
@@ -5,51 +5,249 @@ import tensorflow as tf
 from tensorflow import keras
 from sklearn.preprocessing import StandardScaler
 import json
-from typing import Dict, List, Tuple, Optional
+import os
+import weakref
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union, BinaryIO
+from ml_models import load_model, get_model_version
+
+# Bump when preprocessing or scoring changes so cached results are not reused
+ANALYZER_VERSION = '1.0'
+
+INPUT_SHAPE = (64, 64, 1)
+
+# A file path, encoded image bytes or a readable binary file object
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+
+def build_handwriting_cnn():
+    """Create CNN model architecture"""
+    model = keras.Sequential([
+        keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=INPUT_SHAPE),
+        keras.layers.MaxPooling2D((2, 2)),
+        keras.layers.Conv2D(64, (3, 3), activation='relu'),
+        keras.layers.MaxPooling2D((2, 2)),
+        keras.layers.Conv2D(64, (3, 3), activation='relu'),
+        keras.layers.Flatten(),
+        keras.layers.Dense(64, activation='relu'),
+        keras.layers.Dropout(0.5),
+        keras.layers.Dense(4, activation='sigmoid')  # 4 outputs: irregular_shapes, spacing, stroke_pattern, overall
+    ])
+    
+    model.compile(optimizer='adam', loss='mse', metrics=['accuracy'])
+    return model
+
+
+def decode_grayscale_image(image_source: ImageSource) -> Optional[np.ndarray]:
+    """
+    Decode an image to grayscale from a path, bytes or a file-like object.
+    
+    Bytes and file objects are decoded in memory with cv2.imdecode, which
+    also covers storage backends that have no local file path.
+    
+    Returns:
+        np.ndarray: uint8 grayscale image, or None if it cannot be decoded
+    """
+    if isinstance(image_source, (str, os.PathLike)):
+        return cv2.imread(os.fspath(image_source), cv2.IMREAD_GRAYSCALE)
+    
+    if hasattr(image_source, 'read'):
+        # Uploads are left at EOF once they have been saved to storage
+        if hasattr(image_source, 'seek'):
+            image_source.seek(0)
+        image_source = image_source.read()
+    
+    buffer = np.frombuffer(image_source, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+
+
+def find_gaps(projection: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find runs of empty (zero) bins in an ink projection profile.
+    
+    Only runs that are closed by ink are returned; a blank margin running to
+    the end of the image is not a gap between strokes. This is
+    speech_analysis.audio_analyzer.find_runs(projection == 0), copied rather
+    than imported because that module loads librosa and soxr; the tests
+    check that the two agree.
+    
+    Returns:
+        tuple: (start indices, run lengths) as integer arrays
+    """
+    is_blank = np.asarray(projection).ravel() == 0
+    # Pad with ink so every blank run has a rising and a falling edge
+    transitions = np.flatnonzero(np.diff(np.concatenate(([0], is_blank.view(np.int8), [0]))))
+    starts, ends = transitions[0::2], transitions[1::2]
+    closed = ends < len(is_blank)
+    return starts[closed], (ends - starts)[closed]
+
+
+# Traced inference functions, one per live model
+_serving_functions = weakref.WeakKeyDictionary()
+
+
+def get_handwriting_model():
+    """Return the process-wide handwriting CNN, loading or building it on first use"""
+    return load_model('handwriting_cnn')
+
+
+def get_serving_function(model):
+    """
+    Return a traced inference function for model.
+    
+    Model.predict() sets up a data pipeline and callbacks on every call, which
+    dominates latency for a handful of 64x64 images. The returned function
+    calls the model directly in inference mode through a tf.function with a
+    fixed input signature, so it is traced once (here, with a dummy batch)
+    and reused for every batch size.
+    """
+    serving_fn = _serving_functions.get(model)
+    if serving_fn is None:
+        model_ref = weakref.ref(model)
+        
+        @tf.function(input_signature=[tf.TensorSpec(shape=(None,) + INPUT_SHAPE, dtype=tf.float32)])
+        def serving_fn(images):
+            return model_ref()(images, training=False)
+        
+        # Warm up so the first real request does not pay for tracing
+        serving_fn(tf.zeros((1,) + INPUT_SHAPE, dtype=tf.float32))
+        _serving_functions[model] = serving_fn
+    return serving_fn
+
+
+def predict_handwriting(model, images: np.ndarray) -> np.ndarray:
+    """Score a (batch, 64, 64, 1) array with the traced serving function"""
+    images = tf.convert_to_tensor(images, dtype=tf.float32)
+    return get_serving_function(model)(images).numpy()
+
+
+class HandwritingFeatures:
+    """
+    Per-image cache of the intermediate CV products used by the heuristics.
+    
+    Each product (uint8 image, binary mask, edge maps, gradients, contours)
+    is computed on first access and reused by every heuristic that needs it,
+    so adding a heuristic does not mean thresholding or running Canny again.
+    """
+    
+    def __init__(self, image: np.ndarray):
+        self.image = image
+    
+    @classmethod
+    def wrap(cls, image) -> 'HandwritingFeatures':
+        """Return image unchanged if it already is a feature context"""
+        return image if isinstance(image, cls) else cls(image)
+    
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.image.shape
+    
+    @cached_property
+    def uint8(self) -> np.ndarray:
+        """Image rescaled to 0-255"""
+        return (self.image * 255).astype(np.uint8)
+    
+    @cached_property
+    def binary(self) -> np.ndarray:
+        """Inverted binary mask (ink = 255)"""
+        _, binary = cv2.threshold(self.uint8, 127, 255, cv2.THRESH_BINARY_INV)
+        return binary
+    
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """Canny edges of the grayscale image"""
+        return cv2.Canny(self.uint8, 50, 150)
+    
+    @cached_property
+    def binary_edges(self) -> np.ndarray:
+        """Canny edges of the binary mask"""
+        return cv2.Canny(self.binary, 50, 150)
+    
+    @cached_property
+    def gradients(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Sobel x/y gradients of the binary edge map"""
+        sobel_x = cv2.Sobel(self.binary_edges, cv2.CV_64F, 1, 0, ksize=3)
+        sobel_y = cv2.Sobel(self.binary_edges, cv2.CV_64F, 0, 1, ksize=3)
+        return sobel_x, sobel_y
+    
+    @cached_property
+    def stroke_angles(self) -> np.ndarray:
+        """Gradient directions at binary edge pixels"""
+        sobel_x, sobel_y = self.gradients
+        angles = np.arctan2(sobel_y, sobel_x)
+        return angles[self.binary_edges > 0]
+    
+    @cached_property
+    def column_gaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Blank column runs (letter/word spacing) as (starts, lengths)"""
+        return find_gaps(np.sum(self.binary, axis=0))
+    
+    @cached_property
+    def row_gaps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Blank row runs (line spacing) as (starts, lengths)"""
+        return find_gaps(np.sum(self.binary, axis=1))
+    
+    @cached_property
+    def contours(self) -> Tuple[np.ndarray, ...]:
+        """External contours of the grayscale edge map"""
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
 
 class HandwritingCNNAnalyzer:
     """
     CNN-based handwriting analysis for dyslexia/dysgraphia detection
+    
+    Instances are cheap to create: unless a custom model_path is given, the
+    CNN is shared by the whole process through the ml_models registry.
     """
     
     def __init__(self, model_path: Optional[str] = None):
-        self.model = None
+        self._model = None
+        self._model_path = None
         self.scaler = StandardScaler()
         self.load_model(model_path)
     
+    @property
+    def version(self) -> str:
+        """Analyzer and model version, used to key cached results"""
+        if self._model is not None:
+            model_version = f"custom:{self._model_path}:{os.path.getmtime(self._model_path)}"
+        else:
+            model_version = get_model_version('handwriting_cnn')
+        return f"{ANALYZER_VERSION}:{model_version}"
+    
+    @property
+    def model(self):
+        """CNN used for inference (the shared registry model by default)"""
+        if self._model is not None:
+            return self._model
+        return get_handwriting_model()
+    
     def load_model(self, model_path: Optional[str] = None):
-        """Load pre-trained CNN model"""
+        """Load a custom pre-trained CNN model, otherwise use the shared one"""
         if model_path and tf.io.gfile.exists(model_path):
-            self.model = keras.models.load_model(model_path)
+            self._model = keras.models.load_model(model_path)
+            self._model_path = model_path
         else:
-            # Create a simple CNN model for demonstration
-            self.model = self._create_model()
+            self._model = None
+            self._model_path = None
     
     def _create_model(self):
         """Create CNN model architecture"""
-        model = keras.Sequential([
-            keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(64, 64, 1)),
-            keras.layers.MaxPooling2D((2, 2)),
-            keras.layers.Conv2D(64, (3, 3), activation='relu'),
-            keras.layers.MaxPooling2D((2, 2)),
-            keras.layers.Conv2D(64, (3, 3), activation='relu'),
-            keras.layers.Flatten(),
-            keras.layers.Dense(64, activation='relu'),
-            keras.layers.Dropout(0.5),
-            keras.layers.Dense(4, activation='sigmoid')  # 4 outputs: irregular_shapes, spacing, stroke_pattern, overall
-        ])
-        
-        model.compile(optimizer='adam', loss='mse', metrics=['accuracy'])
-        return model
-    
-    def preprocess_image(self, image_path: str) -> np.ndarray:
+        return build_handwriting_cnn()
+    
+    def preprocess_image(self, image_source: ImageSource) -> np.ndarray:
         """Preprocess handwriting image for CNN analysis"""
         # Load and convert to grayscale
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        image = decode_grayscale_image(image_source)
         
         if image is None:
             # Return a blank canvas if image can't be read
-            return np.ones((64, 64), dtype=np.float32)
+            return np.ones((64, 64, 1), dtype=np.float32)
         
         # Resize to standard size
         image = cv2.resize(image, (64, 64))
@@ -62,11 +260,11 @@ class HandwritingCNNAnalyzer:
         
         return image
     
-    def analyze_irregular_shapes(self, image: np.ndarray) -> float:
+    def analyze_irregular_shapes(self, image) -> float:
         """Analyze irregular letter shapes"""
         # Extract features related to letter shape irregularities
-        edges = cv2.Canny((image * 255).astype(np.uint8), 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        features = HandwritingFeatures.wrap(image)
+        contours = features.contours
         
         if not contours:
             return 0.0
@@ -87,34 +285,16 @@ class HandwritingCNNAnalyzer:
         
         return np.mean(irregularity_scores) if irregularity_scores else 0.0
     
-    def analyze_spacing_issues(self, image: np.ndarray) -> float:
+    def analyze_spacing_issues(self, image) -> float:
         """Analyze spacing problems between letters and words"""
-        # Convert to binary
-        _, binary = cv2.threshold((image * 255).astype(np.uint8), 127, 255, cv2.THRESH_BINARY_INV)
-        
-        # Project horizontally to find letter boundaries
-        horizontal_projection = np.sum(binary, axis=0)
-        
-        # Find gaps (spaces between letters)
-        gaps = []
-        in_gap = False
-        gap_start = 0
-        
-        for i, value in enumerate(horizontal_projection):
-            if value == 0 and not in_gap:  # Start of gap
-                in_gap = True
-                gap_start = i
-            elif value > 0 and in_gap:  # End of gap
-                in_gap = False
-                gap_length = i - gap_start
-                if gap_length > 2:  # Only count significant gaps
-                    gaps.append(gap_length)
-        
-        if not gaps:
+        # Find gaps (spaces between letters), only counting significant ones
+        _, gap_lengths = HandwritingFeatures.wrap(image).column_gaps
+        gap_lengths = gap_lengths[gap_lengths > 2]
+        
+        if len(gap_lengths) == 0:
             return 0.0
         
         # Calculate spacing irregularity
-        gap_lengths = np.array(gaps)
         mean_gap = np.mean(gap_lengths)
         std_gap = np.std(gap_lengths)
         
@@ -122,21 +302,12 @@ class HandwritingCNNAnalyzer:
         spacing_irregularity = std_gap / mean_gap if mean_gap > 0 else 0
         return min(spacing_irregularity, 1.0)
     
-    def analyze_stroke_patterns(self, image: np.ndarray) -> float:
+    def analyze_stroke_patterns(self, image) -> float:
         """Analyze stroke pattern irregularities"""
-        # Convert to binary
-        _, binary = cv2.threshold((image * 255).astype(np.uint8), 127, 255, cv2.THRESH_BINARY_INV)
+        features = HandwritingFeatures.wrap(image)
         
-        # Detect edges
-        edges = cv2.Canny(binary, 50, 150)
-        
-        # Calculate stroke direction consistency
-        sobel_x = cv2.Sobel(edges, cv2.CV_64F, 1, 0, ksize=3)
-        sobel_y = cv2.Sobel(edges, cv2.CV_64F, 0, 1, ksize=3)
-        
-        # Calculate gradient directions
-        angles = np.arctan2(sobel_y, sobel_x)
-        angles = angles[edges > 0]  # Only consider edge pixels
+        # Calculate gradient directions, only considering edge pixels
+        angles = features.stroke_angles
         
         if len(angles) == 0:
             return 0.0
@@ -147,14 +318,66 @@ class HandwritingCNNAnalyzer:
         
         return stroke_irregularity
     
-    def analyze_handwriting(self, image_path: str) -> Dict:
-        """Complete handwriting analysis"""
-        # Preprocess image
-        processed_image = self.preprocess_image(image_path)
+    def analyze_handwriting(self, image_source: ImageSource) -> Dict:
+        """
+        Complete handwriting analysis
         
+        image_source may be a file path, the encoded image bytes or a file-like
+        object such as an upload or a FieldFile, so an upload that is still in
+        memory does not have to be written and read back from disk.
+        """
+        # Preprocess image
+        processed_image = self.preprocess_image(image_source)
+        return self.analyze_preprocessed_image(processed_image)
+    
+    def analyze_preprocessed_image(self, processed_image: np.ndarray) -> Dict:
+        """Handwriting analysis of an image already returned by preprocess_image"""
         # Run CNN analysis if model is available
-        if self.model:
-            cnn_prediction = self.model.predict(np.expand_dims(processed_image, axis=0))[0]
+        model = self.model
+        cnn_prediction = None
+        if model:
+            cnn_prediction = predict_handwriting(model, np.expand_dims(processed_image, axis=0))[0]
+        
+        return self._build_analysis(processed_image, cnn_prediction)
+    
+    def analyze_handwriting_batch(self, image_sources: List[ImageSource], batch_size: int = 32,
+                                  max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        Analyze several handwriting images at once.
+        
+        Images are decoded in parallel, stacked and scored with one CNN forward
+        pass per chunk of batch_size. Results are returned in input order and
+        match what analyze_handwriting returns for each image.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        image_sources = list(image_sources)
+        if not image_sources:
+            return []
+        
+        # Decode and resize in parallel (OpenCV releases the GIL)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            processed_images = list(executor.map(self.preprocess_image, image_sources))
+        
+        predictions = [None] * len(processed_images)
+        model = self.model
+        if model:
+            for start in range(0, len(processed_images), batch_size):
+                chunk = np.stack(processed_images[start:start + batch_size])
+                chunk_predictions = predict_handwriting(model, chunk)
+                predictions[start:start + len(chunk)] = list(chunk_predictions)
+        
+        return [
+            self._build_analysis(processed_image, cnn_prediction)
+            for processed_image, cnn_prediction in zip(processed_images, predictions)
+        ]
+    
+    def _build_analysis(self, processed_image: np.ndarray, cnn_prediction: Optional[np.ndarray]) -> Dict:
+        """Turn a CNN prediction (or the CV fallback) into an analysis result"""
+        # Share thresholding, edges and contours between all heuristics
+        features = HandwritingFeatures(processed_image)
+        
+        if cnn_prediction is not None:
             irregular_shapes_score = float(cnn_prediction[0])
             spacing_issues_score = float(cnn_prediction[1])
             stroke_pattern_score = float(cnn_prediction[2])
@@ -162,9 +385,9 @@ class HandwritingCNNAnalyzer:
         else:
             # Fallback to traditional computer vision methods with calibrated scaling
             # Scale raw metrics so normal writing stays < 0.3 and poor writing > 0.7
-            raw_irregular = self.analyze_irregular_shapes(processed_image)
-            raw_spacing = self.analyze_spacing_issues(processed_image)
-            raw_stroke = self.analyze_stroke_patterns(processed_image)
+            raw_irregular = self.analyze_irregular_shapes(features)
+            raw_spacing = self.analyze_spacing_issues(features)
+            raw_stroke = self.analyze_stroke_patterns(features)
             
             # Balanced scaling: Noise floor at 0.15 allows high-risk cases to trigger.
             # Risk starts to climb after 0.15 and crosses 0.5 when raw > 0.4.
@@ -180,20 +403,20 @@ class HandwritingCNNAnalyzer:
             'spacing_issues_score': spacing_issues_score,
             'stroke_pattern_score': stroke_pattern_score,
             'overall_handwriting_score': overall_score,
-            'letter_formation_issues': self._identify_letter_issues(processed_image),
-            'spacing_analysis': self._analyze_spacing_details(processed_image),
-            'stroke_analysis': self._analyze_stroke_details(processed_image),
+            'letter_formation_issues': self._identify_letter_issues(features),
+            'spacing_analysis': self._analyze_spacing_details(features),
+            'stroke_analysis': self._analyze_stroke_details(features),
             'model_confidence': 0.85  # Placeholder confidence score
         }
         
         return analysis_result
     
-    def _identify_letter_issues(self, image: np.ndarray) -> List[str]:
+    def _identify_letter_issues(self, image) -> List[str]:
         """Identify specific letter formation issues"""
         issues = []
         
         # Analyze letter proportions
-        height, width = image.shape[:2]
+        height, width = HandwritingFeatures.wrap(image).shape[:2]
         aspect_ratio = width / height if height > 0 else 1
         
         if aspect_ratio < 0.5:
@@ -207,16 +430,23 @@ class HandwritingCNNAnalyzer:
         
         return issues
     
-    def _analyze_spacing_details(self, image: np.ndarray) -> Dict:
+    def _analyze_spacing_details(self, image) -> Dict:
         """Detailed spacing analysis"""
+        # Line spacing from blank rows between written lines
+        line_spacing_consistency = 0.8  # Placeholder when fewer than two line gaps
+        _, line_gaps = HandwritingFeatures.wrap(image).row_gaps
+        line_gaps = line_gaps[line_gaps > 2]
+        if len(line_gaps) > 1:
+            line_spacing_consistency = float(max(1 - np.std(line_gaps) / np.mean(line_gaps), 0))
+        
         return {
             'word_spacing_consistency': 0.7,  # Placeholder
             'letter_spacing_consistency': 0.6,  # Placeholder
-            'line_spacing_consistency': 0.8,  # Placeholder
+            'line_spacing_consistency': line_spacing_consistency,
             'recommendations': ['Practice consistent letter spacing', 'Work on word spacing']
         }
     
-    def _analyze_stroke_details(self, image: np.ndarray) -> Dict:
+    def _analyze_stroke_details(self, image) -> Dict:
         """Detailed stroke pattern analysis"""
         return {
             'stroke_consistency': 0.6,  # Placeholder
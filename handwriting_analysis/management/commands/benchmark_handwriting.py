@@ -0,0 +1,51 @@
+"""
+Django management command to benchmark handwriting CNN inference latency
+Usage: python manage.py benchmark_handwriting [--runs 50] [--batch-sizes 1 8 64]
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from handwriting_analysis.cnn_analyzer import INPUT_SHAPE, get_handwriting_model, predict_handwriting
+
+
+class Command(BaseCommand):
+    help = 'Compare Model.predict() with the traced serving path for the handwriting CNN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=50, help='Timed runs per batch size')
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64])
+
+    def handle(self, *args, **options):
+        model = get_handwriting_model()
+        runs = options['runs']
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS('Handwriting CNN Inference Benchmark'))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(f"{'batch':>6} {'path':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+
+        for batch_size in options['batch_sizes']:
+            images = np.random.rand(batch_size, *INPUT_SHAPE).astype(np.float32)
+
+            paths = {
+                'predict': lambda: model.predict(images, verbose=0),
+                'serving': lambda: predict_handwriting(model, images),
+            }
+            for name, run in paths.items():
+                # Warm up outside the timed loop
+                run()
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - start) * 1000)
+                p50, p99 = np.percentile(timings, [50, 99])
+                self.stdout.write(f"{batch_size:>6} {name:>10} {p50:>10.2f} {p99:>10.2f}")
+
+            max_diff = np.max(np.abs(paths['predict']() - paths['serving']()))
+            self.stdout.write(f"{'':>6} {'max |diff|':>10} {max_diff:>10.2e}")
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
@@ -1,3 +1,266 @@
-from django.test import TestCase
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from ml_models import model_loader
+from ml_models.model_loader import clear_model_cache
+
+from . import cnn_analyzer
+from .cnn_analyzer import (
+    HandwritingCNNAnalyzer, HandwritingFeatures, build_handwriting_cnn, find_gaps, get_serving_function,
+    predict_handwriting
+)
+
+
+class SharedModelTests(SimpleTestCase):
+    """One registry CNN per process, whatever the number of analyzers"""
+
+    def setUp(self):
+        clear_model_cache('handwriting_cnn')
+        self.addCleanup(clear_model_cache, 'handwriting_cnn')
+
+    def test_analyzers_share_one_model(self):
+        missing = model_loader.MODELS_DIR / 'missing_handwriting_cnn.keras'
+        with mock.patch.dict(model_loader.MODEL_PATHS, {'handwriting_cnn': missing}), \
+                mock.patch.object(cnn_analyzer, 'build_handwriting_cnn', wraps=build_handwriting_cnn) as build:
+            analyzers = [HandwritingCNNAnalyzer() for _ in range(3)]
+            # Creating an analyzer does not load anything
+            build.assert_not_called()
+            models = [analyzer.model for analyzer in analyzers]
+
+        build.assert_called_once()
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_trained_model_file_is_loaded_once(self):
+        import keras
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        model_path = os.path.join(tmp.name, 'handwriting_cnn_model.keras')
+        build_handwriting_cnn().save(model_path)
+
+        with mock.patch.dict(model_loader.MODEL_PATHS, {'handwriting_cnn': Path(model_path)}), \
+                mock.patch('keras.models.load_model', wraps=keras.models.load_model) as load:
+            models = [HandwritingCNNAnalyzer().model for _ in range(3)]
+
+        load.assert_called_once_with(model_path)
+        self.assertTrue(all(model is models[0] for model in models))
+
+
+def page(strokes, shape=(64, 64)):
+    """
+    Preprocessed-style image: white paper (1.0) with dark ink rectangles.
+
+    Args:
+        strokes (list): (top, bottom, left, right) slices of ink
+    """
+    image = np.ones(shape, dtype=np.float32)
+    for top, bottom, left, right in strokes:
+        image[top:bottom, left:right] = 0.1
+    return image
+
+
+def random_page(seed, ink=0.08):
+    """Scattered ink blobs, touching the edges in some images"""
+    rng = np.random.default_rng(seed)
+    image = np.ones((64, 64), dtype=np.float32)
+    image[rng.random((64, 64)) < ink] = rng.uniform(0, 0.4)
+    return image
+
+
+def loop_spacing_irregularity(image):
+    """analyze_spacing_issues as written before gap detection was vectorized"""
+    binary = np.where((image * 255).astype(np.uint8) > 127, 0, 255)
+    horizontal_projection = np.sum(binary, axis=0)
+    gaps = []
+    in_gap = False
+    gap_start = 0
+    for i, value in enumerate(horizontal_projection):
+        if value == 0 and not in_gap:
+            in_gap = True
+            gap_start = i
+        elif value > 0 and in_gap:
+            in_gap = False
+            gap_length = i - gap_start
+            if gap_length > 2:
+                gaps.append(gap_length)
+    if not gaps:
+        return 0.0
+    mean_gap = np.mean(gaps)
+    return min(np.std(gaps) / mean_gap if mean_gap > 0 else 0, 1.0)
+
+
+def loop_gaps(projection):
+    """Closed blank runs of a projection, found one bin at a time"""
+    starts, lengths = [], []
+    in_gap = False
+    gap_start = 0
+    for i, value in enumerate(projection):
+        if value == 0 and not in_gap:
+            in_gap = True
+            gap_start = i
+        elif value > 0 and in_gap:
+            in_gap = False
+            starts.append(gap_start)
+            lengths.append(i - gap_start)
+    return starts, lengths
+
+
+class SpacingTests(SimpleTestCase):
+    """Vectorized gap detection against the original loop"""
+
+    images = {
+        'blank': page([]),
+        'solid': page([(0, 64, 0, 64)]),
+        'words': page([(10, 20, 2, 9), (10, 20, 12, 18), (10, 20, 25, 40), (10, 20, 47, 50)]),
+        'ink at both edges': page([(5, 30, 0, 4), (5, 30, 20, 30), (5, 30, 60, 64)]),
+        **{f'random {seed}': random_page(seed, ink) for seed, ink in enumerate((0.002, 0.01, 0.05))},
+    }
+
+    def test_find_gaps(self):
+        for name, image in self.images.items():
+            binary = HandwritingFeatures(image).binary
+            for axis in (0, 1):
+                with self.subTest(name, axis=axis):
+                    projection = np.sum(binary, axis=axis)
+                    starts, lengths = find_gaps(projection)
+                    expected_starts, expected_lengths = loop_gaps(projection)
+                    self.assertEqual(starts.tolist(), expected_starts)
+                    self.assertEqual(lengths.tolist(), expected_lengths)
+
+    def test_find_gaps_matches_speech_find_runs(self):
+        from speech_analysis.audio_analyzer import find_runs
+        rng = np.random.default_rng(0)
+        for projection in [np.zeros(10), np.ones(10), *(rng.integers(0, 3, size) for size in (1, 2, 17, 64))]:
+            with self.subTest(projection=projection.tolist()):
+                starts, lengths = find_gaps(projection)
+                expected_starts, expected_lengths = find_runs(projection == 0)
+                np.testing.assert_array_equal(starts, expected_starts)
+                np.testing.assert_array_equal(lengths, expected_lengths)
+
+    def test_spacing_issues_match_the_loop(self):
+        analyzer = HandwritingCNNAnalyzer()
+        for name, image in self.images.items():
+            with self.subTest(name):
+                self.assertAlmostEqual(analyzer.analyze_spacing_issues(image), loop_spacing_irregularity(image))
+
+    def test_line_spacing_consistency(self):
+        analyzer = HandwritingCNNAnalyzer()
+
+        def line_spacing(rows):
+            image = page([(top, bottom, 4, 60) for top, bottom in rows])
+            return analyzer._analyze_spacing_details(image)['line_spacing_consistency']
+
+        # Blank rows between lines: 3, 6 and 3, so 1 - std / mean = 1 - sqrt(2) / 4
+        self.assertAlmostEqual(line_spacing([(1, 9), (12, 20), (26, 34), (37, 45)]), 1 - np.sqrt(2) / 4)
+        # Evenly spaced lines
+        self.assertAlmostEqual(line_spacing([(1, 9), (14, 22), (27, 35), (40, 48)]), 1.0)
+        # A single gap between two lines keeps the placeholder
+        self.assertEqual(line_spacing([(1, 9), (14, 22)]), 0.8)
+
+
+def loop_irregular_shapes(image):
+    """analyze_irregular_shapes computing its own edges and contours"""
+    edges = cv2.Canny((image * 255).astype(np.uint8), 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours or sum(cv2.contourArea(c) for c in contours) == 0:
+        return 0.0
+    scores = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        perimeter = cv2.arcLength(contour, True)
+        if perimeter > 0:
+            scores.append(1 - 4 * np.pi * area / (perimeter * perimeter))
+    return np.mean(scores) if scores else 0.0
+
+
+def loop_stroke_patterns(image):
+    """analyze_stroke_patterns computing its own threshold, edges and gradients"""
+    _, binary = cv2.threshold((image * 255).astype(np.uint8), 127, 255, cv2.THRESH_BINARY_INV)
+    edges = cv2.Canny(binary, 50, 150)
+    sobel_x = cv2.Sobel(edges, cv2.CV_64F, 1, 0, ksize=3)
+    sobel_y = cv2.Sobel(edges, cv2.CV_64F, 0, 1, ksize=3)
+    angles = np.arctan2(sobel_y, sobel_x)[edges > 0]
+    if len(angles) == 0:
+        return 0.0
+    return min(np.var(angles) / (np.pi ** 2), 1.0)
+
+
+class SharedFeaturesTests(SimpleTestCase):
+    """One HandwritingFeatures context shared by every heuristic"""
+
+    def test_shared_context_matches_independent_heuristics(self):
+        analyzer = HandwritingCNNAnalyzer()
+        for name, image in SpacingTests.images.items():
+            image = image[..., np.newaxis]
+            with self.subTest(name):
+                features = HandwritingFeatures(image)
+                self.assertAlmostEqual(analyzer.analyze_irregular_shapes(features), loop_irregular_shapes(image))
+                self.assertAlmostEqual(analyzer.analyze_spacing_issues(features), loop_spacing_irregularity(image))
+                self.assertAlmostEqual(analyzer.analyze_stroke_patterns(features), loop_stroke_patterns(image))
+
+    def test_cv_products_are_computed_once(self):
+        analyzer = HandwritingCNNAnalyzer()
+        with mock.patch('cv2.threshold', wraps=cv2.threshold) as threshold, \
+                mock.patch('cv2.Canny', wraps=cv2.Canny) as canny:
+            analyzer._build_analysis(random_page(0)[..., np.newaxis], None)
+        self.assertEqual(threshold.call_count, 1)
+        # Edges of the grayscale image and of the binary mask
+        self.assertEqual(canny.call_count, 2)
+
+
+class ServingFunctionTests(SimpleTestCase):
+    """Traced inference function against Model.predict"""
+
+    def test_serving_function_matches_predict(self):
+        model = build_handwriting_cnn()
+        images = np.random.default_rng(0).random((7, 64, 64, 1), dtype=np.float32)
+
+        for batch in (images[:1], images[:3], images):
+            np.testing.assert_allclose(predict_handwriting(model, batch), model.predict(batch, verbose=0),
+                                       rtol=1e-5, atol=1e-6)
+        # Traced once, when it was created, for every batch size
+        self.assertEqual(get_serving_function(model).experimental_get_tracing_count(), 1)
+
+
+class BatchAnalysisTests(SimpleTestCase):
+    """analyze_handwriting_batch against one image at a time"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.model_path = os.path.join(cls.tmp.name, 'handwriting_cnn.keras')
+        build_handwriting_cnn().save(cls.model_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def test_batch_matches_single_images(self):
+        analyzer = HandwritingCNNAnalyzer(self.model_path)
+        images = [random_page(seed, ink) for seed, ink in enumerate((0.002, 0.01, 0.05, 0.02, 0.1))]
+        encoded = [cv2.imencode('.png', (image * 255).astype(np.uint8))[1].tobytes() for image in images]
+
+        batch = analyzer.analyze_handwriting_batch(encoded, batch_size=2)
+
+        self.assertEqual(len(batch), len(encoded))
+        for result, image_bytes in zip(batch, encoded):
+            single = analyzer.analyze_handwriting(image_bytes)
+            self.assertEqual(result.keys(), single.keys())
+            for key, value in single.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(result[key], value, places=5, msg=key)
+                else:
+                    self.assertEqual(result[key], value, msg=key)
+
+    def test_batch_size_must_be_positive(self):
+        analyzer = HandwritingCNNAnalyzer(self.model_path)
+        for batch_size in (0, -1):
+            with self.subTest(batch_size=batch_size), self.assertRaisesMessage(ValueError, 'batch_size must be at least 1'):
+                analyzer.analyze_handwriting_batch([b'not an image'], batch_size=batch_size)
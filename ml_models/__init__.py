@@ -8,7 +8,10 @@ from .model_loader import (
     is_model_available,
     get_available_models,
     clear_model_cache,
-    get_model_info
+    get_model_cache_stats,
+    get_model_info,
+    get_model_version,
+    preload_models
 )
 
 __all__ = [
@@ -16,5 +19,8 @@ __all__ = [
     'is_model_available',
     'get_available_models',
     'clear_model_cache',
-    'get_model_info'
+    'get_model_cache_stats',
+    'get_model_info',
+    'get_model_version',
+    'preload_models'
 ]
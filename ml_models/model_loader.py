@@ -1,11 +1,34 @@
 """
 ML Model Loader Utility
 Handles loading and caching of machine learning models for dyslexia detection
+
+Loading is single-flight: when several threads ask for a model that is not
+cached yet, one of them loads it and the others wait for that load instead
+of each reading the file into memory. A load that fails is not retried
+until a backoff (ML_MODEL_RETRY_SECONDS, doubling with every consecutive
+failure) has passed, so a broken model file does not stall every request.
+
+Loaded models are kept in a least-recently-used cache whose estimated
+resident size (the bytes of each model's weights) is bounded by
+ML_MODEL_CACHE_MAX_MB; loading a model past the budget evicts the models
+used longest ago. A single model larger than the budget is still cached.
+
+preload_models() loads models ahead of the first request and runs one
+dummy inference on each, so that request does not pay for loading or for
+tracing the model's inference function.
 """
 
+import math
 import os
+import threading
+import time
+from collections import OrderedDict
+from importlib import import_module
 from pathlib import Path
+
+import numpy as np
 from django.conf import settings
+from django.utils.module_loading import import_string
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,82 +40,320 @@ MODEL_PATHS = {
     'eye_movement': MODELS_DIR / 'dyslexia_eye_movement_model.keras',
     'audio_lstm': MODELS_DIR / 'dyslexia_audio_lstm_model_v2.keras',
     'dysgraphia': MODELS_DIR / 'dysgraphia_model.h5',
+    'handwriting_cnn': MODELS_DIR / 'handwriting_cnn_model.keras',
+}
+
+# Builders used when a model has no trained file on disk yet
+MODEL_FACTORIES = {
+    'handwriting_cnn': 'handwriting_analysis.cnn_analyzer.build_handwriting_cnn',
+}
+
+# Warmups for models whose callers do not use Model.predict; called with the loaded model
+MODEL_WARMUPS = {
+    'handwriting_cnn': 'handwriting_analysis.cnn_analyzer.get_serving_function',
 }
 
-# Cache for loaded models
-_model_cache = {}
+DEFAULT_RETRY_SECONDS = 30
+MAX_RETRY_SECONDS = 600
+DEFAULT_CACHE_MAX_MB = 1024
+
+# Cache for loaded models, least recently used first
+_model_cache = OrderedDict()
+
+# Model name -> estimated resident bytes of the cached model
+_model_sizes = {}
+
+# Process-local cache counters
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+# Guards the cache, its sizes and counters, _loading, _failures and _load_stats
+_cache_lock = threading.Lock()
+
+# Model name -> Event set when the load in flight finishes
+_loading = {}
+
+# Model name -> {'count': consecutive failures, 'retry_at': monotonic time, 'error': message}
+_failures = {}
+
+# Model name -> load metrics for get_model_info
+_load_stats = {}
+
+
+def _get_stats(model_name):
+    return _load_stats.setdefault(model_name, {
+        'load_count': 0,
+        'load_seconds': None,
+        'total_load_seconds': 0.0,
+        'failures': 0,
+        'waits': 0,
+        'warmup_seconds': None,
+    })
 
 
 def load_model(model_name):
     """
     Load a machine learning model by name.
     
+    Concurrent calls for the same model share one load; calls made while a
+    failed model is backing off return None without trying again.
+    
     Args:
-        model_name (str): Name of the model ('eye_movement', 'audio_lstm', or 'dysgraphia')
+        model_name (str): Name of the model ('eye_movement', 'audio_lstm',
+            'dysgraphia' or 'handwriting_cnn')
     
     Returns:
         model: Loaded Keras/TensorFlow model or None if not available
     """
-    # Return cached model if already loaded
-    if model_name in _model_cache:
-        logger.info(f"Using cached model: {model_name}")
-        return _model_cache[model_name]
-    
     # Check if model name is valid
     if model_name not in MODEL_PATHS:
         logger.error(f"Unknown model name: {model_name}")
         return None
     
+    while True:
+        with _cache_lock:
+            # Return cached model if already loaded
+            if model_name in _model_cache:
+                _model_cache.move_to_end(model_name)
+                _cache_stats['hits'] += 1
+                return _model_cache[model_name]
+            
+            failure = _failures.get(model_name)
+            if failure and time.monotonic() < failure['retry_at']:
+                logger.debug(f"Not loading {model_name} until its retry backoff has passed")
+                return None
+            
+            done = _loading.get(model_name)
+            if done is None:
+                done = _loading[model_name] = threading.Event()
+                _cache_stats['misses'] += 1
+                break
+            _get_stats(model_name)['waits'] += 1
+        
+        # Another thread is loading this model; use its result
+        done.wait()
+    
+    started = time.perf_counter()
+    model = error = None
+    size = 0
+    try:
+        model = _load_uncached(model_name)
+        if model is not None:
+            size = estimate_model_bytes(model)
+    except ImportError:
+        error = "TensorFlow/Keras not installed. Install with: pip install tensorflow"
+        logger.error(error)
+    except Exception as e:
+        error = f"Error loading model {model_name}: {str(e)}"
+        logger.error(error)
+    finally:
+        seconds = time.perf_counter() - started
+        with _cache_lock:
+            stats = _get_stats(model_name)
+            if model is not None:
+                _model_cache[model_name] = model
+                _model_sizes[model_name] = size
+                _evict_over_budget(keep=model_name)
+                _failures.pop(model_name, None)
+                stats['load_count'] += 1
+                stats['load_seconds'] = round(seconds, 3)
+                stats['total_load_seconds'] = round(stats['total_load_seconds'] + seconds, 3)
+            elif error is not None:
+                _record_failure(model_name, error)
+                stats['failures'] += 1
+            del _loading[model_name]
+        done.set()
+    
+    if model is not None:
+        logger.info(f"Successfully loaded model: {model_name} in {seconds:.2f}s")
+    return model
+
+
+def estimate_model_bytes(model):
+    """
+    Estimate the memory a loaded model keeps resident.
+    
+    Args:
+        model: Keras model
+    
+    Returns:
+        int: Bytes of the model's weights, 0 if it has none
+    """
+    try:
+        return sum(math.prod(weight.shape) * np.dtype(weight.dtype).itemsize for weight in model.weights)
+    except (AttributeError, TypeError):
+        return 0
+
+
+def get_cache_max_bytes():
+    """Budget of the model cache in bytes; 0 means no limit"""
+    return int(getattr(settings, 'ML_MODEL_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB) * 1024 * 1024)
+
+
+def _evict_over_budget(keep):
+    """Evict least recently used models until the cache fits its budget (lock held)"""
+    max_bytes = get_cache_max_bytes()
+    if max_bytes <= 0:
+        return
+    for name in list(_model_cache):
+        if sum(_model_sizes.values()) <= max_bytes:
+            break
+        if name == keep:
+            continue
+        del _model_cache[name]
+        size = _model_sizes.pop(name)
+        _cache_stats['evictions'] += 1
+        logger.info(f"Evicted model {name} ({size / (1024 * 1024):.1f} MB) from the model cache")
+    if sum(_model_sizes.values()) > max_bytes:
+        logger.warning(f"Model {keep} alone exceeds the model cache budget of {max_bytes / (1024 * 1024):.1f} MB")
+
+
+def _record_failure(model_name, error):
+    """Schedule the next load attempt of a model that failed to load (lock held)"""
+    count = _failures.get(model_name, {}).get('count', 0) + 1
+    retry_seconds = getattr(settings, 'ML_MODEL_RETRY_SECONDS', DEFAULT_RETRY_SECONDS)
+    backoff = min(retry_seconds * 2 ** (count - 1), MAX_RETRY_SECONDS)
+    _failures[model_name] = {'count': count, 'retry_at': time.monotonic() + backoff, 'error': error}
+    logger.warning(f"Model {model_name} failed to load {count} time(s); retrying in {backoff:.0f}s")
+
+
+def _load_uncached(model_name):
+    """
+    Read a model from disk or build it from its factory.
+    
+    Returns:
+        model: Loaded model, or None if there is no file or factory for it
+    
+    Raises:
+        Exception: Whatever TensorFlow/Keras raised while loading
+    """
     model_path = MODEL_PATHS[model_name]
     
+    # Build the default architecture if there is no trained file
+    if not model_path.exists() and model_name in MODEL_FACTORIES:
+        return _build_model(model_name)
+    
     # Check if model file exists
     if not model_path.exists():
         logger.warning(f"Model file not found: {model_path}")
         logger.warning(f"Please place the model file in: {MODELS_DIR}")
         return None
     
-    try:
-        # Import TensorFlow/Keras only when needed
-        from tensorflow import keras
-        
-        logger.info(f"Loading model: {model_name} from {model_path}")
-        
-        # Load the model
-        if model_path.suffix == '.h5':
-            model = keras.models.load_model(str(model_path))
-        elif model_path.suffix == '.keras':
-            model = keras.models.load_model(str(model_path))
-        else:
-            logger.error(f"Unsupported model format: {model_path.suffix}")
-            return None
-        
-        # Cache the model
-        _model_cache[model_name] = model
-        logger.info(f"Successfully loaded model: {model_name}")
+    if model_path.suffix not in ('.h5', '.keras'):
+        logger.error(f"Unsupported model format: {model_path.suffix}")
+        return None
+    
+    # Import TensorFlow/Keras only when needed
+    from tensorflow import keras
+    
+    logger.info(f"Loading model: {model_name} from {model_path}")
+    return keras.models.load_model(str(model_path))
+
+
+def _build_model(model_name):
+    """
+    Build a model from its registered factory.
+    
+    Args:
+        model_name (str): Name of a model listed in MODEL_FACTORIES
+    
+    Returns:
+        model: Freshly built Keras model
+    """
+    factory = import_string(MODEL_FACTORIES[model_name])
+    logger.info(f"Building model: {model_name} (no trained file found)")
+    return factory()
+
+
+def warmup_model(model_name, model):
+    """
+    Run one dummy inference so the first real call skips tracing.
+    
+    Models listed in MODEL_WARMUPS use their registered warmup; others get a
+    Model.predict on zeros shaped like their inputs, with batch size 1.
+    
+    Args:
+        model_name (str): Name of the model
+        model: The loaded model
+    """
+    if model_name in MODEL_WARMUPS:
+        import_string(MODEL_WARMUPS[model_name])(model)
+        return
+    
+    inputs = [
+        np.zeros(tuple(1 if dim is None else dim for dim in tensor.shape), dtype=np.float32)
+        for tensor in model.inputs
+    ]
+    model.predict(inputs[0] if len(inputs) == 1 else inputs, verbose=0)
+
+
+def preload_models(model_names, warmup=True):
+    """
+    Load models and warm them up before they are needed.
+    
+    Failures are logged and skipped; the model is then loaded on first use
+    as usual.
+    
+    Args:
+        model_names (list): Names of the models to preload
+        warmup (bool): Also run a dummy inference on each model
+    
+    Returns:
+        list: Names of the models that are loaded
+    """
+    loaded = []
+    for model_name in model_names:
+        started = time.perf_counter()
+        model = load_model(model_name)
+        if model is None:
+            logger.warning(f"Could not preload model: {model_name}")
+            continue
         
-        return model
+        if warmup:
+            warmup_started = time.perf_counter()
+            try:
+                warmup_model(model_name, model)
+            except Exception as e:
+                logger.warning(f"Warmup of model {model_name} failed: {str(e)}")
+            else:
+                with _cache_lock:
+                    _get_stats(model_name)['warmup_seconds'] = round(time.perf_counter() - warmup_started, 3)
         
-    except ImportError:
-        logger.error("TensorFlow/Keras not installed. Install with: pip install tensorflow")
-        return None
-    except Exception as e:
-        logger.error(f"Error loading model {model_name}: {str(e)}")
-        return None
+        loaded.append(model_name)
+        logger.info(f"Preloaded model {model_name} in {time.perf_counter() - started:.2f}s")
+    return loaded
+
+
+def import_model_modules(model_names):
+    """
+    Import TensorFlow/Keras and the factory and warmup modules of models.
+    
+    Unlike loading, importing runs no TensorFlow op, so it is safe to do in
+    a process that forks afterwards.
+    
+    Args:
+        model_names (list): Names of the models that will be loaded
+    """
+    from tensorflow import keras  # noqa: F401
+    
+    for model_name in model_names:
+        for registry in (MODEL_FACTORIES, MODEL_WARMUPS):
+            if model_name in registry:
+                import_module(registry[model_name].rsplit('.', 1)[0])
 
 
 def is_model_available(model_name):
     """
-    Check if a model file exists.
+    Check if a model file exists or can be built from a registered factory.
     
     Args:
         model_name (str): Name of the model
     
     Returns:
-        bool: True if model file exists, False otherwise
+        bool: True if the model can be loaded, False otherwise
     """
     if model_name not in MODEL_PATHS:
         return False
-    return MODEL_PATHS[model_name].exists()
+    return MODEL_PATHS[model_name].exists() or model_name in MODEL_FACTORIES
 
 
 def get_available_models():
@@ -100,16 +361,69 @@ def get_available_models():
     Get list of available models.
     
     Returns:
-        list: Names of models that have files present
+        list: Names of models that have files present or a built-in architecture
     """
     return [name for name in MODEL_PATHS.keys() if is_model_available(name)]
 
 
-def clear_model_cache():
-    """Clear the model cache to free memory."""
-    global _model_cache
-    _model_cache.clear()
-    logger.info("Model cache cleared")
+def get_model_version(model_name):
+    """
+    Get a version string that changes whenever a model's weights change.
+    
+    Args:
+        model_name (str): Name of the model
+    
+    Returns:
+        str: File size and modification time, 'builtin' for a factory-built
+            model, or None if the model is unknown or missing
+    """
+    if model_name not in MODEL_PATHS:
+        return None
+    path = MODEL_PATHS[model_name]
+    if path.exists():
+        stat = path.stat()
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    if model_name in MODEL_FACTORIES:
+        return 'builtin'
+    return None
+
+
+def clear_model_cache(model_name=None):
+    """
+    Clear the model cache to free memory, and retry failed models on next use.
+    
+    Args:
+        model_name (str): Only drop this model; all models if None
+    """
+    with _cache_lock:
+        if model_name is None:
+            _model_cache.clear()
+            _model_sizes.clear()
+            _failures.clear()
+        else:
+            _model_cache.pop(model_name, None)
+            _model_sizes.pop(model_name, None)
+            _failures.pop(model_name, None)
+    logger.info(f"Model cache cleared{f' of {model_name}' if model_name else ''}")
+
+
+def get_model_cache_stats():
+    """
+    Get model cache counters for this process and its current size.
+    
+    Returns:
+        dict: hits, misses, evictions, hit_rate, models (names, least
+            recently used first), resident_mb and max_mb
+    """
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats['models'] = list(_model_cache)
+        resident = sum(_model_sizes.values())
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+    stats['resident_mb'] = round(resident / (1024 * 1024), 2)
+    stats['max_mb'] = round(get_cache_max_bytes() / (1024 * 1024), 2)
+    return stats
 
 
 def get_model_info():
@@ -117,14 +431,25 @@ def get_model_info():
     Get information about all models.
     
     Returns:
-        dict: Dictionary with model information
+        dict: Dictionary with model information, including load metrics
+            of this process
     """
     info = {}
-    for name, path in MODEL_PATHS.items():
-        info[name] = {
-            'path': str(path),
-            'exists': path.exists(),
-            'size_mb': round(path.stat().st_size / (1024 * 1024), 2) if path.exists() else 0,
-            'loaded': name in _model_cache
-        }
+    now = time.monotonic()
+    with _cache_lock:
+        for name, path in MODEL_PATHS.items():
+            stats = dict(_get_stats(name))
+            failure = _failures.get(name)
+            info[name] = {
+                'path': str(path),
+                'exists': path.exists(),
+                'size_mb': round(path.stat().st_size / (1024 * 1024), 2) if path.exists() else 0,
+                'builtin': name in MODEL_FACTORIES,
+                'loaded': name in _model_cache,
+                'resident_mb': round(_model_sizes[name] / (1024 * 1024), 2) if name in _model_sizes else 0,
+                'loading': name in _loading,
+                **stats,
+                'last_error': failure['error'] if failure else None,
+                'retry_in_seconds': round(max(failure['retry_at'] - now, 0), 1) if failure else None,
+            }
     return info
@@ -0,0 +1,207 @@
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from . import model_loader
+from .model_loader import (
+    clear_model_cache, get_model_cache_stats, get_model_info, load_model, preload_models
+)
+
+factory_calls = []
+
+
+class FakeModel:
+    """Stands in for a Keras model with 1 MB of float32 weights"""
+
+    def __init__(self):
+        self.weights = [np.zeros((512, 256), dtype=np.float32), np.zeros(131072, dtype=np.float32)]
+
+
+def fake_model_factory():
+    return FakeModel()
+
+
+class FakeKerasModel(FakeModel):
+    """Records the batches it is asked to predict"""
+
+    inputs = [mock.Mock(shape=(None, 64, 64, 1))]
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def predict(self, inputs, verbose=0):
+        self.batches.append(inputs)
+
+
+def fake_keras_factory():
+    return FakeKerasModel()
+
+
+def failing_warmup(model):
+    raise ValueError('bad input shape')
+
+
+def slow_factory():
+    factory_calls.append(threading.get_ident())
+    time.sleep(0.2)
+    return object()
+
+
+def broken_factory():
+    factory_calls.append(threading.get_ident())
+    raise OSError('truncated file')
+
+
+class ModelLoaderTests(SimpleTestCase):
+    """Concurrent and failing model loads"""
+
+    def setUp(self):
+        factory_calls.clear()
+        patches = [
+            mock.patch.dict(model_loader.MODEL_PATHS, {'test_model': model_loader.MODELS_DIR / 'missing.keras'}),
+            mock.patch.dict(model_loader.MODEL_FACTORIES, {'test_model': 'ml_models.tests.slow_factory'}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(clear_model_cache)
+        self.addCleanup(model_loader._load_stats.pop, 'test_model', None)
+
+    def test_concurrent_first_loads_share_one_load(self):
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(load_model('test_model'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(factory_calls), 1)
+        self.assertEqual(len(models), 8)
+        self.assertEqual(len({id(model) for model in models}), 1)
+
+        info = get_model_info()['test_model']
+        self.assertTrue(info['loaded'])
+        self.assertEqual(info['load_count'], 1)
+        self.assertGreaterEqual(info['load_seconds'], 0.2)
+        self.assertEqual(info['waits'], 7)
+
+    @override_settings(ML_MODEL_RETRY_SECONDS=60)
+    def test_failed_loads_back_off(self):
+        model_loader.MODEL_FACTORIES['test_model'] = 'ml_models.tests.broken_factory'
+
+        self.assertIsNone(load_model('test_model'))
+        self.assertIsNone(load_model('test_model'))
+        self.assertEqual(len(factory_calls), 1)
+
+        info = get_model_info()['test_model']
+        self.assertEqual(info['failures'], 1)
+        self.assertIn('truncated file', info['last_error'])
+        self.assertGreater(info['retry_in_seconds'], 0)
+
+        # Clearing the cache retries straight away
+        clear_model_cache()
+        model_loader.MODEL_FACTORIES['test_model'] = 'ml_models.tests.slow_factory'
+        self.assertIsNotNone(load_model('test_model'))
+        self.assertIsNone(get_model_info()['test_model']['last_error'])
+
+    def test_load_interrupted_while_sizing_the_model(self):
+        class Interrupted(BaseException):
+            pass
+
+        with mock.patch.object(model_loader, 'estimate_model_bytes', side_effect=Interrupted):
+            with self.assertRaises(Interrupted):
+                load_model('test_model')
+        # The load finished its bookkeeping, so the next call does not wait forever
+        self.assertNotIn('test_model', model_loader._loading)
+        self.assertIsNotNone(load_model('test_model'))
+
+
+@override_settings(ML_MODEL_CACHE_MAX_MB=2.5)
+class ModelCacheEvictionTests(SimpleTestCase):
+    """Least recently used models are evicted once the budget is exceeded"""
+
+    names = ('model_a', 'model_b', 'model_c')
+
+    def setUp(self):
+        patches = [
+            mock.patch.dict(model_loader.MODEL_PATHS, {
+                name: model_loader.MODELS_DIR / f'{name}.keras' for name in self.names
+            }),
+            mock.patch.dict(model_loader.MODEL_FACTORIES, {
+                name: 'ml_models.tests.fake_model_factory' for name in self.names
+            }),
+            mock.patch.dict(model_loader._cache_stats, {'hits': 0, 'misses': 0, 'evictions': 0}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        clear_model_cache()
+        self.addCleanup(clear_model_cache)
+        for name in self.names:
+            self.addCleanup(model_loader._load_stats.pop, name, None)
+
+    def test_least_recently_used_model_is_evicted(self):
+        model_a = load_model('model_a')
+        load_model('model_b')
+        self.assertIs(load_model('model_a'), model_a)
+        load_model('model_c')
+
+        stats = get_model_cache_stats()
+        self.assertEqual(stats['models'], ['model_a', 'model_c'])
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 3, 1))
+        self.assertEqual(stats['resident_mb'], 2.0)
+        self.assertEqual(get_model_info()['model_c']['resident_mb'], 1.0)
+        self.assertFalse(get_model_info()['model_b']['loaded'])
+
+    @override_settings(ML_MODEL_CACHE_MAX_MB=0.5)
+    def test_model_larger_than_the_budget_is_still_cached(self):
+        model_a = load_model('model_a')
+        self.assertIs(load_model('model_a'), model_a)
+
+        load_model('model_b')
+        self.assertEqual(get_model_cache_stats()['models'], ['model_b'])
+
+    def test_clearing_one_model_keeps_the_others(self):
+        load_model('model_a')
+        load_model('model_b')
+        clear_model_cache('model_a')
+        self.assertEqual(get_model_cache_stats()['models'], ['model_b'])
+
+
+class PreloadTests(SimpleTestCase):
+    """Loading and warming up models ahead of the first request"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.dict(model_loader.MODEL_PATHS, {
+                name: model_loader.MODELS_DIR / f'{name}.keras' for name in ('model_a', 'model_b')
+            }),
+            mock.patch.dict(model_loader.MODEL_FACTORIES, {
+                'model_a': 'ml_models.tests.fake_keras_factory',
+                'model_b': 'ml_models.tests.fake_keras_factory',
+            }),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(clear_model_cache)
+        for name in ('model_a', 'model_b'):
+            self.addCleanup(model_loader._load_stats.pop, name, None)
+
+    def test_models_are_loaded_and_run_once_on_dummy_input(self):
+        self.assertEqual(preload_models(['model_a', 'unknown_model']), ['model_a'])
+
+        model = load_model('model_a')
+        self.assertEqual([batch.shape for batch in model.batches], [(1, 64, 64, 1)])
+        self.assertIsNotNone(get_model_info()['model_a']['warmup_seconds'])
+
+    def test_failed_warmup_keeps_the_model(self):
+        with mock.patch.dict(model_loader.MODEL_WARMUPS, {'model_b': 'ml_models.tests.failing_warmup'}):
+            self.assertEqual(preload_models(['model_b']), ['model_b'])
+
+        self.assertTrue(get_model_info()['model_b']['loaded'])
+        self.assertIsNone(get_model_info()['model_b']['warmup_seconds'])
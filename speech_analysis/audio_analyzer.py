@@ -1,50 +1,774 @@
 import librosa
 import numpy as np
 import soundfile as sf
-from scipy import signal
+import soxr
+from scipy import ndimage, signal
+from scipy.linalg import solve_toeplitz
 from scipy.stats import skew, kurtosis
 import json
-from typing import Dict, List, Tuple, Optional
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Tuple, Optional, Union
 import warnings
+from django.conf import settings
+from speech_analysis.pcm_cache import cached_pcm
 warnings.filterwarnings('ignore')
 
+# Bump when feature extraction or scoring changes so cached results are not reused
+ANALYZER_VERSION = '1.0'
+
+PITCH_METHODS = ('piptrack', 'yin')
+
+RHYTHM_METHODS = ('onsets', 'syllables')
+
+FORMANT_METHODS = ('recording', 'tracks')
+
+# librosa res_type names of the soxr resampler qualities, slowest and most accurate first
+RESAMPLERS = ('soxr_vhq', 'soxr_hq', 'soxr_mq', 'soxr_lq', 'soxr_qq')
+
+# Search range and analysis rate for the downsampled YIN pitch tracker
+PITCH_SAMPLE_RATE = 4000
+PITCH_FRAME_LENGTH = 128  # 32 ms, two periods of the lowest F0
+PITCH_HOP_LENGTH = 64
+PITCH_FMIN = 75.0
+PITCH_FMAX = 600.0
+
+# Frame-wise formant tracking: 25 ms frames every 10 ms at 10 kHz, which
+# keeps F1-F3 and needs an LPC order of about 2 + the rate in kHz
+FORMANT_SAMPLE_RATE = 10000
+FORMANT_FRAME_LENGTH = 250
+FORMANT_HOP_LENGTH = 100
+FORMANT_LPC_ORDER = 12
+FORMANT_MIN_FREQ = 90.0
+FORMANT_MAX_BANDWIDTH = 400.0
+# Frames solved per batch, bounding the memory of the framed signal
+FORMANT_BATCH_FRAMES = 1024
+
+# Frames with less energy (sum of squares over 1024 samples) are pauses
+PAUSE_ENERGY_THRESHOLD = 0.01
+
+# Shorter runs of low-energy frames are not counted as pauses
+PAUSE_MIN_SECONDS = 0.1
+
+# RMS equivalent of the pause energy threshold
+VOICED_RMS_THRESHOLD = np.sqrt(PAUSE_ENERGY_THRESHOLD / 1024)
+
+# Energy frames kept on each side of a voiced run by the voice-activity mask
+VAD_HANGOVER_FRAMES = 2
+
+# Syllable nuclei: peaks of the smoothed energy envelope standing out by at
+# least SYLLABLE_PROMINENCE_DB and at least SYLLABLE_MIN_INTERVAL seconds apart
+SYLLABLE_SMOOTHING_FRAMES = 5
+SYLLABLE_PROMINENCE_DB = 2.0
+SYLLABLE_MIN_INTERVAL = 0.1
+
+
+def _setting(name: str, default):
+    """Read an optional Django setting, falling back outside a Django project"""
+    return getattr(settings, name, default) if settings.configured else default
+
+
+def frame_signal(audio: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    """
+    View audio as overlapping frames without copying.
+    
+    Frames start every hop_length samples up to, but not including, the
+    start at len(audio) - frame_length, matching
+    range(0, len(audio) - frame_length, hop_length).
+    
+    Returns:
+        np.ndarray: (n_frames, frame_length) read-only view
+    """
+    n_frames = max(0, -(-(len(audio) - frame_length) // hop_length))
+    if n_frames == 0:
+        return np.empty((0, frame_length), dtype=audio.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(audio, frame_length)
+    return windows[::hop_length][:n_frames]
+
+
+def find_runs(mask: np.ndarray, closed_only: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find runs of True in a boolean frame mask.
+    
+    By default only runs that are closed by a False frame are returned; a
+    run still open at the end of the recording is not counted.
+    handwriting_analysis.cnn_analyzer.find_gaps has a copy of the closed-run
+    case; keep the two in step.
+    
+    Returns:
+        tuple: (start indices, run lengths) as integer arrays
+    """
+    mask = np.asarray(mask, dtype=bool)
+    # Pad with False so every run has a rising and a falling edge
+    transitions = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    starts, ends = transitions[0::2], transitions[1::2]
+    if not closed_only:
+        return starts, ends - starts
+    closed = ends < len(mask)
+    return starts[closed], (ends - starts)[closed]
+
+
+def estimate_tempo(onset_envelope: np.ndarray, sr: int, hop_length: int, block_frames: int = 1024) -> float:
+    """
+    Global tempo estimate of librosa.beat.beat_track, with bounded memory.
+    
+    beat_track averages an autocorrelation tempogram (one 8 s window per
+    frame) over the recording, which takes hundreds of MB for a ten minute
+    recording. Here the tempogram columns are computed block_frames at a
+    time from the same padded envelope and only their sum is kept.
+    
+    Returns:
+        float: Tempo in BPM
+    """
+    # beat_track reports 0 when there are no onsets at all
+    if not onset_envelope.any():
+        return 0.0
+    
+    win_length = librosa.time_to_frames(8.0, sr=sr, hop_length=hop_length).item()
+    n_frames = len(onset_envelope)
+    # tempogram(center=True) pads with a linear ramp to zero on both sides
+    padded = np.pad(onset_envelope, win_length // 2, mode='linear_ramp', end_values=(0, 0))
+    
+    total = np.zeros(win_length)
+    for start in range(0, n_frames, block_frames):
+        stop = min(start + block_frames, n_frames)
+        columns = librosa.feature.tempogram(onset_envelope=padded[start:stop + win_length - 1], sr=sr,
+                                            hop_length=hop_length, win_length=win_length, center=False)
+        total += columns.sum(axis=-1)
+    
+    mean_tempogram = (total / max(n_frames, 1))[:, np.newaxis]
+    return float(librosa.feature.tempo(tg=mean_tempogram, sr=sr, hop_length=hop_length)[0])
+
+
+def batch_lpc(frames: np.ndarray, order: int) -> np.ndarray:
+    """
+    Autocorrelation-method LPC of every frame at once.
+    
+    The autocorrelations come from one batched FFT and the normal equations
+    are solved with a Levinson-Durbin recursion vectorized over the frames.
+    
+    Args:
+        frames (np.ndarray): (n_frames, frame_length) windowed frames
+        order (int): LPC order
+    
+    Returns:
+        np.ndarray: (n_frames, order + 1) coefficients, with a[:, 0] == 1
+    """
+    n_fft = 1 << int(np.ceil(np.log2(2 * frames.shape[1])))
+    spectrum = np.fft.rfft(frames, n_fft, axis=1)
+    r = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n_fft, axis=1)[:, :order + 1]
+    
+    a = np.zeros((len(frames), order + 1))
+    a[:, 0] = 1.0
+    error = np.maximum(r[:, 0], np.finfo(float).tiny)
+    for i in range(1, order + 1):
+        # Reflection coefficient, then a[j] += k * a[i - j] for j < i
+        k = -(r[:, i] + np.sum(a[:, 1:i] * r[:, i - 1:0:-1], axis=1)) / error
+        a[:, 1:i] = a[:, 1:i] + k[:, None] * a[:, i - 1:0:-1]
+        a[:, i] = k
+        error = np.maximum(error * (1.0 - k ** 2), np.finfo(float).tiny)
+    return a
+
+
+def lpc_roots(coefficients: np.ndarray) -> np.ndarray:
+    """
+    Roots of many LPC polynomials as the eigenvalues of their companion matrices.
+    
+    Args:
+        coefficients (np.ndarray): (n, order + 1) polynomials with a[:, 0] == 1
+    
+    Returns:
+        np.ndarray: (n, order) complex roots
+    """
+    n, order = coefficients.shape[0], coefficients.shape[1] - 1
+    companion = np.zeros((n, order, order))
+    companion[:, 0, :] = -coefficients[:, 1:]
+    companion[:, np.arange(1, order), np.arange(order - 1)] = 1.0
+    return np.linalg.eigvals(companion)
+
+
+def decode_blocks(audio_path: str, sr: int, block_size: int = 65536,
+                  res_type: str = 'soxr_hq') -> Iterator[np.ndarray]:
+    """
+    Decode an audio file block by block as mono float32 at sr.
+    
+    Channels are averaged and the signal is resampled with the soxr filter
+    librosa.resample uses for res_type, run as a stream, so the concatenated
+    blocks equal SpeechAnalyzer.load_audio's output. Files already at sr are
+    not resampled.
+    
+    Args:
+        audio_path (str): File readable by soundfile
+        sr (int): Target sample rate
+        block_size (int): Samples read from the file per block
+        res_type (str): One of RESAMPLERS
+    """
+    info = sf.info(audio_path)
+    resampler = None
+    if info.samplerate != sr:
+        quality = res_type.split('_', 1)[1].upper()
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32', quality=quality)
+    
+    for block in sf.blocks(audio_path, blocksize=block_size, dtype='float32', always_2d=True):
+        mono = block.mean(axis=1)
+        yield resampler.resample_chunk(mono) if resampler else mono
+    if resampler:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+class RunningStats:
+    """
+    Count, mean, standard deviation, min and max of values fed in batches.
+    
+    Batches are merged with Chan et al.'s pairwise update, so the variance
+    stays accurate over long recordings. Statistics are per column of the
+    batches, which are (n, ...) arrays.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = self.min = self.max = None
+        self._m2 = None
+    
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        
+        if self.count == 0:
+            self.mean, self._m2 = mean, m2
+            self.min, self.max = values.min(axis=0), values.max(axis=0)
+        else:
+            total = self.count + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self._m2 = self._m2 + m2 + delta ** 2 * self.count * n / total
+            self.min = np.minimum(self.min, values.min(axis=0))
+            self.max = np.maximum(self.max, values.max(axis=0))
+        self.count += n
+    
+    @property
+    def std(self):
+        """Population standard deviation, like np.std"""
+        return np.sqrt(self._m2 / self.count)
+
+
+class RunningRuns:
+    """
+    find_runs for a frame mask that arrives in consecutive pieces.
+    
+    A run still open at the end of one piece is carried into the next, so
+    the closed runs reported over all pieces match find_runs on the whole
+    mask.
+    """
+    
+    def __init__(self):
+        self.open_length = 0
+    
+    def update(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Lengths of the runs closed within this piece
+        """
+        mask = np.asarray(mask, dtype=bool)
+        false_frames = np.flatnonzero(~mask)
+        if len(false_frames) == 0:
+            self.open_length += len(mask)
+            return np.array([], dtype=int)
+        
+        _, lengths = find_runs(mask[false_frames[0]:])
+        # The carried run plus any leading True frames is closed by the first False frame
+        leading = self.open_length + false_frames[0]
+        if leading > 0:
+            lengths = np.concatenate(([leading], lengths))
+        
+        self.open_length = len(mask) - false_frames[-1] - 1
+        return lengths
+
+
+class SpeechFeatures:
+    """
+    Per-recording cache of the spectral representations and extractor results.
+    
+    librosa's feature functions each run their own STFT when given a waveform.
+    This context computes the magnitude, power and mel spectrograms (and the
+    onset envelopes derived from them) once, on first access, and the
+    extractors pass them in through librosa's S= / onset_envelope= arguments.
+    
+    Extractor results are memoized here as well, so a feature needed by
+    several analyses (e.g. rhythm for both the rhythm score and fluency) runs
+    once per recording. Each computation is timed under a stage name; time
+    spent in a nested stage is only counted for that stage.
+    
+    With vad enabled, an energy-based voice-activity mask is built from the
+    frame energies (the same ones pause detection uses). The spectrograms
+    are then computed over the recording with its leading and trailing
+    silence trimmed, and the voiced masks let extractors skip the frames
+    inside pauses. Frame energies, and so the pauses, always cover the whole
+    recording. Blocks of a longer recording are not trimmed (trim_edges
+    False) so their frames stay aligned with it.
+    """
+    
+    def __init__(self, audio: np.ndarray, sr: int, hop_length: int = 512, n_fft: int = 2048,
+                 energy_frame_length: int = 1024, vad: bool = False, trim_edges: bool = True):
+        self.audio = audio
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.energy_frame_length = energy_frame_length
+        self.vad = vad
+        self.trim_edges = trim_edges
+        self._results = {}
+        self._child_seconds = []
+        self.stages = {}
+    
+    def memoize(self, key, compute: Callable, stage: Optional[str] = None):
+        """Return the stored result for key, computing and timing it on first use"""
+        stage = stage or key
+        stats = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'reused': 0})
+        if key in self._results:
+            stats['reused'] += 1
+            return self._results[key]
+        
+        self._child_seconds.append(0.0)
+        start = time.perf_counter()
+        try:
+            result = compute()
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._child_seconds.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+        stats['seconds'] += elapsed - nested
+        stats['calls'] += 1
+        self._results[key] = result
+        return result
+    
+    @property
+    def frame_energy(self) -> np.ndarray:
+        """Sum of squares of each energy frame"""
+        def compute():
+            frames = frame_signal(self.audio, self.energy_frame_length, self.hop_length)
+            return np.sum(frames ** 2, axis=1)
+        return self.memoize('frame_energy', compute, stage='frame_energy')
+    
+    @property
+    def frame_rms(self) -> np.ndarray:
+        """RMS of each energy frame"""
+        return self.memoize('frame_rms', lambda: np.sqrt(self.frame_energy / self.energy_frame_length),
+                            stage='frame_energy')
+    
+    @property
+    def speech_frames(self) -> np.ndarray:
+        """
+        Voice-activity mask over the energy frames.
+        
+        Frames at or above the pause threshold, widened by VAD_HANGOVER_FRAMES
+        on each side. Every frame counts as speech when vad is off.
+        """
+        def compute():
+            energy = self.frame_energy
+            voiced = energy >= PAUSE_ENERGY_THRESHOLD
+            if not self.vad:
+                return np.ones(len(energy), dtype=bool)
+            if not voiced.size:
+                return voiced
+            # Dilation keeps the mask the length of the frames, however few there are
+            return ndimage.binary_dilation(voiced, iterations=VAD_HANGOVER_FRAMES)
+        return self.memoize('speech_frames', compute, stage='vad')
+    
+    @property
+    def span(self) -> Tuple[int, int]:
+        """Sample range the spectrograms are computed over, starting on a hop boundary"""
+        def compute():
+            speech = self.speech_frames
+            # A recording without speech is kept whole
+            if not self.trim_edges or speech.all() or not speech.any():
+                return 0, len(self.audio)
+            speech_indices = np.flatnonzero(speech)
+            start = int(speech_indices[0]) * self.hop_length
+            end = int(speech_indices[-1]) * self.hop_length + self.energy_frame_length
+            return start, min(end, len(self.audio))
+        return self.memoize('span', compute, stage='vad')
+    
+    @property
+    def analysis_audio(self) -> np.ndarray:
+        """The recording with its leading and trailing silence trimmed"""
+        start, end = self.span
+        return self.audio[start:end]
+    
+    @property
+    def voiced(self) -> np.ndarray:
+        """Voice-activity mask over the STFT frames of analysis_audio"""
+        def compute():
+            n_frames = 1 + len(self.analysis_audio) // self.hop_length
+            speech = self.speech_frames
+            if speech.all():
+                return np.ones(n_frames, dtype=bool)
+            # The energy frame whose centre is nearest to each STFT frame centre
+            centres = self.span[0] + np.arange(n_frames) * self.hop_length
+            nearest = np.round((centres - self.energy_frame_length / 2) / self.hop_length).astype(int)
+            return speech[np.clip(nearest, 0, len(speech) - 1)]
+        return self.memoize('voiced', compute, stage='vad')
+    
+    @property
+    def voiced_samples(self) -> np.ndarray:
+        """Voice-activity mask over the samples of the recording"""
+        def compute():
+            speech = self.speech_frames
+            if speech.all():
+                return np.ones(len(self.audio), dtype=bool)
+            starts, lengths = find_runs(speech, closed_only=False)
+            edges = np.zeros(len(self.audio) + 1, dtype=int)
+            np.add.at(edges, starts * self.hop_length, 1)
+            np.add.at(edges, np.minimum((starts + lengths - 1) * self.hop_length + self.energy_frame_length,
+                                        len(self.audio)), -1)
+            return np.cumsum(edges[:-1]) > 0
+        return self.memoize('voiced_samples', compute, stage='vad')
+    
+    @property
+    def voiced_audio(self) -> np.ndarray:
+        """The voiced parts of the recording joined together"""
+        return self.memoize('voiced_audio', lambda: (
+            self.audio if self.voiced_samples.all() else self.audio[self.voiced_samples]
+        ), stage='vad')
+    
+    @property
+    def magnitude(self) -> np.ndarray:
+        """STFT magnitude spectrogram of analysis_audio"""
+        def compute():
+            start, end = self.span
+            if (start, end) == (0, len(self.audio)):
+                return np.abs(librosa.stft(self.audio, n_fft=self.n_fft, hop_length=self.hop_length))
+            # Frames centred on the trimmed samples see the audio around them
+            # rather than the zero padding of a centred STFT
+            pad = self.n_fft // 2
+            context = np.pad(self.audio[max(0, start - pad):end + pad],
+                             (max(0, pad - start), max(0, end + pad - len(self.audio))))
+            return np.abs(librosa.stft(context, n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+        return self.memoize('magnitude', compute, stage='stft')
+    
+    @property
+    def power(self) -> np.ndarray:
+        """STFT power spectrogram"""
+        return self.memoize('power', lambda: self.magnitude ** 2, stage='stft')
+    
+    @property
+    def mel(self) -> np.ndarray:
+        """Mel power spectrogram"""
+        return self.memoize('mel', lambda: librosa.feature.melspectrogram(S=self.power, sr=self.sr), stage='mel')
+    
+    @property
+    def log_mel(self) -> np.ndarray:
+        """Mel spectrogram in dB"""
+        return self.memoize('log_mel', lambda: librosa.power_to_db(self.mel), stage='mel')
+    
+    @property
+    def onset_envelope(self) -> np.ndarray:
+        """Onset strength (mean over mel bands), as used by onset_detect"""
+        return self.memoize('onset_envelope', lambda: librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr
+        ), stage='onset_envelope')
+    
+    @property
+    def beat_onset_envelope(self) -> np.ndarray:
+        """Onset strength (median over mel bands), as used by beat_track"""
+        return self.memoize('beat_onset_envelope', lambda: librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr, aggregate=np.median
+        ), stage='onset_envelope')
+
+
+def per_recording(stage: str):
+    """
+    Memoize a SpeechAnalyzer extractor on the recording's SpeechFeatures.
+    
+    The first call for a recording (and argument set) runs the extractor and
+    times it under stage; later calls return the stored result.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, audio, *args, **kwargs):
+            features = self._features(audio)
+            key = (stage, args, tuple(sorted(kwargs.items())))
+            return features.memoize(key, lambda: method(self, features, *args, **kwargs), stage=stage)
+        return wrapper
+    return decorator
+
+
+# Extractors accept a raw waveform or a shared SpeechFeatures context
+AudioInput = Union[np.ndarray, SpeechFeatures]
+
+
+class StreamingSpeechStats:
+    """
+    Running feature statistics of a recording analyzed block by block.
+    
+    Each block arrives as a SpeechFeatures over the block plus a margin of
+    audio on both sides; only the frames belonging to the block itself are
+    folded into the statistics, so block edges do not distort them.
+    """
+    
+    def __init__(self, analyzer: 'SpeechAnalyzer', expected_length: int, lpc_order: int = 10):
+        self.analyzer = analyzer
+        self.expected_length = expected_length
+        self.lpc_order = lpc_order
+        
+        self.mfcc = RunningStats()
+        self.rms = RunningStats()
+        self.pitch = RunningStats()
+        self.formant_tracks = RunningStats()
+        self.pause_runs = RunningRuns()
+        self.pauses = []
+        # Per-frame envelopes of the whole recording, for the rhythm features
+        self.frame_energy = []
+        self.onset_envelope = []
+        self.beat_onset_envelope = []
+        # First and last speech energy frames, for trimming the envelopes
+        self.first_speech = self.last_speech = None
+        
+        # Autocorrelation of the pre-emphasized, Hann-windowed recording
+        self.autocorrelation = np.zeros(lpc_order + 1)
+        self._emphasis_state = None
+        self._lpc_tail = np.zeros(0)
+        
+        self.stages = {}
+    
+    def add_block(self, features: SpeechFeatures, segment_start: int, block_start: int, block_end: int,
+                  final: bool = False):
+        """
+        Fold the frames of one block into the statistics.
+        
+        Args:
+            features (SpeechFeatures): Context over audio[segment_start:...]
+            segment_start (int): Recording sample index of features.audio[0]
+            block_start (int): First sample of the block
+            block_end (int): End of the block; the recording's end if final
+            final (bool): Whether this is the last block
+        """
+        analyzer = self.analyzer
+        hop = features.hop_length
+        
+        # Frame j of the segment starts (energy) or is centred (STFT) at segment_start + j * hop
+        first = (block_start - segment_start) // hop
+        last = (block_end - segment_start) // hop + 1 if final else -(-(block_end - segment_start) // hop)
+        frames = slice(first, last)
+        
+        voiced = features.voiced[frames]
+        self.mfcc.update(analyzer.extract_mfcc_features(features)[:, frames][:, voiced].T)
+        # Only the envelopes the rhythm features use are computed
+        if analyzer.rhythm_method == 'syllables':
+            self.frame_energy.append(features.frame_energy[frames])
+        else:
+            self.onset_envelope.append(features.onset_envelope[frames])
+        if analyzer.track_tempo:
+            self.beat_onset_envelope.append(features.beat_onset_envelope[frames])
+        
+        speech = features.speech_frames[frames]
+        self.rms.update(features.frame_rms[frames][speech])
+        speech_indices = segment_start // hop + first + np.flatnonzero(speech)
+        if len(speech_indices):
+            if self.first_speech is None:
+                self.first_speech = int(speech_indices[0])
+            self.last_speech = int(speech_indices[-1])
+        pause_lengths = self.pause_runs.update(features.frame_energy[frames] < PAUSE_ENERGY_THRESHOLD)
+        pause_durations = pause_lengths * hop / analyzer.sample_rate
+        self.pauses.extend(pause_durations[pause_durations > PAUSE_MIN_SECONDS].tolist())
+        
+        times, f0, voiced = features.memoize('pitch_frames', lambda: analyzer._pitch_frames(features),
+                                             stage='pitch')
+        # Compare frame centres in samples to avoid rounding a frame into two blocks
+        centres = segment_start + np.round(times * analyzer.sample_rate)
+        in_block = (centres >= block_start) & ((centres <= block_end) if final else (centres < block_end))
+        self.pitch.update(f0[in_block & voiced])
+        
+        if analyzer.formant_method == 'tracks':
+            times, tracks = analyzer.track_formants(features)
+            centres = segment_start + np.round(times * analyzer.sample_rate)
+            in_block = (centres >= block_start) & ((centres <= block_end) if final else (centres < block_end))
+            self.formant_tracks.update(tracks[in_block & ~np.isnan(tracks).any(axis=1)])
+        else:
+            block = slice(block_start - segment_start, block_end - segment_start)
+            features.memoize('autocorrelation', lambda: self._add_autocorrelation(
+                features.audio[block] * features.voiced_samples[block], block_start
+            ), stage='formants')
+        
+        for stage, stats in features.stages.items():
+            totals = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'reused': 0})
+            for key in totals:
+                totals[key] += stats[key]
+    
+    def _add_autocorrelation(self, audio: np.ndarray, start: int):
+        """Accumulate the LPC autocorrelation of audio[start:...] of the recording"""
+        emphasized, self._emphasis_state = librosa.effects.preemphasis(
+            audio, zi=self._emphasis_state, return_zf=True
+        )
+        # Hann window over the whole recording, as _extract_formants applies
+        n = np.minimum(np.arange(start, start + len(audio)), self.expected_length - 1)
+        windowed = emphasized * (0.5 - 0.5 * np.cos(2 * np.pi * n / max(self.expected_length - 1, 1)))
+        
+        joined = np.concatenate((self._lpc_tail, windowed))
+        offset = len(self._lpc_tail)
+        for lag in range(self.lpc_order + 1):
+            first = max(offset, lag)
+            self.autocorrelation[lag] += np.dot(joined[first:], joined[first - lag:len(joined) - lag])
+        self._lpc_tail = joined[-self.lpc_order:]
+    
+    def trimmed_envelope(self, pieces: List[np.ndarray], n_samples: int) -> np.ndarray:
+        """
+        Join the pieces of an onset envelope, keeping the frames analyze_audio
+        keeps after trimming.
+        
+        Args:
+            pieces (list): Envelope values of each block
+            n_samples (int): Length of the recording
+        
+        Returns:
+            np.ndarray: Onset envelope
+        """
+        envelope = np.concatenate(pieces)
+        if self.first_speech is None or not self.analyzer.vad:
+            return envelope
+        
+        hop = self.analyzer.hop_length
+        start = self.first_speech * hop
+        end = min(self.last_speech * hop + 1024, n_samples)
+        envelope = envelope[self.first_speech:self.first_speech + 1 + (end - start) // hop]
+        # onset_strength zero-fills the frames at the start that have no earlier frame to compare with
+        envelope[:1 + 2048 // (2 * hop)] = 0
+        return envelope
+    
+    def formants(self) -> Dict:
+        """Formants of the autocorrelation-method LPC of the whole recording, or of the formant tracks"""
+        if self.analyzer.formant_method == 'tracks':
+            return self.analyzer._summarize_formant_tracks(self.formant_tracks)
+        r = self.autocorrelation
+        if r[0] <= 0:
+            return {'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0}
+        coeffs = solve_toeplitz(r[:-1], -r[1:])
+        return self.analyzer._formants_from_lpc(np.concatenate(([1.0], coeffs)))
+
+
 class SpeechAnalyzer:
     """
     Speech analysis for dyslexia detection using audio features
     """
     
-    def __init__(self):
-        self.sample_rate = 22050
+    def __init__(self, pitch_method: Optional[str] = None, sample_rate: Optional[int] = None,
+                 resampler: Optional[str] = None, vad: Optional[bool] = None,
+                 rhythm_method: Optional[str] = None, formant_method: Optional[str] = None):
+        # 22050 Hz by default; 16000 Hz keeps the speech band and is cheaper to analyze
+        self.sample_rate = int(sample_rate or _setting('SPEECH_SAMPLE_RATE', 22050))
         self.hop_length = 512
         self.n_mfcc = 13
+        
+        # 'piptrack' (default) or the cheaper downsampled 'yin'
+        self.pitch_method = pitch_method or _setting('SPEECH_PITCH_METHOD', 'piptrack')
+        if self.pitch_method not in PITCH_METHODS:
+            raise ValueError(f"Unknown pitch method: {self.pitch_method}")
+        
+        # soxr quality used when a file is not already at sample_rate
+        self.resampler = resampler or _setting('SPEECH_RESAMPLER', 'soxr_hq')
+        if self.resampler not in RESAMPLERS:
+            raise ValueError(f"Unknown resampler: {self.resampler}")
+        
+        # Skip silence: trim the edges and restrict frame features to voiced frames
+        self.vad = _setting('SPEECH_VAD', True) if vad is None else vad
+        
+        # 'onsets' (default, spectral onset intervals) or 'syllables' (energy envelope peaks)
+        self.rhythm_method = rhythm_method or _setting('SPEECH_RHYTHM_METHOD', 'onsets')
+        if self.rhythm_method not in RHYTHM_METHODS:
+            raise ValueError(f"Unknown rhythm method: {self.rhythm_method}")
+        # The tempo estimate is not used in scoring, so it is only computed on request
+        self.track_tempo = _setting('SPEECH_RHYTHM_TEMPO', False)
+        
+        # 'recording' (default, one LPC of the whole recording) or 'tracks' (frame-wise F1-F3)
+        self.formant_method = formant_method or _setting('SPEECH_FORMANT_METHOD', 'recording')
+        if self.formant_method not in FORMANT_METHODS:
+            raise ValueError(f"Unknown formant method: {self.formant_method}")
+        
+        # Recordings at least this long are analyzed block by block
+        self.streaming_min_seconds = _setting('SPEECH_STREAMING_MIN_SECONDS', 300)
+        self.stream_block_seconds = _setting('SPEECH_STREAM_BLOCK_SECONDS', 30)
+    
+    @property
+    def version(self) -> str:
+        """Analyzer version and settings, used to key cached results"""
+        return (f"{ANALYZER_VERSION}:sr{self.sample_rate}-{self.resampler}:pitch-{self.pitch_method}"
+                f":stream-{self.streaming_min_seconds}s:vad-{'on' if self.vad else 'off'}"
+                f":rhythm-{self.rhythm_method}:formants-{self.formant_method}")
+    
+    def _features(self, audio) -> SpeechFeatures:
+        """Wrap a waveform in a SpeechFeatures context unless it already is one"""
+        if isinstance(audio, SpeechFeatures):
+            return audio
+        return SpeechFeatures(audio, self.sample_rate, self.hop_length, vad=self.vad)
+    
+    def load_audio(self, audio_path: str, refresh: bool = False,
+                   cache_key: Optional[str] = None) -> Tuple[np.ndarray, int]:
+        """
+        Load and preprocess audio file
+        
+        In a Django project decoded recordings go through the PCM cache, and
+        a cached recording is returned as a read-only memory map. refresh
+        decodes the file again even if it is cached; cache_key saves hashing
+        the file when the caller already has its key.
+        """
+        if settings.configured:
+            try:
+                audio = cached_pcm(audio_path, self.sample_rate, self.resampler,
+                                   lambda: self._decode_audio(audio_path)[0], refresh=refresh, key=cache_key)
+                return audio, self.sample_rate
+            except OSError as e:
+                print(f"Error loading audio: {e}")
+                return np.array([]), self.sample_rate
+        return self._decode_audio(audio_path)
     
-    def load_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
-        """Load and preprocess audio file"""
+    def _decode_audio(self, audio_path: str) -> Tuple[np.ndarray, int]:
+        """Decode an audio file as mono float32 at the analysis sample rate"""
         try:
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
-            return audio, sr
+            try:
+                audio, file_sr = sf.read(audio_path, dtype='float32', always_2d=True)
+                audio = audio.mean(axis=1)
+            except sf.LibsndfileError:
+                # Formats libsndfile cannot decode go through librosa's audioread fallback
+                audio, file_sr = librosa.load(audio_path, sr=None)
+            
+            # Files already at the analysis rate are used as decoded
+            if file_sr != self.sample_rate:
+                audio = librosa.resample(audio, orig_sr=file_sr, target_sr=self.sample_rate,
+                                         res_type=self.resampler)
+            return audio, self.sample_rate
         except Exception as e:
             print(f"Error loading audio: {e}")
             return np.array([]), self.sample_rate
     
-    def extract_mfcc_features(self, audio: np.ndarray) -> np.ndarray:
-        """Extract MFCC features"""
-        mfccs = librosa.feature.mfcc(y=audio, sr=self.sample_rate, n_mfcc=self.n_mfcc)
+    @per_recording('mfcc')
+    def extract_mfcc_features(self, audio: AudioInput) -> np.ndarray:
+        """Extract MFCC features (every frame of the trimmed recording)"""
+        features = self._features(audio)
+        mfccs = librosa.feature.mfcc(S=features.log_mel, sr=self.sample_rate, n_mfcc=self.n_mfcc)
         return mfccs
     
-    def extract_spectral_features(self, audio: np.ndarray) -> Dict:
+    @per_recording('spectral')
+    def extract_spectral_features(self, audio: AudioInput) -> Dict:
         """Extract spectral features"""
+        features = self._features(audio)
+        magnitude = features.magnitude[:, features.voiced]
+        
         # Spectral centroid
-        spectral_centroids = librosa.feature.spectral_centroid(y=audio, sr=self.sample_rate)[0]
+        spectral_centroids = librosa.feature.spectral_centroid(S=magnitude, sr=self.sample_rate)[0]
         
         # Spectral rolloff
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio, sr=self.sample_rate)[0]
+        spectral_rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=self.sample_rate)[0]
         
         # Zero crossing rate
-        zcr = librosa.feature.zero_crossing_rate(audio)[0]
+        zcr = librosa.feature.zero_crossing_rate(features.analysis_audio)[0][features.voiced]
         
         # Spectral bandwidth
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio, sr=self.sample_rate)[0]
+        spectral_bandwidth = librosa.feature.spectral_bandwidth(S=magnitude, sr=self.sample_rate)[0]
         
         return {
             'spectral_centroid_mean': np.mean(spectral_centroids),
@@ -57,10 +781,37 @@ class SpeechAnalyzer:
             'spectral_bandwidth_std': np.std(spectral_bandwidth)
         }
     
-    def extract_rhythm_features(self, audio: np.ndarray) -> Dict:
+    @per_recording('rhythm')
+    def extract_rhythm_features(self, audio: AudioInput) -> Dict:
         """Extract rhythm and timing features"""
+        features = self._features(audio)
+        return self._rhythm_features(lambda: features.frame_energy, lambda: features.onset_envelope,
+                                     lambda: features.beat_onset_envelope)
+    
+    def _rhythm_features(self, frame_energy: Callable[[], np.ndarray], onset_envelope: Callable[[], np.ndarray],
+                         beat_onset_envelope: Callable[[], np.ndarray]) -> Dict:
+        """
+        Rhythm features of a whole recording with the configured rhythm method.
+        
+        Each argument returns the envelope when called, so only the ones the
+        rhythm method (and the optional tempo estimate) use are computed.
+        """
+        if self.rhythm_method == 'syllables':
+            rhythm_features = self._rhythm_from_syllables(frame_energy())
+        else:
+            rhythm_features = self._rhythm_from_onsets(onset_envelope())
+        
+        # Tempo estimation (beat_track's estimate; the beat positions are not used)
+        if self.track_tempo:
+            rhythm_features['tempo'] = float(estimate_tempo(beat_onset_envelope(), self.sample_rate,
+                                                            self.hop_length))
+        return rhythm_features
+    
+    def _rhythm_from_onsets(self, onset_envelope: np.ndarray) -> Dict:
+        """Rhythm features from the intervals between spectral onsets"""
         # Onset detection
-        onset_frames = librosa.onset.onset_detect(y=audio, sr=self.sample_rate)
+        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=self.sample_rate,
+                                                  hop_length=self.hop_length)
         onset_times = librosa.frames_to_time(onset_frames, sr=self.sample_rate)
         
         # Calculate rhythm metrics
@@ -70,45 +821,173 @@ class SpeechAnalyzer:
         else:
             rhythm_consistency = 0.0
         
-        # Tempo estimation
-        tempo, _ = librosa.beat.beat_track(y=audio, sr=self.sample_rate)
-        
         return {
             'rhythm_consistency': rhythm_consistency,
-            'tempo': float(tempo),
             'onset_count': len(onset_times),
             'average_interval': np.mean(np.diff(onset_times)) if len(onset_times) > 1 else 0
         }
     
-    def extract_pronunciation_features(self, audio: np.ndarray) -> Dict:
+    def _rhythm_from_syllables(self, frame_energy: np.ndarray) -> Dict:
+        """
+        Rhythm features from syllable nuclei in the energy envelope.
+        
+        Syllable nuclei are the peaks of the smoothed dB energy envelope that
+        fall in speech frames. Syllable rate is per second of speech (pauses
+        excluded), and rhythm consistency is 1 - the coefficient of variation
+        of the intervals between consecutive syllables that do not span a
+        pause.
+        """
+        hop_seconds = self.hop_length / self.sample_rate
+        speech = frame_energy >= PAUSE_ENERGY_THRESHOLD
+        
+        window = np.hanning(SYLLABLE_SMOOTHING_FRAMES + 2)[1:-1]
+        # np.convolve(mode='same') returns the longer of its inputs, which is the
+        # window on clips shorter than it; convolve1d keeps one value per frame
+        envelope = ndimage.convolve1d(10 * np.log10(frame_energy + 1e-10), window / window.sum(),
+                                      mode='constant')
+        peaks, _ = signal.find_peaks(envelope, prominence=SYLLABLE_PROMINENCE_DB,
+                                     distance=max(1, int(round(SYLLABLE_MIN_INTERVAL / hop_seconds))))
+        peaks = peaks[speech[peaks]]
+        
+        # Mark the frames of pauses and drop the intervals that contain any
+        starts, lengths = find_runs(~speech, closed_only=False)
+        long_pauses = lengths * hop_seconds > PAUSE_MIN_SECONDS
+        edges = np.zeros(len(frame_energy) + 1, dtype=int)
+        np.add.at(edges, starts[long_pauses], 1)
+        np.add.at(edges, starts[long_pauses] + lengths[long_pauses], -1)
+        pauses_before = np.cumsum(np.cumsum(edges[:-1]) > 0)
+        within_phrase = pauses_before[peaks[1:]] == pauses_before[peaks[:-1]]
+        intervals = np.diff(peaks)[within_phrase] * hop_seconds
+        
+        if len(intervals) > 0 and np.mean(intervals) > 0:
+            interval_variability = np.std(intervals) / np.mean(intervals)
+            rhythm_consistency = 1.0 - interval_variability
+        else:
+            interval_variability = 0.0
+            rhythm_consistency = 0.0
+        
+        speech_seconds = np.count_nonzero(speech) * hop_seconds
+        return {
+            'rhythm_consistency': float(rhythm_consistency),
+            'syllable_count': len(peaks),
+            'syllable_rate': len(peaks) / speech_seconds if speech_seconds > 0 else 0.0,
+            'interval_variability': float(interval_variability),
+            'average_interval': float(np.mean(intervals)) if len(intervals) > 0 else 0
+        }
+    
+    @per_recording('formants')
+    def extract_pronunciation_features(self, audio: AudioInput) -> Dict:
         """Extract pronunciation-related features"""
+        if self.formant_method == 'tracks':
+            _, tracks = self.track_formants(audio)
+            track_stats = RunningStats()
+            track_stats.update(tracks[~np.isnan(tracks).any(axis=1)])
+            return self._formant_features(self._summarize_formant_tracks(track_stats))
+        
         # Formant analysis (simplified)
         # Extract formants using LPC
+        voiced_audio = self._features(audio).voiced_audio
+        if len(voiced_audio) == 0:
+            return self._formant_features({'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0})
         try:
-            # Pre-emphasize
-            emphasized = librosa.effects.preemphasis(audio)
+            # Pre-emphasize the voiced audio only
+            emphasized = librosa.effects.preemphasis(voiced_audio)
             
             # Extract formants (simplified approach)
             formants = self._extract_formants(emphasized)
-            
-            # Calculate formant ratios
-            f1_f2_ratio = formants['f1_mean'] / formants['f2_mean'] if formants['f2_mean'] > 0 else 0
-            f2_f3_ratio = formants['f2_mean'] / formants['f3_mean'] if formants['f3_mean'] > 0 else 0
-            
-            return {
-                'f1_mean': formants['f1_mean'],
-                'f2_mean': formants['f2_mean'],
-                'f3_mean': formants['f3_mean'],
-                'f1_f2_ratio': f1_f2_ratio,
-                'f2_f3_ratio': f2_f3_ratio,
-                'formant_variance': formants['variance']
-            }
+            return self._formant_features(formants)
         except Exception as e:
             print(f"Error in formant analysis: {e}")
-            return {
-                'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0,
-                'f1_f2_ratio': 0, 'f2_f3_ratio': 0, 'formant_variance': 0
-            }
+            return self._formant_features({'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0})
+    
+    def _formant_features(self, formants: Dict) -> Dict:
+        """
+        Pronunciation features from the formant frequencies
+        
+        formant_variance is the spread of F1-F3 around their mean with every
+        formant method. The 'tracks' method adds formant_track_variance, the
+        mean variance of each formant over time.
+        """
+        # Calculate formant ratios
+        f1_f2_ratio = formants['f1_mean'] / formants['f2_mean'] if formants['f2_mean'] > 0 else 0
+        f2_f3_ratio = formants['f2_mean'] / formants['f3_mean'] if formants['f3_mean'] > 0 else 0
+        
+        pronunciation_features = {
+            'f1_mean': formants['f1_mean'],
+            'f2_mean': formants['f2_mean'],
+            'f3_mean': formants['f3_mean'],
+            'f1_f2_ratio': f1_f2_ratio,
+            'f2_f3_ratio': f2_f3_ratio,
+            'formant_variance': formants['variance']
+        }
+        if 'track_variance' in formants:
+            pronunciation_features['formant_track_variance'] = formants['track_variance']
+        return pronunciation_features
+    
+    @per_recording('formant_tracks')
+    def track_formants(self, audio: AudioInput) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Track F1-F3 over the voiced frames of a recording.
+        
+        The trimmed recording is downsampled to FORMANT_SAMPLE_RATE,
+        pre-emphasized and cut into Hamming-windowed frames. Frames below the
+        pause energy are skipped; the rest are solved FORMANT_BATCH_FRAMES at
+        a time with batch_lpc and lpc_roots. A frame's formants are the three
+        lowest resonances above FORMANT_MIN_FREQ that are narrower than
+        FORMANT_MAX_BANDWIDTH.
+        
+        Returns:
+            tuple: (frame centre times in seconds, (n_frames, 3) F1-F3 in Hz,
+            NaN where a frame has fewer than three formants)
+        """
+        features = self._features(audio)
+        audio = librosa.resample(features.analysis_audio, orig_sr=self.sample_rate,
+                                 target_sr=FORMANT_SAMPLE_RATE, res_type='polyphase')
+        energy_frames = frame_signal(audio, FORMANT_FRAME_LENGTH, FORMANT_HOP_LENGTH)
+        frames = frame_signal(librosa.effects.preemphasis(audio) if len(audio) > 1 else audio,
+                              FORMANT_FRAME_LENGTH, FORMANT_HOP_LENGTH)
+        
+        window = np.hamming(FORMANT_FRAME_LENGTH)
+        loud, tracks = [], []
+        for start in range(0, len(frames), FORMANT_BATCH_FRAMES):
+            batch = slice(start, start + FORMANT_BATCH_FRAMES)
+            energy = np.einsum('ij,ij->i', energy_frames[batch], energy_frames[batch])
+            batch_loud = start + np.flatnonzero(energy > FORMANT_FRAME_LENGTH * VOICED_RMS_THRESHOLD ** 2)
+            if len(batch_loud) == 0:
+                continue
+            roots = lpc_roots(batch_lpc(frames[batch_loud] * window, FORMANT_LPC_ORDER))
+            
+            freqs = np.angle(roots) * FORMANT_SAMPLE_RATE / (2 * np.pi)
+            bandwidths = -np.log(np.abs(roots) + 1e-12) * FORMANT_SAMPLE_RATE / np.pi
+            valid = (roots.imag > 0) & (freqs > FORMANT_MIN_FREQ) & (bandwidths < FORMANT_MAX_BANDWIDTH)
+            lowest = np.sort(np.where(valid, freqs, np.inf), axis=1)[:, :3]
+            loud.append(batch_loud)
+            tracks.append(np.where(np.isfinite(lowest), lowest, np.nan))
+        
+        if not loud:
+            return np.array([]), np.empty((0, 3))
+        loud = np.concatenate(loud)
+        times = (features.span[0] / self.sample_rate
+                 + (loud * FORMANT_HOP_LENGTH + FORMANT_FRAME_LENGTH / 2) / FORMANT_SAMPLE_RATE)
+        return times, np.concatenate(tracks)
+    
+    def _summarize_formant_tracks(self, track_stats: RunningStats) -> Dict:
+        """
+        Mean F1-F3 of the frames with all three formants.
+        
+        variance is the spread of the three means, as with the 'recording'
+        method; track_variance is the mean variance of each formant over time.
+        """
+        if track_stats.count == 0:
+            return {'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0, 'track_variance': 0}
+        mean = track_stats.mean
+        return {
+            'f1_mean': float(mean[0]),
+            'f2_mean': float(mean[1]),
+            'f3_mean': float(mean[2]),
+            'variance': float(np.var(mean)),
+            'track_variance': float(np.mean(track_stats.std ** 2))
+        }
     
     def _extract_formants(self, audio: np.ndarray, order: int = 10) -> Dict:
         """Extract formant frequencies using LPC"""
@@ -117,7 +996,10 @@ class SpeechAnalyzer:
         
         # LPC analysis
         lpc_coeffs = librosa.lpc(windowed, order=order)
-        
+        return self._formants_from_lpc(lpc_coeffs)
+    
+    def _formants_from_lpc(self, lpc_coeffs: np.ndarray) -> Dict:
+        """Formant frequencies from the roots of an LPC polynomial"""
         # Find roots of LPC polynomial
         roots = np.roots(lpc_coeffs)
         
@@ -139,21 +1021,28 @@ class SpeechAnalyzer:
         else:
             return {'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0}
     
-    def analyze_fluency(self, audio: np.ndarray) -> Dict:
+    @per_recording('fluency')
+    def analyze_fluency(self, audio: AudioInput) -> Dict:
         """Analyze speech fluency"""
+        features = self._features(audio)
+        
         # Detect pauses
-        pauses = self._detect_pauses(audio)
+        pauses = self._detect_pauses(features)
         
+        # Analyze rhythm
+        rhythm_features = self.extract_rhythm_features(features)
+        
+        return self._summarize_fluency(pauses, len(features.audio), rhythm_features)
+    
+    def _summarize_fluency(self, pauses: List[float], n_samples: int, rhythm_features: Dict) -> Dict:
+        """Fluency analysis from the pauses and rhythm of a whole recording"""
         # Calculate speech rate
-        duration = len(audio) / self.sample_rate
-        speech_rate = len(audio) / duration if duration > 0 else 0
+        duration = n_samples / self.sample_rate
+        speech_rate = n_samples / duration if duration > 0 else 0
         
         # Calculate pause frequency
         pause_frequency = len(pauses) / duration if duration > 0 else 0
         
-        # Analyze rhythm
-        rhythm_features = self.extract_rhythm_features(audio)
-        
         return {
             'speech_rate': speech_rate,
             'pause_frequency': pause_frequency,
@@ -162,38 +1051,18 @@ class SpeechAnalyzer:
             'fluency_score': self._calculate_fluency_score(pauses, rhythm_features)
         }
     
-    def _detect_pauses(self, audio: np.ndarray, threshold: float = 0.01) -> List[float]:
+    @per_recording('pauses')
+    def _detect_pauses(self, audio: AudioInput, threshold: float = PAUSE_ENERGY_THRESHOLD) -> List[float]:
         """Detect pauses in speech"""
-        # Calculate energy
-        frame_length = 1024
-        hop_length = 512
-        energy = []
-        
-        for i in range(0, len(audio) - frame_length, hop_length):
-            frame = audio[i:i + frame_length]
-            frame_energy = np.sum(frame ** 2)
-            energy.append(frame_energy)
-        
-        energy = np.array(energy)
+        features = self._features(audio)
         
         # Find low energy regions (pauses)
-        pause_frames = energy < threshold
-        pause_durations = []
-        
-        in_pause = False
-        pause_start = 0
+        pause_frames = features.frame_energy < threshold
+        _, pause_lengths = find_runs(pause_frames)
+        pause_durations = pause_lengths * features.hop_length / self.sample_rate
         
-        for i, is_pause in enumerate(pause_frames):
-            if is_pause and not in_pause:
-                in_pause = True
-                pause_start = i
-            elif not is_pause and in_pause:
-                in_pause = False
-                pause_duration = (i - pause_start) * hop_length / self.sample_rate
-                if pause_duration > 0.1:  # Only count pauses longer than 100ms
-                    pause_durations.append(pause_duration)
-        
-        return pause_durations
+        # Only count pauses longer than PAUSE_MIN_SECONDS
+        return pause_durations[pause_durations > PAUSE_MIN_SECONDS].tolist()
     
     def _calculate_fluency_score(self, pauses: List[float], rhythm_features: Dict) -> float:
         """Calculate overall fluency score"""
@@ -207,14 +1076,21 @@ class SpeechAnalyzer:
         fluency_score = (pause_score + rhythm_score) / 2
         return min(max(fluency_score, 0), 1)
     
-    def analyze_pronunciation(self, audio: np.ndarray, text_content: str) -> Dict:
+    @per_recording('pronunciation')
+    def analyze_pronunciation(self, audio: AudioInput, text_content: str) -> Dict:
         """Analyze pronunciation accuracy"""
+        features = self._features(audio)
+        
         # Extract pronunciation features
-        pronunciation_features = self.extract_pronunciation_features(audio)
+        pronunciation_features = self.extract_pronunciation_features(features)
         
         # Analyze phoneme-level features
-        phoneme_analysis = self._analyze_phonemes(audio)
+        phoneme_analysis = self._analyze_phonemes(features)
         
+        return self._summarize_pronunciation(pronunciation_features, phoneme_analysis)
+    
+    def _summarize_pronunciation(self, pronunciation_features: Dict, phoneme_analysis: Dict) -> Dict:
+        """Pronunciation analysis from the formant and phoneme features"""
         # Calculate pronunciation score
         pronunciation_score = self._calculate_pronunciation_score(pronunciation_features, phoneme_analysis)
         
@@ -225,10 +1101,16 @@ class SpeechAnalyzer:
             'mispronunciations': self._identify_mispronunciations(pronunciation_features)
         }
     
-    def _analyze_phonemes(self, audio: np.ndarray) -> Dict:
+    @per_recording('phonemes')
+    def _analyze_phonemes(self, audio: AudioInput) -> Dict:
         """Analyze phoneme-level features"""
-        # Extract MFCC features
-        mfccs = self.extract_mfcc_features(audio)
+        # Extract MFCC features of the voiced frames
+        features = self._features(audio)
+        mfccs = self.extract_mfcc_features(features)
+        if not features.voiced.all():
+            mfccs = mfccs[:, features.voiced]
+        if mfccs.shape[1] == 0:
+            return {}
         
         # Calculate phoneme-level statistics
         phoneme_stats = {
@@ -276,8 +1158,126 @@ class SpeechAnalyzer:
     
     def analyze_speech(self, audio_path: str, text_content: str = "") -> Dict:
         """Complete speech analysis"""
+        if self.should_stream(audio_path):
+            return self.analyze_speech_stream(audio_path, text_content)
+        
         # Load audio
         audio, sr = self.load_audio(audio_path)
+        return self.analyze_audio(audio, text_content, sr)
+    
+    def should_stream(self, audio_path: str) -> bool:
+        """Whether a recording is long enough for analyze_speech_stream"""
+        try:
+            duration = sf.info(audio_path).duration
+        except Exception:
+            # Formats soundfile cannot read are decoded whole by librosa
+            return False
+        return duration >= self.streaming_min_seconds
+    
+    def analyze_speech_stream(self, audio_path: str, text_content: str = "",
+                              timings: Optional[Dict] = None) -> Dict:
+        """
+        Complete speech analysis with memory bounded by the block size.
+        
+        The file is decoded block by block (stream_block_seconds) and each
+        block is analyzed with a margin of audio on both sides, so its frames
+        see the same samples as in analyze_audio. MFCC, energy, pause, pitch
+        and volume features are kept as running statistics; only the onset
+        strength envelopes (one value per hop) and the detected pauses grow
+        with the recording.
+        
+        Two features are close to, but not exactly, the whole-recording ones:
+        the mel spectrogram's 80 dB floor is relative to each block's peak,
+        and with the 'recording' formant method formants come from an
+        autocorrelation-method LPC of the whole recording (with the pauses
+        zeroed when vad is on) instead of librosa.lpc's Burg method over the
+        joined voiced audio. Formant tracks are computed per block.
+        """
+        try:
+            info = sf.info(audio_path)
+        except Exception as e:
+            print(f"Error streaming audio: {e}")
+            audio, sr = self.load_audio(audio_path)
+            return self.analyze_audio(audio, text_content, sr, timings)
+        
+        n_fft = 2048
+        block_size = max(1, int(self.stream_block_seconds * self.sample_rate) // self.hop_length) * self.hop_length
+        # Enough context for the centred STFT and the onset envelope's 3-frame lag
+        margin = 2 * n_fft
+        
+        stats = StreamingSpeechStats(self, int(np.ceil(info.frames * self.sample_rate / info.samplerate)))
+        
+        def add_block(buffer, buffer_start, block_start, block_end, final):
+            segment_start = max(0, block_start - margin)
+            segment = buffer[segment_start - buffer_start:block_end + margin - buffer_start]
+            # Blocks are not trimmed so their frames stay aligned with the recording
+            features = SpeechFeatures(segment, self.sample_rate, self.hop_length, n_fft,
+                                      vad=self.vad, trim_edges=False)
+            stats.add_block(features, segment_start, block_start, block_end, final)
+        
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = block_start = 0
+        for decoded in decode_blocks(audio_path, self.sample_rate, block_size, self.resampler):
+            buffer = np.concatenate((buffer, decoded))
+            while buffer_start + len(buffer) >= block_start + block_size + margin:
+                add_block(buffer, buffer_start, block_start, block_start + block_size, final=False)
+                block_start += block_size
+                # Drop audio no later block needs
+                consumed = max(0, block_start - margin) - buffer_start
+                buffer = buffer[consumed:]
+                buffer_start += consumed
+        
+        n_samples = buffer_start + len(buffer)
+        if n_samples == 0:
+            return self.analyze_audio(buffer, text_content)
+        while block_start < n_samples:
+            block_end = min(block_start + block_size, n_samples)
+            add_block(buffer, buffer_start, block_start, block_end, final=block_end == n_samples)
+            block_start = block_end
+        
+        rhythm_features = self._rhythm_features(
+            lambda: np.concatenate(stats.frame_energy),
+            lambda: stats.trimmed_envelope(stats.onset_envelope, n_samples),
+            lambda: stats.trimmed_envelope(stats.beat_onset_envelope, n_samples)
+        )
+        fluency_analysis = self._summarize_fluency(stats.pauses, n_samples, rhythm_features)
+        
+        # No MFCC frames are voiced when the whole recording is silent
+        phoneme_analysis = {
+            'mfcc_mean': stats.mfcc.mean.tolist(),
+            'mfcc_std': stats.mfcc.std.tolist(),
+            'mfcc_range': (stats.mfcc.max - stats.mfcc.min).tolist()
+        } if stats.mfcc.count else {}
+        try:
+            formants = stats.formants()
+        except Exception as e:
+            print(f"Error in formant analysis: {e}")
+            formants = {'f1_mean': 0, 'f2_mean': 0, 'f3_mean': 0, 'variance': 0}
+        pronunciation_analysis = self._summarize_pronunciation(self._formant_features(formants), phoneme_analysis)
+        
+        pitch = stats.pitch
+        pitch_variation = pitch.std / pitch.mean if pitch.count > 1 and pitch.mean > 0 else 0
+        rms = stats.rms
+        if rms.count > 1:
+            volume_consistency = 1 - (rms.std / rms.mean) if rms.mean > 0 else 0
+        else:
+            volume_consistency = 1
+        
+        if timings is not None:
+            timings.update(stats.stages)
+        
+        return self._compile_results(n_samples / self.sample_rate, text_content, rhythm_features, fluency_analysis,
+                                     pronunciation_analysis, float(pitch_variation), float(volume_consistency))
+    
+    def analyze_audio(self, audio: np.ndarray, text_content: str = "", sr: Optional[int] = None,
+                      timings: Optional[Dict] = None) -> Dict:
+        """
+        Complete speech analysis of an already decoded recording at self.sample_rate
+        
+        If a timings dict is given it is filled with the per-stage breakdown:
+        {stage: {'seconds': ..., 'calls': ..., 'reused': ...}}.
+        """
+        sr = sr or self.sample_rate
         
         if len(audio) == 0:
             return {
@@ -294,14 +1294,31 @@ class SpeechAnalyzer:
                 'model_confidence': 0.0
             }
         
-        # Extract features
-        spectral_features = self.extract_spectral_features(audio)
-        rhythm_features = self.extract_rhythm_features(audio)
-        fluency_analysis = self.analyze_fluency(audio)
-        pronunciation_analysis = self.analyze_pronunciation(audio, text_content)
+        # Compute the spectrograms once and share them between extractors
+        features = self._features(audio)
         
+        # Extract features (the spectral features are not part of the result, so not computed)
+        rhythm_features = self.extract_rhythm_features(features)
+        fluency_analysis = self.analyze_fluency(features)
+        pronunciation_analysis = self.analyze_pronunciation(features, text_content)
+        
+        # Calculate pitch variation
+        pitch_variation = self._calculate_pitch_variation(features)
+        
+        # Calculate volume consistency
+        volume_consistency = self._calculate_volume_consistency(features)
+        
+        if timings is not None:
+            timings.update(features.stages)
+        
+        return self._compile_results(len(audio) / sr, text_content, rhythm_features, fluency_analysis,
+                                     pronunciation_analysis, pitch_variation, volume_consistency)
+    
+    def _compile_results(self, duration: float, text_content: str, rhythm_features: Dict,
+                         fluency_analysis: Dict, pronunciation_analysis: Dict,
+                         pitch_variation: float, volume_consistency: float) -> Dict:
+        """Assemble the analysis result dict of a recording"""
         # Calculate reading speed (words per minute)
-        duration = len(audio) / sr
         word_count = len(text_content.split()) if text_content else 1
         reading_speed = (word_count / duration) * 60 if duration > 0 else 0
         
@@ -309,12 +1326,6 @@ class SpeechAnalyzer:
         normalized_speed = min(reading_speed / 80.0, 1.0)
         risk_score = 1.0 - normalized_speed
         
-        # Calculate pitch variation
-        pitch_variation = self._calculate_pitch_variation(audio)
-        
-        # Calculate volume consistency
-        volume_consistency = self._calculate_volume_consistency(audio)
-        
         return {
             'pronunciation_score': pronunciation_analysis['pronunciation_score'],
             'fluency_score': fluency_analysis['fluency_score'],
@@ -329,17 +1340,11 @@ class SpeechAnalyzer:
             'model_confidence': 0.85  # Placeholder confidence score
         }
     
-    def _calculate_pitch_variation(self, audio: np.ndarray) -> float:
+    @per_recording('pitch')
+    def _calculate_pitch_variation(self, audio: AudioInput) -> float:
         """Calculate pitch variation"""
         try:
-            pitches, magnitudes = librosa.piptrack(y=audio, sr=self.sample_rate)
-            pitch_values = []
-            
-            for t in range(pitches.shape[1]):
-                index = magnitudes[:, t].argmax()
-                pitch = pitches[index, t]
-                if pitch > 0:
-                    pitch_values.append(pitch)
+            pitch_values = self._track_pitch(self._features(audio))
             
             if len(pitch_values) > 1:
                 return np.std(pitch_values) / np.mean(pitch_values) if np.mean(pitch_values) > 0 else 0
@@ -347,17 +1352,67 @@ class SpeechAnalyzer:
         except:
             return 0
     
-    def _calculate_volume_consistency(self, audio: np.ndarray) -> float:
+    def _track_pitch(self, features: SpeechFeatures) -> np.ndarray:
+        """F0 of the voiced frames, using the configured pitch method"""
+        _, f0, voiced = self._pitch_frames(features)
+        return f0[voiced]
+    
+    def _pitch_frames(self, features: SpeechFeatures) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-frame pitch track of the configured pitch method.
+        
+        Returns:
+            tuple: (frame centre times in seconds, F0, voiced mask)
+        """
+        if self.pitch_method == 'yin':
+            return self._pitch_frames_yin(features)
+        return self._pitch_frames_piptrack(features)
+    
+    def _pitch_frames_piptrack(self, features: SpeechFeatures) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pitch of the strongest piptrack peak in every voiced frame"""
+        frames = np.flatnonzero(features.voiced)
+        pitches, magnitudes = librosa.piptrack(S=features.magnitude[:, frames], sr=self.sample_rate)
+        
+        # Strongest bin of every frame at once instead of a per-frame loop
+        strongest = magnitudes.argmax(axis=0)
+        frame_pitches = pitches[strongest, np.arange(pitches.shape[1])]
+        times = (features.span[0] + frames * features.hop_length) / self.sample_rate
+        
+        # Frames without a peak (pitch 0) are unvoiced
+        return times, frame_pitches, frame_pitches > 0
+    
+    def _pitch_frames_yin(self, features: SpeechFeatures) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Cheaper F0 estimate: YIN on a signal downsampled to PITCH_SAMPLE_RATE.
+        
+        Speech F0 is well below 1 kHz, so the downsampled signal keeps all the
+        information YIN needs at a fraction of the cost of piptrack's full
+        resolution spectrogram. Frames are voiced when they lie entirely
+        inside a run above the pause threshold (frames straddling a voicing
+        edge give spurious estimates) and are not pinned to the search limits.
+        """
+        audio = librosa.resample(features.analysis_audio, orig_sr=self.sample_rate,
+                                 target_sr=PITCH_SAMPLE_RATE, res_type='polyphase')
+        if len(audio) < PITCH_FRAME_LENGTH:
+            return np.array([]), np.array([]), np.array([], dtype=bool)
+        
+        f0 = librosa.yin(audio, fmin=PITCH_FMIN, fmax=PITCH_FMAX, sr=PITCH_SAMPLE_RATE,
+                         frame_length=PITCH_FRAME_LENGTH, hop_length=PITCH_HOP_LENGTH)
+        rms = librosa.feature.rms(y=audio, frame_length=PITCH_FRAME_LENGTH,
+                                  hop_length=PITCH_HOP_LENGTH)[0][:len(f0)]
+        times = features.span[0] / self.sample_rate + np.arange(len(f0)) * PITCH_HOP_LENGTH / PITCH_SAMPLE_RATE
+        
+        # Erode the loud mask by two frames on each side, keeping its length on short clips
+        inside = ndimage.binary_erosion(rms > VOICED_RMS_THRESHOLD, iterations=2)
+        
+        return times, f0, inside & (f0 > PITCH_FMIN) & (f0 < PITCH_FMAX)
+    
+    @per_recording('volume')
+    def _calculate_volume_consistency(self, audio: AudioInput) -> float:
         """Calculate volume consistency"""
-        # Calculate RMS energy
-        frame_length = 1024
-        hop_length = 512
-        rms_values = []
-        
-        for i in range(0, len(audio) - frame_length, hop_length):
-            frame = audio[i:i + frame_length]
-            rms = np.sqrt(np.mean(frame ** 2))
-            rms_values.append(rms)
+        # Calculate RMS energy of the voiced frames
+        features = self._features(audio)
+        rms_values = features.frame_rms[features.speech_frames]
         
         if len(rms_values) > 1:
             return 1 - (np.std(rms_values) / np.mean(rms_values)) if np.mean(rms_values) > 0 else 0
@@ -0,0 +1,57 @@
+"""
+Django management command to compare speech analysis sample rates and resamplers
+Usage: python manage.py benchmark_sample_rates recording.wav [recording2.wav ...] [--rates 22050 16000] [--runs 3]
+"""
+
+import time
+
+import numpy as np
+import soundfile as sf
+from django.core.management.base import BaseCommand
+
+from speech_analysis.audio_analyzer import RESAMPLERS, SpeechAnalyzer
+
+
+class Command(BaseCommand):
+    help = 'Time load + analyze of SpeechAnalyzer at each sample rate and resampler setting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('audio_files', nargs='+', help='Audio files to analyze')
+        parser.add_argument('--rates', nargs='+', type=int, default=[22050, 16000], help='Analysis sample rates')
+        parser.add_argument('--resamplers', nargs='+', choices=RESAMPLERS, default=list(RESAMPLERS),
+                            help='Resamplers to compare')
+        parser.add_argument('--runs', type=int, default=3, help='Timed runs per setting')
+        parser.add_argument('--text', default='', help='Text read aloud in the recordings')
+
+    def handle(self, *args, **options):
+        for audio_file in options['audio_files']:
+            file_rate = sf.info(audio_file).samplerate
+
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+            self.stdout.write(self.style.SUCCESS(f"{audio_file} ({file_rate} Hz)"))
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+            self.stdout.write(f"  {'rate':>6} {'resampler':<10} {'load ms':>9} {'analyze ms':>11} {'total ms':>9}")
+
+            for rate in options['rates']:
+                # Resampling is skipped when the file is already at the analysis rate
+                resamplers = options['resamplers'][:1] if rate == file_rate else options['resamplers']
+                for resampler in resamplers:
+                    analyzer = SpeechAnalyzer(sample_rate=rate, resampler=resampler)
+                    # Warm up lazily imported librosa modules and filter caches. Decoding
+                    # bypasses the PCM cache so every run times a real decode and resample
+                    analyzer.analyze_audio(analyzer._decode_audio(audio_file)[0], options['text'])
+
+                    load_times, analyze_times = [], []
+                    for _ in range(options['runs']):
+                        start = time.perf_counter()
+                        audio, sr = analyzer._decode_audio(audio_file)
+                        loaded = time.perf_counter()
+                        analyzer.analyze_audio(audio, options['text'], sr)
+                        load_times.append((loaded - start) * 1000)
+                        analyze_times.append((time.perf_counter() - loaded) * 1000)
+
+                    label = 'native' if rate == file_rate else resampler
+                    load_ms, analyze_ms = np.median(load_times), np.median(analyze_times)
+                    self.stdout.write(
+                        f"  {rate:>6} {label:<10} {load_ms:>9.1f} {analyze_ms:>11.1f} {load_ms + analyze_ms:>9.1f}"
+                    )
@@ -0,0 +1,64 @@
+"""
+Django management command to profile speech analysis stage by stage
+Usage: python manage.py benchmark_speech recording.wav [recording2.wav ...] [--text "..."] [--stream]
+"""
+
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from speech_analysis.audio_analyzer import SpeechAnalyzer
+
+
+class Command(BaseCommand):
+    help = 'Show the per-stage time breakdown of SpeechAnalyzer for audio files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('audio_files', nargs='+', help='Audio files to analyze')
+        parser.add_argument('--text', default='', help='Text read aloud in the recordings')
+        parser.add_argument('--stream', action='store_true',
+                            help='Use the block-by-block analysis used for long recordings')
+
+    def handle(self, *args, **options):
+        analyzer = SpeechAnalyzer()
+
+        for audio_file in options['audio_files']:
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+            self.stdout.write(self.style.SUCCESS(audio_file))
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+
+            if options['stream']:
+                def analyze(timings):
+                    analyzer.analyze_speech_stream(audio_file, options['text'], timings=timings)
+            else:
+                # Decode without the PCM cache, which would time a cache hit instead
+                start = time.perf_counter()
+                audio, sr = analyzer._decode_audio(audio_file)
+                load_seconds = time.perf_counter() - start
+                self.stdout.write(f"  Duration: {len(audio) / sr:.1f}s at {sr} Hz")
+
+                def analyze(timings):
+                    analyzer.analyze_audio(audio, options['text'], sr, timings=timings)
+
+            timings = {}
+            start = time.perf_counter()
+            analyze(timings)
+            analyze_seconds = time.perf_counter() - start
+            if not options['stream']:
+                timings['load'] = {'seconds': load_seconds, 'calls': 1, 'reused': 0}
+
+            # Tracing every allocation slows the analysis down, so peak memory is
+            # measured in a second, untimed run
+            tracemalloc.start()
+            analyze({})
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.stdout.write(f"  Peak memory: {peak_bytes / 1e6:.0f} MB")
+            self.stdout.write(f"  {'stage':<16} {'ms':>10} {'calls':>6} {'reused':>7}")
+            for stage, stats in sorted(timings.items(), key=lambda item: -item[1]['seconds']):
+                self.stdout.write(
+                    f"  {stage:<16} {stats['seconds'] * 1000:>10.1f} {stats['calls']:>6} {stats['reused']:>7}"
+                )
+            self.stdout.write(f"  {'total analyze':<16} {analyze_seconds * 1000:>10.1f}")
@@ -0,0 +1,219 @@
+"""
+Decoded Audio Cache
+Content-addressed cache of decoded speech PCM as memory-mapped .npy files
+
+Entries are keyed by a SHA-256 of the audio file plus the analysis sample
+rate and resampler, so analyzing the same recording again at the same
+settings (re-analysis, bulk re-scoring, duplicate uploads) skips decoding
+and resampling. Arrays are opened with np.load(mmap_mode='r'): pages are
+read on demand and shared between worker processes instead of copied into
+each one. The least recently used files are deleted once the directory
+grows past SPEECH_PCM_CACHE_MAX_BYTES.
+
+PCMCacheStorage exposes the cache directory as Django file storage, so a
+SpeechSample's preprocessed_audio field can reference its cache entry.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+# Process-local counters
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def get_cache_dir():
+    """Directory holding the cached .npy files"""
+    return Path(getattr(settings, 'SPEECH_PCM_CACHE_DIR', Path(settings.BASE_DIR) / 'pcm_cache'))
+
+
+def get_max_bytes():
+    """Size budget of the cache directory; 0 disables the cache"""
+    return getattr(settings, 'SPEECH_PCM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+class PCMCacheStorage(FileSystemStorage):
+    """File storage rooted at the cache directory, which may change with the settings"""
+
+    @property
+    def base_location(self):
+        return str(get_cache_dir())
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def key_suffix(sample_rate, resampler):
+    """End of the keys of recordings decoded at the given settings"""
+    return f"_{sample_rate}hz_{resampler}"
+
+
+def cache_key(audio_path, sample_rate, resampler):
+    """
+    Key of a recording decoded at the given settings.
+
+    Args:
+        audio_path (str): Audio file
+        sample_rate (int): Analysis sample rate
+        resampler (str): Resampler used for files at other rates
+
+    Returns:
+        str: File name stem of the cache entry
+    """
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest() + key_suffix(sample_rate, resampler)
+
+
+def load_cached_pcm(key):
+    """
+    Open a cached recording without reading it into memory.
+
+    Returns:
+        np.ndarray: Read-only array backed by the cache file, or None on a miss
+    """
+    path = get_cache_dir() / f"{key}.npy"
+    try:
+        audio = np.load(path, mmap_mode='r', allow_pickle=False)
+        # The modification time doubles as the last access time for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        _count('misses')
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Discarding unreadable PCM cache file {path.name}: {e}")
+        path.unlink(missing_ok=True)
+        _count('misses')
+        return None
+
+    _count('hits')
+    return audio.view(np.ndarray)
+
+
+def store_pcm(key, audio):
+    """Write a decoded recording to the cache and evict old files if over budget"""
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Write under a temporary name so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(audio, dtype=np.float32), allow_pickle=False)
+        os.replace(tmp_path, cache_dir / f"{key}.npy")
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    evict_pcm_files()
+
+
+def evict_pcm_files(max_bytes=None):
+    """
+    Delete least recently used files until the cache fits in max_bytes.
+
+    Returns:
+        int: Number of files evicted
+    """
+    if max_bytes is None:
+        max_bytes = get_max_bytes()
+
+    entries = []
+    for path in get_cache_dir().glob('*.npy'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+
+    if evicted:
+        _count('evictions', evicted)
+        logger.info(f"Evicted {evicted} decoded audio files from the PCM cache")
+    return evicted
+
+
+def cached_pcm(audio_path, sample_rate, resampler, decode, refresh=False, key=None):
+    """
+    Return the decoded recording from the cache, running decode() on a miss.
+
+    Args:
+        audio_path (str): Audio file
+        sample_rate (int): Analysis sample rate, part of the key
+        resampler (str): Resampler, part of the key
+        decode (callable): Decodes the file as mono float32 at sample_rate
+        refresh (bool): Decode again even if the recording is cached
+        key (str): cache_key() of the recording, if the caller already hashed it
+
+    Returns:
+        np.ndarray: Decoded audio, memory-mapped when it came from the cache
+    """
+    if get_max_bytes() <= 0:
+        return decode()
+
+    if key is None:
+        key = cache_key(audio_path, sample_rate, resampler)
+    if not refresh:
+        audio = load_cached_pcm(key)
+        if audio is not None:
+            return audio
+
+    audio = decode()
+    # Keep failed decodes out of the cache so they are retried
+    if len(audio) > 0:
+        try:
+            store_pcm(key, audio)
+        except OSError as e:
+            logger.warning(f"Could not write PCM cache file for {audio_path}: {e}")
+    return audio
+
+
+def get_pcm_cache_stats():
+    """
+    Get cache counters for this process and the size of the cache directory.
+
+    Returns:
+        dict: hits, misses, evictions, files and bytes
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    sizes = [path.stat().st_size for path in get_cache_dir().glob('*.npy')]
+    stats['files'] = len(sizes)
+    stats['bytes'] = sum(sizes)
+    return stats
+
+
+def clear_pcm_cache():
+    """Delete all cached recordings and reset the counters."""
+    for path in get_cache_dir().glob('*.npy'):
+        path.unlink(missing_ok=True)
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
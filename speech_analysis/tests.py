@@ -1,3 +1,603 @@
-from django.test import TestCase
+import os
+import tempfile
+import tracemalloc
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import librosa
+import numpy as np
+import soundfile as sf
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from scipy import signal
+from scipy.linalg import solve_toeplitz
+
+from .audio_analyzer import (
+    VAD_HANGOVER_FRAMES, RunningRuns, RunningStats, SpeechAnalyzer, SpeechFeatures, batch_lpc, find_runs,
+    frame_signal, lpc_roots
+)
+from .management.commands.benchmark_pitch import synthetic_speech
+from .pcm_cache import cache_key, cached_pcm, clear_pcm_cache, get_pcm_cache_stats
+
+
+def tone(n_samples, sr=22050, frequency=220.0, amplitude=0.5):
+    """A sine tone loud enough for every frame to count as speech"""
+    t = np.arange(n_samples) / sr
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def bursts(pattern, sr=22050, seed=0):
+    """
+    Speech-like test signal: quiet noise and loud noise bursts.
+
+    Args:
+        pattern (list): (seconds, loud) pairs, in order
+
+    Returns:
+        np.ndarray: float32 signal
+    """
+    rng = np.random.default_rng(seed)
+    pieces = [rng.normal(0, 0.2 if loud else 1e-4, int(seconds * sr)) for seconds, loud in pattern]
+    return np.concatenate(pieces).astype(np.float32)
+
+
+def loop_frames(audio, frame_length=1024, hop_length=512):
+    """Frames as sliced by the original loops"""
+    return [audio[i:i + frame_length] for i in range(0, len(audio) - frame_length, hop_length)]
+
+
+def loop_runs(mask):
+    """Closed runs of True, found one frame at a time"""
+    starts, lengths = [], []
+    in_run = False
+    run_start = 0
+    for i, value in enumerate(mask):
+        if value and not in_run:
+            in_run = True
+            run_start = i
+        elif not value and in_run:
+            in_run = False
+            starts.append(run_start)
+            lengths.append(i - run_start)
+    return starts, lengths
+
+
+def loop_pauses(audio, sr, threshold=0.01):
+    """Pause durations as computed before pause detection was vectorized"""
+    energy = np.array([np.sum(frame ** 2) for frame in loop_frames(audio)])
+    _, lengths = loop_runs(energy < threshold)
+    durations = [length * 512 / sr for length in lengths]
+    return [duration for duration in durations if duration > 0.1]
+
+
+def loop_volume_consistency(audio):
+    """Volume consistency over every frame, as computed before vectorization"""
+    rms_values = [np.sqrt(np.mean(frame ** 2)) for frame in loop_frames(audio)]
+    if len(rms_values) > 1:
+        return 1 - (np.std(rms_values) / np.mean(rms_values)) if np.mean(rms_values) > 0 else 0
+    return 1
+
+
+class VectorizedFramesTests(SimpleTestCase):
+    """Vectorized framing, runs, pauses and volume against the original loops"""
+
+    signals = {
+        'leading and trailing silence': bursts([(0.5, False), (1.0, True), (0.3, False), (0.8, True), (0.6, False)]),
+        'speech at both edges': bursts([(0.4, True), (0.25, False), (0.05, False), (0.6, True)], seed=1),
+        'short pauses only': bursts([(0.3, True), (0.05, False), (0.3, True), (0.08, False), (0.3, True)], seed=2),
+        'silence': bursts([(1.0, False)], seed=3),
+        'exactly one frame': bursts([(1024 / 22050, True)], seed=4),
+        'shorter than one frame': bursts([(500 / 22050, True)], seed=5),
+        'empty': np.zeros(0, dtype=np.float32),
+    }
+
+    def test_frame_signal(self):
+        for name, audio in self.signals.items():
+            with self.subTest(name):
+                frames = frame_signal(audio, 1024, 512)
+                expected = loop_frames(audio)
+                self.assertEqual(frames.shape, (len(expected), 1024))
+                for frame, expected_frame in zip(frames, expected):
+                    np.testing.assert_array_equal(frame, expected_frame)
+
+    def test_find_runs(self):
+        rng = np.random.default_rng(0)
+        masks = [np.zeros(0, dtype=bool), np.ones(7, dtype=bool), np.zeros(7, dtype=bool),
+                 np.array([True, False, True, True, False, True])]
+        masks += [rng.random(200) < p for p in (0.1, 0.5, 0.9)]
+        for mask in masks:
+            with self.subTest(mask=mask[:10]):
+                starts, lengths = find_runs(mask)
+                expected_starts, expected_lengths = loop_runs(mask)
+                self.assertEqual(starts.tolist(), expected_starts)
+                self.assertEqual(lengths.tolist(), expected_lengths)
+
+    def test_pauses_and_volume_match_the_loops(self):
+        analyzer = SpeechAnalyzer(vad=False)
+        for name, audio in self.signals.items():
+            with self.subTest(name):
+                pauses = analyzer._detect_pauses(audio)
+                expected = loop_pauses(audio, analyzer.sample_rate)
+                self.assertEqual(len(pauses), len(expected))
+                np.testing.assert_allclose(pauses, expected)
+
+                self.assertAlmostEqual(analyzer._calculate_volume_consistency(audio),
+                                       loop_volume_consistency(audio), places=5)
+
+
+class SharedSpectrogramTests(SimpleTestCase):
+    """Features computed from the shared STFT against librosa on the waveform"""
+
+    def test_features_match_waveform_extractors(self):
+        # Bursts every 0.5 s give a tempo for beat tracking
+        audio = voiced_bursts([(0.3, True), (0.2, False)] * 10, seed=3)
+        analyzer = SpeechAnalyzer(vad=False)
+        analyzer.track_tempo = True
+        sr = analyzer.sample_rate
+        features = SpeechFeatures(audio, sr, analyzer.hop_length)
+
+        np.testing.assert_allclose(analyzer.extract_mfcc_features(features),
+                                   librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=analyzer.n_mfcc),
+                                   rtol=1e-4, atol=1e-3)
+
+        spectral = analyzer.extract_spectral_features(features)
+        expected = {
+            'spectral_centroid': librosa.feature.spectral_centroid(y=audio, sr=sr)[0],
+            'spectral_rolloff': librosa.feature.spectral_rolloff(y=audio, sr=sr)[0],
+            'zcr': librosa.feature.zero_crossing_rate(audio)[0],
+            'spectral_bandwidth': librosa.feature.spectral_bandwidth(y=audio, sr=sr)[0],
+        }
+        for name, values in expected.items():
+            self.assertAlmostEqual(spectral[f'{name}_mean'], np.mean(values), delta=1e-4 * np.mean(values))
+            self.assertAlmostEqual(spectral[f'{name}_std'], np.std(values), delta=1e-4 * np.mean(values))
+
+        rhythm = analyzer.extract_rhythm_features(features)
+        onset_times = librosa.frames_to_time(librosa.onset.onset_detect(y=audio, sr=sr), sr=sr)
+        tempo, _ = librosa.beat.beat_track(y=audio, sr=sr)
+        self.assertEqual(rhythm['onset_count'], len(onset_times))
+        self.assertAlmostEqual(rhythm['average_interval'], np.mean(np.diff(onset_times)))
+        self.assertGreater(rhythm['tempo'], 0)
+        self.assertAlmostEqual(rhythm['tempo'], float(np.atleast_1d(tempo)[0]), places=3)
+        # One STFT and one mel spectrogram serve every extractor
+        self.assertEqual((features.stages['stft']['calls'], features.stages['mel']['calls']), (2, 2))
+
+
+class StageTimingTests(SimpleTestCase):
+    """Memoized extractors and the benchmark_speech stage breakdown"""
+
+    def test_rhythm_is_computed_once(self):
+        analyzer = SpeechAnalyzer()
+        audio = voiced_bursts([(0.8, True), (0.4, False), (0.8, True)])
+        timings = {}
+        with mock.patch.object(analyzer, '_rhythm_features', wraps=analyzer._rhythm_features) as rhythm:
+            analyzer.analyze_audio(audio, 'the cat sat', timings=timings)
+
+        rhythm.assert_called_once()
+        # Fluency reuses the rhythm features instead of extracting them again
+        self.assertEqual((timings['rhythm']['calls'], timings['rhythm']['reused']), (1, 1))
+        # Not part of the result
+        self.assertNotIn('spectral', timings)
+
+    def test_benchmark_times_without_tracing_memory(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        audio_path = os.path.join(tmp.name, 'reading.wav')
+        sf.write(audio_path, voiced_bursts([(0.8, True), (0.4, False)]), 22050)
+
+        tracing = []
+        analyze_audio = SpeechAnalyzer.analyze_audio
+
+        def traced_analyze_audio(analyzer, *args, **kwargs):
+            tracing.append(tracemalloc.is_tracing())
+            return analyze_audio(analyzer, *args, **kwargs)
+
+        out = StringIO()
+        with mock.patch.object(SpeechAnalyzer, 'analyze_audio', traced_analyze_audio):
+            call_command('benchmark_speech', audio_path, stdout=out)
+        # The timed run, then the memory run
+        self.assertEqual(tracing, [False, True])
+        self.assertIn('Peak memory', out.getvalue())
+        self.assertIn('rhythm', out.getvalue())
+
+
+def loop_pitch_variation(audio, sr):
+    """piptrack pitch variation with the original per-frame loop"""
+    pitches, magnitudes = librosa.piptrack(y=audio, sr=sr)
+    pitch_values = []
+    for t in range(pitches.shape[1]):
+        pitch = pitches[magnitudes[:, t].argmax(), t]
+        if pitch > 0:
+            pitch_values.append(pitch)
+    if len(pitch_values) > 1:
+        return np.std(pitch_values) / np.mean(pitch_values) if np.mean(pitch_values) > 0 else 0
+    return 0
+
+
+class PitchTests(SimpleTestCase):
+    """Vectorized piptrack and the downsampled YIN tracker"""
+
+    contours = [(120, 0.1), (220, 0.2), (300, 0.05)]
+
+    def test_piptrack_matches_the_loop(self):
+        analyzer = SpeechAnalyzer(pitch_method='piptrack', vad=False)
+        for seed, (base_f0, depth) in enumerate(self.contours):
+            with self.subTest(base_f0=base_f0):
+                audio, _ = synthetic_speech(3.0, analyzer.sample_rate, base_f0, depth, seed)
+                self.assertAlmostEqual(analyzer._calculate_pitch_variation(audio),
+                                       loop_pitch_variation(audio, analyzer.sample_rate), places=4)
+
+    def test_yin_follows_a_known_contour(self):
+        for vad in (False, True):
+            analyzer = SpeechAnalyzer(pitch_method='yin', vad=vad)
+            for seed, (base_f0, depth) in enumerate(self.contours):
+                with self.subTest(base_f0=base_f0, vad=vad):
+                    audio, true_variation = synthetic_speech(3.0, analyzer.sample_rate, base_f0, depth, seed)
+                    self.assertAlmostEqual(analyzer._calculate_pitch_variation(audio), true_variation,
+                                           delta=0.05 * true_variation)
+
+    def test_yin_on_clips_shorter_than_the_erosion(self):
+        analyzer = SpeechAnalyzer(pitch_method='yin')
+        for n_samples in (300, 1200, 2000):
+            with self.subTest(n_samples=n_samples):
+                _, f0, voiced = analyzer._pitch_frames(SpeechFeatures(tone(n_samples, frequency=150), 22050, vad=True))
+                self.assertEqual(len(voiced), len(f0))
+
+
+def vowel(seconds=1.0, sr=22050, formants=(700, 1220, 2600), bandwidths=(80, 90, 120), f0=120):
+    """Steady synthetic vowel: a glottal pulse train through one resonator per formant"""
+    source = np.zeros(int(seconds * sr))
+    source[::int(sr / f0)] = 1.0
+    audio = source
+    for frequency, bandwidth in zip(formants, bandwidths):
+        radius = np.exp(-np.pi * bandwidth / sr)
+        audio = signal.lfilter([1 - radius], [1, -2 * radius * np.cos(2 * np.pi * frequency / sr), radius ** 2],
+                               audio)
+    return (0.3 * audio / np.abs(audio).max()).astype(np.float32)
+
+
+class FormantTests(SimpleTestCase):
+    """Batched LPC and the formant features of a synthetic vowel"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        frames = np.stack([vowel(0.025, 10000, f0=f0) for f0 in (100, 150, 210)]
+                          + [rng.normal(0, 0.1, 250).astype(np.float32)])
+        self.frames = frames * np.hamming(250)
+
+    def test_batch_lpc_solves_the_normal_equations(self):
+        coefficients = batch_lpc(self.frames, 12)
+
+        self.assertEqual(coefficients.shape, (len(self.frames), 13))
+        for frame, a in zip(self.frames, coefficients):
+            r = np.correlate(frame, frame, mode='full')[len(frame) - 1:][:13]
+            np.testing.assert_allclose(a, np.concatenate(([1.0], solve_toeplitz(r[:-1], -r[1:]))),
+                                       rtol=1e-6, atol=1e-8)
+
+    def test_lpc_roots_match_np_roots(self):
+        for a, roots in zip(batch_lpc(self.frames, 12), lpc_roots(batch_lpc(self.frames, 12))):
+            expected = np.roots(a)
+            np.testing.assert_allclose(np.sort_complex(roots), np.sort_complex(expected), rtol=1e-6, atol=1e-8)
+
+    def test_tracks_find_the_vowel_formants(self):
+        analyzer = SpeechAnalyzer(formant_method='tracks')
+        times, tracks = analyzer.track_formants(vowel())
+
+        self.assertEqual(tracks.shape, (len(times), 3))
+        self.assertLess(np.isnan(tracks).any(axis=1).mean(), 0.05)
+        # Mean formants within 3% of the resonator frequencies
+        formants = analyzer.extract_pronunciation_features(vowel())
+        np.testing.assert_allclose([formants['f1_mean'], formants['f2_mean'], formants['f3_mean']],
+                                   [700, 1220, 2600], rtol=0.03)
+
+    def test_formant_variance_means_the_same_with_every_method(self):
+        audio = vowel()
+        recording = SpeechAnalyzer(formant_method='recording').extract_pronunciation_features(audio)
+        tracks = SpeechAnalyzer(formant_method='tracks').extract_pronunciation_features(audio)
+
+        # Spread of F1-F3 around their mean, about 6.4e5 Hz^2 for this vowel
+        self.assertAlmostEqual(tracks['formant_variance'], recording['formant_variance'],
+                               delta=0.1 * recording['formant_variance'])
+        self.assertNotIn('formant_track_variance', recording)
+        # A steady vowel barely moves over time
+        self.assertLess(tracks['formant_track_variance'], 0.001 * tracks['formant_variance'])
+
+
+def syllables(rates, seconds=2.0, pause=0.5, sr=22050):
+    """
+    Phrases of a tone whose loudness rises rate times per second, separated by silent pauses.
+
+    Args:
+        rates (list): Syllables per second of each phrase
+    """
+    pieces = []
+    t = np.arange(int(seconds * sr)) / sr
+    for i, rate in enumerate(rates):
+        if i:
+            pieces.append(np.zeros(int(pause * sr)))
+        pieces.append(0.5 * (0.6 - 0.4 * np.cos(2 * np.pi * rate * t)) * np.sin(2 * np.pi * 220 * t))
+    return np.concatenate(pieces).astype(np.float32)
+
+
+class SyllableRhythmTests(SimpleTestCase):
+    """rhythm_method='syllables'"""
+
+    def rhythm(self, audio):
+        return SpeechAnalyzer(rhythm_method='syllables').extract_rhythm_features(audio)
+
+    def test_syllable_rate(self):
+        rhythm = self.rhythm(syllables([4]))
+        self.assertEqual(rhythm['syllable_count'], 8)
+        self.assertAlmostEqual(rhythm['syllable_rate'], 4, delta=0.15)
+        self.assertAlmostEqual(rhythm['average_interval'], 0.25, delta=0.01)
+        self.assertLess(rhythm['interval_variability'], 0.05)
+
+    def test_interval_variability(self):
+        rhythm = self.rhythm(syllables([4, 6]))
+        intervals = np.array([1 / 4] * 7 + [1 / 6] * 11)
+        self.assertEqual(rhythm['syllable_count'], 20)
+        self.assertAlmostEqual(rhythm['interval_variability'], intervals.std() / intervals.mean(), delta=0.02)
+        self.assertAlmostEqual(rhythm['rhythm_consistency'], 1 - rhythm['interval_variability'])
+
+    def test_intervals_spanning_a_pause_are_dropped(self):
+        rhythm = self.rhythm(syllables([4, 4]))
+        self.assertEqual(rhythm['syllable_count'], 16)
+        # The 0.75 s from the last syllable of the first phrase to the first of the second is not an interval
+        self.assertAlmostEqual(rhythm['average_interval'], 0.25, delta=0.01)
+        self.assertLess(rhythm['interval_variability'], 0.05)
+        # Syllables per second of speech, not of the whole recording
+        self.assertAlmostEqual(rhythm['syllable_rate'], 4, delta=0.15)
+
+    def test_short_clips(self):
+        analyzer = SpeechAnalyzer(rhythm_method='syllables')
+        # Fewer energy frames than the smoothing window
+        for n_samples in (500, 1024, 1500, 2048, 3000):
+            with self.subTest(n_samples=n_samples):
+                rhythm = analyzer.extract_rhythm_features(tone(n_samples))
+                # Too short for two syllables, so there is no interval to measure
+                self.assertLessEqual(rhythm['syllable_count'], 1)
+                self.assertEqual((rhythm['rhythm_consistency'], rhythm['average_interval']), (0.0, 0))
+                self.assertIn('rhythm_score', analyzer.analyze_audio(tone(n_samples)))
+
+
+class VoiceActivityTests(SimpleTestCase):
+    """Voice-activity mask over the energy frames"""
+
+    def test_short_clips_are_analyzed(self):
+        analyzer = SpeechAnalyzer(vad=True)
+        # Shorter than one energy frame plus the hangover on both sides
+        shortest_widened = 1024 + 2 * VAD_HANGOVER_FRAMES * analyzer.hop_length
+        for n_samples in (800, 1024, 1100, 2048, shortest_widened - 1):
+            with self.subTest(n_samples=n_samples):
+                features = SpeechFeatures(tone(n_samples), analyzer.sample_rate, analyzer.hop_length, vad=True)
+                self.assertEqual(len(features.speech_frames), len(features.frame_energy))
+
+                result = analyzer.analyze_audio(tone(n_samples))
+                self.assertGreater(result['volume_consistency'], 0.9)
+
+    def test_hangover_widens_voiced_runs(self):
+        audio = np.zeros(40 * 512, dtype=np.float32)
+        audio[20 * 512:21 * 512] = 0.5
+        features = SpeechFeatures(audio, 22050, vad=True)
+
+        voiced = features.frame_energy >= 0.01
+        speech = features.speech_frames
+        self.assertEqual(len(speech), len(voiced))
+        first, last = np.flatnonzero(voiced)[[0, -1]]
+        np.testing.assert_array_equal(
+            np.flatnonzero(speech), np.arange(first - VAD_HANGOVER_FRAMES, last + VAD_HANGOVER_FRAMES + 1)
+        )
+
+
+def voiced_bursts(pattern, sr=22050, seed=0):
+    """
+    Vowel-like test recording: harmonic bursts with a gliding pitch separated by silences.
+
+    Args:
+        pattern (list): (seconds, voiced) pairs, in order
+
+    Returns:
+        np.ndarray: float32 signal
+    """
+    rng = np.random.default_rng(seed)
+    pieces = []
+    for seconds, voiced in pattern:
+        t = np.arange(int(seconds * sr)) / sr
+        if voiced:
+            f0 = 150 + 30 * np.sin(2 * np.pi * 0.7 * t)
+            phase = 2 * np.pi * np.cumsum(f0) / sr
+            piece = sum(0.3 / k * np.sin(k * phase) for k in range(1, 6)) * np.hanning(len(t)) ** 0.25
+        else:
+            piece = np.zeros(len(t))
+        pieces.append(piece + rng.normal(0, 1e-4, len(t)))
+    return np.concatenate(pieces).astype(np.float32)
+
+
+class StreamingTests(SimpleTestCase):
+    """Block-by-block analysis against the whole-recording analysis"""
+
+    def test_running_stats_match_numpy(self):
+        values = np.random.default_rng(0).normal(3, 2, (1000, 4))
+        stats = RunningStats()
+        for chunk in np.array_split(values, [1, 2, 300, 301, 999]):
+            stats.update(chunk)
+
+        self.assertEqual(stats.count, 1000)
+        np.testing.assert_allclose(stats.mean, values.mean(axis=0))
+        np.testing.assert_allclose(stats.std, values.std(axis=0))
+        np.testing.assert_array_equal(stats.min, values.min(axis=0))
+        np.testing.assert_array_equal(stats.max, values.max(axis=0))
+
+    def test_running_runs_carry_open_runs_across_pieces(self):
+        mask = np.random.default_rng(1).random(500) < 0.8
+        mask[100:260] = True
+        _, expected = find_runs(mask)
+        runs = RunningRuns()
+        # Split points inside the long run, including a piece that is all True
+        lengths = np.concatenate([runs.update(piece) for piece in np.split(mask, [120, 150, 250, 251])])
+        self.assertEqual(lengths.tolist(), expected.tolist())
+
+    def test_stream_matches_whole_recording(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # 1 s blocks are 21504 samples (0.975 s); the first pause spans the boundary
+        audio = voiced_bursts([(0.8, True), (0.5, False), (1.2, True), (0.3, False), (0.9, True)])
+
+        for file_rate in (22050, 16000):
+            with self.subTest(file_rate=file_rate):
+                audio_path = os.path.join(tmp.name, f'reading_{file_rate}.wav')
+                data = audio if file_rate == 22050 else voiced_bursts(
+                    [(0.8, True), (0.5, False), (1.2, True), (0.3, False), (0.9, True)], sr=file_rate)
+                sf.write(audio_path, data, file_rate, subtype='FLOAT')
+
+                analyzer = SpeechAnalyzer()
+                analyzer.stream_block_seconds = 1
+                # Decode without the PCM cache; the stream never uses it
+                expected = analyzer.analyze_audio(analyzer._decode_audio(audio_path)[0], 'the cat sat')
+                streamed = analyzer.analyze_speech_stream(audio_path, 'the cat sat')
+
+                self.assertEqual(streamed['mispronunciations'], expected['mispronunciations'])
+                self.assertEqual(streamed['fluency_issues'], expected['fluency_issues'])
+                for key in ('fluency_score', 'pause_frequency', 'reading_speed', 'rhythm_score',
+                            'pronunciation_score', 'pitch_variation', 'volume_consistency', 'model_confidence'):
+                    self.assertAlmostEqual(streamed[key], expected[key], delta=1e-3 * max(1, abs(expected[key])),
+                                           msg=key)
+                # The mel spectrogram's dB floor is relative to each block's peak
+                for key in ('mfcc_mean', 'mfcc_std', 'mfcc_range'):
+                    np.testing.assert_allclose(streamed['phoneme_analysis'][key], expected['phoneme_analysis'][key],
+                                               rtol=0.02, atol=1.0, err_msg=key)
+
+
+class SampleRateTests(SimpleTestCase):
+    """Configurable analysis sample rate and resampler"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def recording(self, sr):
+        path = os.path.join(self.tmp, f'reading_{sr}.wav')
+        sf.write(path, voiced_bursts([(0.8, True), (0.4, False), (0.8, True)], sr=sr), sr, subtype='FLOAT')
+        return path
+
+    def test_16khz_analysis(self):
+        analyzer = SpeechAnalyzer(sample_rate=16000)
+        audio, sr = analyzer._decode_audio(self.recording(22050))
+        self.assertEqual((sr, len(audio)), (16000, 32000))
+
+        self.assertEqual(analyzer.extract_mfcc_features(audio).shape[0], analyzer.n_mfcc)
+        result = analyzer.analyze_audio(audio, 'the cat sat')
+        self.assertGreater(result['fluency_score'], 0)
+        self.assertGreater(result['pitch_variation'], 0)
+
+    def test_files_at_the_analysis_rate_are_not_resampled(self):
+        with mock.patch('librosa.resample', wraps=librosa.resample) as resample:
+            audio, _ = SpeechAnalyzer(sample_rate=16000)._decode_audio(self.recording(16000))
+            resample.assert_not_called()
+            np.testing.assert_array_equal(audio, sf.read(self.recording(16000), dtype='float32')[0])
+
+            SpeechAnalyzer(sample_rate=16000, resampler='soxr_vhq')._decode_audio(self.recording(22050))
+            resample.assert_called_once()
+            self.assertEqual(resample.call_args.kwargs['res_type'], 'soxr_vhq')
+
+    def test_unknown_resampler_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown resampler: kaiser_best'):
+            SpeechAnalyzer(resampler='kaiser_best')
+        with self.settings(SPEECH_RESAMPLER='soxr'), self.assertRaisesMessage(ValueError, 'Unknown resampler'):
+            SpeechAnalyzer()
+
+
+class PCMCacheTests(SimpleTestCase):
+    """Decoded audio cache of memory-mapped .npy files"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = os.path.join(tmp.name, 'pcm')
+        settings = self.settings(SPEECH_PCM_CACHE_DIR=self.cache_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(clear_pcm_cache)
+        clear_pcm_cache()
+
+        self.audio_paths = []
+        for i in range(3):
+            path = os.path.join(tmp.name, f'reading_{i}.wav')
+            sf.write(path, tone(22050, frequency=220 * (i + 1)), 22050)
+            self.audio_paths.append(path)
+
+    def load(self, audio_path, refresh=False):
+        """Cached 1 s of audio (88 kB as float32), counting decodes"""
+        def decode():
+            self.decodes += 1
+            return tone(22050)
+        self.decodes = 0
+        return cached_pcm(audio_path, 22050, 'soxr_hq', decode, refresh=refresh)
+
+    def entry(self, audio_path):
+        return os.path.join(self.cache_dir, cache_key(audio_path, 22050, 'soxr_hq') + '.npy')
+
+    def test_key_depends_on_content_sample_rate_and_resampler(self):
+        path, other = self.audio_paths[:2]
+        keys = {cache_key(path, 22050, 'soxr_hq'), cache_key(path, 16000, 'soxr_hq'),
+                cache_key(path, 22050, 'soxr_vhq'), cache_key(other, 22050, 'soxr_hq')}
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(cache_key(path, 22050, 'soxr_hq'), cache_key(path, 22050, 'soxr_hq'))
+
+    def test_hits_are_read_only_memory_maps(self):
+        self.load(self.audio_paths[0])
+        self.assertEqual(self.decodes, 1)
+
+        audio = self.load(self.audio_paths[0])
+        self.assertEqual(self.decodes, 0)
+        self.assertIsInstance(audio.base, np.memmap)
+        self.assertFalse(audio.flags.writeable)
+        np.testing.assert_array_equal(audio, tone(22050))
+        self.assertEqual({key: get_pcm_cache_stats()[key] for key in ('hits', 'misses', 'files')},
+                         {'hits': 1, 'misses': 1, 'files': 1})
+
+        self.load(self.audio_paths[0], refresh=True)
+        self.assertEqual(self.decodes, 1)
+
+    def test_least_recently_used_files_are_evicted(self):
+        for path in self.audio_paths[:2]:
+            self.load(path)
+        # Both files are older than the next one; a hit makes the first the newest
+        for age, path in ((300, self.audio_paths[0]), (200, self.audio_paths[1])):
+            mtime = os.path.getmtime(path) - age
+            os.utime(self.entry(path), (mtime, mtime))
+        self.load(self.audio_paths[0])
+        self.assertGreater(os.path.getmtime(self.entry(self.audio_paths[0])),
+                           os.path.getmtime(self.entry(self.audio_paths[1])))
+
+        # Room for two files: storing the third evicts the second
+        with self.settings(SPEECH_PCM_CACHE_MAX_BYTES=2 * os.path.getsize(self.entry(self.audio_paths[0]))):
+            self.load(self.audio_paths[2])
+        self.assertEqual([os.path.exists(self.entry(path)) for path in self.audio_paths], [True, False, True])
+        self.assertEqual(get_pcm_cache_stats()['evictions'], 1)
+
+    def test_zero_budget_disables_the_cache(self):
+        with self.settings(SPEECH_PCM_CACHE_MAX_BYTES=0):
+            self.load(self.audio_paths[0])
+            self.load(self.audio_paths[0])
+        self.assertEqual(self.decodes, 1)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_unreadable_files_are_decoded_again(self):
+        path = self.audio_paths[0]
+        self.load(path)
+        entry = self.entry(path)
+        size = os.path.getsize(entry)
+
+        for damage in ('truncated', 'corrupt'):
+            with self.subTest(damage):
+                if damage == 'truncated':
+                    os.truncate(entry, size // 2)
+                else:
+                    with open(entry, 'wb') as f:
+                        f.write(b'not a numpy file')
+                with self.assertLogs('speech_analysis.pcm_cache', 'WARNING'):
+                    audio = self.load(path)
+                self.assertEqual(self.decodes, 1)
+                np.testing.assert_array_equal(audio, tone(22050))
+                self.assertEqual(os.path.getsize(entry), size)
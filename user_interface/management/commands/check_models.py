@@ -4,7 +4,7 @@ Usage: python manage.py check_models
 """
 
 from django.core.management.base import BaseCommand
-from ml_models import get_model_info, get_available_models
+from ml_models import get_model_cache_stats, get_model_info, get_available_models
 
 
 class Command(BaseCommand):
@@ -27,13 +27,29 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f"  ✓ Status: Available"))
                 self.stdout.write(f"  Size: {info['size_mb']} MB")
                 self.stdout.write(f"  Loaded: {'Yes' if info['loaded'] else 'No'}")
+                if info['loaded']:
+                    self.stdout.write(f"  Resident: {info['resident_mb']} MB")
+            elif info['builtin']:
+                self.stdout.write(self.style.SUCCESS(f"  ✓ Status: Available (built-in architecture)"))
+                self.stdout.write(f"  Loaded: {'Yes' if info['loaded'] else 'No'}")
             else:
                 self.stdout.write(self.style.ERROR(f"  ✗ Status: NOT FOUND"))
                 self.stdout.write(self.style.WARNING(f"  → Please copy the model file to: {info['path']}"))
+            
+            if info['load_count']:
+                self.stdout.write(f"  Load time: {info['load_seconds']}s ({info['load_count']} load(s))")
+            if info['last_error']:
+                self.stdout.write(self.style.ERROR(f"  ✗ Last load failed: {info['last_error']}"))
+                self.stdout.write(self.style.WARNING(f"  → Next attempt in {info['retry_in_seconds']}s"))
         
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('=' * 60))
         self.stdout.write(f"Available Models: {len(available_models)}/{len(model_info)}")
+        cache_stats = get_model_cache_stats()
+        self.stdout.write(
+            f"Model cache: {cache_stats['resident_mb']}/{cache_stats['max_mb']} MB, "
+            f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions"
+        )
         
         if len(available_models) == len(model_info):
             self.stdout.write(self.style.SUCCESS("✓ All models are available!"))
@@ -1,3 +1,109 @@
-from django.test import TestCase
+import subprocess
+import sys
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from data_collection.models import SpeechSample
+from detection_module.analysis_jobs import enqueue_analysis
+from detection_module.models import AnalysisJob
+
+# Packages that take seconds and hundreds of MB to import; they belong on the
+# first analysis, not on startup
+HEAVY_PACKAGES = ('tensorflow', 'keras', 'cv2', 'librosa', 'sklearn')
+
+
+class StartupImportTests(SimpleTestCase):
+    """Starting Django must not import the ML stacks"""
+
+    def test_manage_check_does_not_import_ml_stacks(self):
+        # check imports the URLconf, and with it every view module
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', 'manage.py', 'check'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        # Lines look like "import time: <self us> | <cumulative us> | <indent><module>"
+        timings = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                _, cumulative, module = line.split('|')
+                timings[module.strip()] = int(cumulative)
+
+        heavy = sorted(module for module in timings if module.split('.')[0] in HEAVY_PACKAGES)
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:5]
+        self.assertFalse(
+            heavy,
+            f"manage.py check imported {', '.join(heavy[:10])}; slowest imports (us): {slowest}"
+        )
+
+
+class AnalysisStatusTests(TestCase):
+    """Progress of queued analyses, as seen by the browser"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+        self.sample = SpeechSample.objects.create(user=self.user, audio_file='speech_samples/demo.wav')
+        self.job = enqueue_analysis('speech', self.user, speech_sample=self.sample)
+
+    def test_job_and_sample_status(self):
+        response = self.client.get(reverse('analysis_job_status', args=[self.job.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual([stage['state'] for stage in response.json()['stages']], ['pending', 'pending'])
+
+        response = self.client.get(reverse('sample_analysis_status', args=[self.sample.id]))
+        self.assertEqual(response.json()['job_id'], str(self.job.id))
+
+    def test_other_users_jobs_are_hidden(self):
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('analysis_job_status', args=[self.job.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('sample_analysis_status', args=[self.sample.id])).status_code, 404)
+
+    async def test_event_stream_ends_when_the_job_finishes(self):
+        await AnalysisJob.objects.filter(id=self.job.id).aupdate(
+            status='done', stages={'decode': {'state': 'done'}, 'features': {'state': 'done'}}
+        )
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('analysis_job_events', args=[self.job.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('"progress": 1.0', body)
+        self.assertTrue(body.endswith('event: done\ndata: {"status": "done"}\n\n'))
+
+
+
+@override_settings(ANALYSIS_JOBS_INLINE=True)
+@mock.patch('detection_module.analysis_jobs._analyze_samples', side_effect=RuntimeError('database is locked'))
+class InlineAnalysisMessageTests(TestCase):
+    """Messages after an inline analysis that raised"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+        self.sample = SpeechSample.objects.create(user=self.user, audio_file='speech_samples/demo.wav')
+
+    def analyze(self):
+        with self.assertLogs('detection_module.analysis_jobs', 'ERROR'):
+            response = self.client.post(reverse('analyze_samples'), {'sample_id': self.sample.id, 'sample_type': 'speech'})
+        return [(message.level_tag, message.message) for message in get_messages(response.wsgi_request)]
+
+    @override_settings(ANALYSIS_JOB_MAX_ATTEMPTS=2)
+    def test_retried_runs_are_reported(self, _):
+        self.assertEqual(self.analyze(), [
+            ('warning', 'Speech analysis could not finish and will be retried: database is locked')
+        ])
+        self.assertEqual(AnalysisJob.objects.get().status, 'queued')
+
+    @override_settings(ANALYSIS_JOB_MAX_ATTEMPTS=1)
+    def test_failed_runs_are_reported(self, _):
+        self.assertEqual(self.analyze(), [('error', 'Speech analysis failed: database is locked')])
+        self.assertEqual(AnalysisJob.objects.get().status, 'failed')
@@ -19,6 +19,9 @@ urlpatterns = [
     # API endpoints
     path('api/upload/handwriting/', views.upload_handwriting_api, name='upload_handwriting_api'),
     path('api/upload/speech/', views.upload_speech_api, name='upload_speech_api'),
+    path('api/analysis/jobs/<uuid:job_id>/', views.analysis_job_status, name='analysis_job_status'),
+    path('api/analysis/jobs/<uuid:job_id>/events/', views.analysis_job_events, name='analysis_job_events'),
+    path('api/analysis/samples/<uuid:sample_id>/', views.sample_analysis_status, name='sample_analysis_status'),
     
     # Admin routes
     path('admin-login/', admin_views.admin_login_view, name='admin_login'),
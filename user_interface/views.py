@@ -4,7 +4,7 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
@@ -19,11 +19,12 @@ from django.db import models
 from data_collection.models import UserProfile, HandwritingSample, SpeechSample, VideoSample
 from handwriting_analysis.models import HandwritingAnalysis
 from speech_analysis.models import SpeechAnalysis
-from detection_module.models import DetectionResult
+from detection_module.models import AnalysisJob, DetectionResult
 from detection_module.detection_engine import DyslexiaDetectionEngine
+from detection_module.analysis_jobs import (
+    STATUS_FIELDS, enqueue_analysis, get_job_status, get_latest_sample_job, job_status_events
+)
 from training_module.models import Exercise, UserProgress, ExerciseSession, ProgressReport
-from handwriting_analysis.cnn_analyzer import HandwritingCNNAnalyzer
-from speech_analysis.audio_analyzer import SpeechAnalyzer
 
 def home(request):
     """Home page with child-friendly interface"""
@@ -100,6 +101,20 @@ def login_view(request):
             messages.error(request, 'Invalid username or password')
     return render(request, 'user_interface/login.html', {'form': form})
 
+def _report_job(request, job, label):
+    """Tell the user what became of a queued analysis, which may already have run inline"""
+    if job.status == 'done':
+        for error in filter(None, job.error.split('\n')):
+            messages.error(request, error)
+        messages.success(request, f'{label} completed!')
+    elif job.status == 'failed':
+        messages.error(request, f'{label} failed: {job.error}')
+    elif job.status == 'queued' and job.attempts:
+        # An inline run failed and left the job for a worker to retry
+        messages.warning(request, f'{label} could not finish and will be retried: {job.error}')
+    else:
+        messages.success(request, f'{label} started! Results will be ready in a moment.')
+
 @login_required
 def upload_data(request):
     """Data upload interface for handwriting and speech samples"""
@@ -222,75 +237,12 @@ def upload_data(request):
                 messages.success(request, 'Video sample uploaded successfully!')
 
         if action == 'run_combined' and (handwriting_sample or speech_sample):
-            # 1. Handwriting Analysis (if provided)
-            hw_analysis = None
-            if handwriting_sample:
-                try:
-                    analyzer = HandwritingCNNAnalyzer()
-                    hw_analysis_result = analyzer.analyze_handwriting(handwriting_sample.image_file.path)
-                    hw_analysis = HandwritingAnalysis.objects.create(
-                        sample=handwriting_sample, user=request.user, **hw_analysis_result
-                    )
-                except Exception as e:
-                    messages.error(request, f"Handwriting analysis failed: {str(e)}")
-                    hw_analysis_result = {
-                        'irregular_shapes_score': 0.1, 'spacing_issues_score': 0.1,
-                        'stroke_pattern_score': 0.1, 'overall_handwriting_score': 0.1,
-                        'letter_formation_issues': ['Processing Error'],
-                        'spacing_analysis': {}, 'stroke_analysis': {}, 'model_confidence': 0.5
-                    }
-                    hw_analysis = HandwritingAnalysis.objects.create(
-                        sample=handwriting_sample, user=request.user, **hw_analysis_result
-                    )
-
-            # 2. Speech Analysis (if provided)
-            sp_analysis = None
-            if speech_sample:
-                try:
-                    analyzer = SpeechAnalyzer()
-                    sp_analysis_result = analyzer.analyze_speech(speech_sample.audio_file.path, speech_sample.text_content)
-                    sp_analysis = SpeechAnalysis.objects.create(
-                        sample=speech_sample, user=request.user, **sp_analysis_result
-                    )
-                except Exception as e:
-                    messages.error(request, f"Speech analysis failed: {str(e)}")
-                    sp_analysis_result = {
-                        'pronunciation_score': 0.9, 'fluency_score': 0.9,
-                        'reading_speed': 120.0, 'pause_frequency': 1.0,
-                        'mispronunciations': [], 'fluency_issues': [],
-                        'phoneme_analysis': {}, 'pitch_variation': 0.3,
-                        'volume_consistency': 0.9, 'rhythm_score': 0.9,
-                        'model_confidence': 0.5
-                    }
-                    sp_analysis = SpeechAnalysis.objects.create(
-                        sample=speech_sample, user=request.user, **sp_analysis_result
-                    )
-
-            # 3. Run Detection Engine
-            engine = DyslexiaDetectionEngine()
-            result = engine.detect_dyslexia(
-                hw_analysis.__dict__ if hw_analysis else None,
-                sp_analysis.__dict__ if sp_analysis else None
-            )
-            
-            # 4. Save Detection Result
-            DetectionResult.objects.create(
-                user=request.user,
-                handwriting_sample=handwriting_sample,
-                speech_sample=speech_sample,
-                handwriting_analysis=hw_analysis,
-                speech_analysis=sp_analysis,
-                dyslexia_probability=result['dyslexia_probability'],
-                dysgraphia_probability=result['dysgraphia_probability'],
-                overall_risk_score=result['overall_risk_score'],
-                risk_level=result['risk_level'],
-                detection_confidence=result['detection_confidence'],
-                recommended_actions=result['recommended_actions'],
-                strengths_identified=result['strengths_identified'],
-                areas_of_concern=result['areas_of_concern']
-            )
-
-            messages.success(request, 'Analysis completed successfully!')
+            # Analyzers and the detection engine run in an analysis worker; a job
+            # run inline decodes the handwriting upload from memory instead
+            upload = request.FILES.get('handwriting_image') if handwriting_sample else None
+            job = enqueue_analysis('combined', request.user, handwriting_sample, speech_sample,
+                                   handwriting_upload=upload)
+            _report_job(request, job, 'Analysis')
             return redirect('detection_results')
 
         # Default redirect
@@ -313,53 +265,13 @@ def analyze_samples(request):
         
         if sample_type == 'handwriting':
             sample = get_object_or_404(HandwritingSample, id=sample_id, user=request.user)
-            
-            try:
-                analyzer = HandwritingCNNAnalyzer()
-                analysis_result = analyzer.analyze_handwriting(sample.image_file.path)
-            except Exception as e:
-                messages.error(request, f"Analysis failed: {str(e)}")
-                analysis_result = {
-                    'irregular_shapes_score': 0.3, 'spacing_issues_score': 0.4,
-                    'stroke_pattern_score': 0.2, 'overall_handwriting_score': 0.3,
-                    'letter_formation_issues': ['Error in processing'],
-                    'spacing_analysis': {}, 'stroke_analysis': {}, 'model_confidence': 0.5
-                }
-            
-            # Save analysis
-            HandwritingAnalysis.objects.create(
-                sample=sample,
-                user=request.user,
-                **analysis_result
-            )
-            
-            messages.success(request, 'Handwriting analysis completed!')
+            job = enqueue_analysis('handwriting', request.user, handwriting_sample=sample)
+            _report_job(request, job, 'Handwriting analysis')
         
         elif sample_type == 'speech':
             sample = get_object_or_404(SpeechSample, id=sample_id, user=request.user)
-            
-            try:
-                analyzer = SpeechAnalyzer()
-                analysis_result = analyzer.analyze_speech(sample.audio_file.path, sample.text_content)
-            except Exception as e:
-                messages.error(request, f"Analysis failed: {str(e)}")
-                analysis_result = {
-                    'pronunciation_score': 0.7, 'fluency_score': 0.6,
-                    'reading_speed': 120.0, 'pause_frequency': 1.5,
-                    'mispronunciations': [], 'fluency_issues': [],
-                    'phoneme_analysis': {}, 'pitch_variation': 0.3,
-                    'volume_consistency': 0.8, 'rhythm_score': 0.7,
-                    'model_confidence': 0.5
-                }
-            
-            # Save analysis
-            SpeechAnalysis.objects.create(
-                sample=sample,
-                user=request.user,
-                **analysis_result
-            )
-            
-            messages.success(request, 'Speech analysis completed!')
+            job = enqueue_analysis('speech', request.user, speech_sample=sample)
+            _report_job(request, job, 'Speech analysis')
     
     # Get user's samples
     handwriting_samples = HandwritingSample.objects.filter(user=request.user).order_by('-timestamp')
@@ -431,9 +343,13 @@ def detection_results(request):
     
     # Get user's detection results
     detection_results = DetectionResult.objects.filter(user=request.user).order_by('-detection_timestamp')
+    pending_jobs = AnalysisJob.objects.filter(
+        user=request.user, job_type='combined', status__in=['queued', 'running']
+    ).order_by('created_at')
     
     context = {
         'detection_results': detection_results,
+        'pending_jobs': pending_jobs,
     }
     return render(request, 'user_interface/detection_results.html', context)
 
@@ -841,6 +757,33 @@ def upload_speech_api(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+def analysis_job_status(request, job_id):
+    """API endpoint with the progress of an analysis job"""
+    job = get_object_or_404(AnalysisJob.objects.only(*STATUS_FIELDS), id=job_id, user=request.user)
+    return JsonResponse(get_job_status(job))
+
+@login_required
+def sample_analysis_status(request, sample_id):
+    """API endpoint with the progress of a sample's latest analysis job"""
+    job = get_latest_sample_job(request.user, sample_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'This sample has not been analyzed'}, status=404)
+    return JsonResponse(get_job_status(job))
+
+@login_required
+async def analysis_job_events(request, job_id):
+    """Server-sent progress events of an analysis job (serve through Dyslexia/asgi.py)"""
+    user = await request.auser()
+    if not await AnalysisJob.objects.filter(id=job_id, user=user).aexists():
+        return JsonResponse({'success': False, 'error': 'Analysis job not found'}, status=404)
+
+    response = StreamingHttpResponse(job_status_events(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 def logout_view(request):
     """Logout user and redirect to home"""
     logout(request)